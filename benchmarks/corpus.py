@@ -0,0 +1,175 @@
+import os
+from string import Template
+
+
+FIXTURES_FOLDER = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures")
+
+# Categories of the main menu shown on every page, the bulk of a real page is this kind of boilerplate
+MENU_CATEGORIES = [
+    "Fruits et légumes", "Boucherie", "Poissonnerie", "Crèmerie", "Fromages", "Charcuterie", "Boulangerie",
+    "Pâtisserie", "Épicerie salée", "Épicerie sucrée", "Petit déjeuner", "Conserves", "Pâtes et riz",
+    "Huiles et vinaigres", "Sauces et condiments", "Biscuits", "Chocolats", "Boissons", "Eaux", "Jus",
+    "Sodas", "Café", "Thé", "Surgelés", "Glaces", "Bébé", "Hygiène", "Beauté", "Entretien", "Maison",
+    "Animaux", "Bio", "Produits du monde", "Traiteur", "Promotions"
+]
+BRANDS = ["Centrale", "Jaouda", "Aïcha", "Lesieur", "Dari", "Bimo", "Sidi Ali", "Oulmès", "Excelo", "Safi"]
+PRODUCT_NAMES = ["Lait demi-écrémé", "Yaourt nature", "Huile de tournesol", "Confiture d'abricot", "Couscous moyen",
+                 "Thé vert", "Eau minérale", "Biscuits au chocolat", "Pâtes spaghetti", "Tomates cerises",
+                 "Fromage fondu", "Café moulu", "Riz basmati", "Sardines à l'huile", "Pommes golden"]
+
+
+def _load_template(name: str) -> Template:
+    with open(os.path.join(FIXTURES_FOLDER, f"{name}.html"), encoding="utf-8") as file:
+        return Template(file.read())
+
+
+TEMPLATES = {name: _load_template(name) for name in ("layout", "home", "stores_list", "market_tile", "market", "store_tile", "listing", "product_tile", "product")}
+
+def _render_menu() -> str:
+    items = []
+    for index, category in enumerate(MENU_CATEGORIES, 1):
+        submenu = "".join(f'<li><a href="/fr/category/{index}/{sub}">{category} {sub}</a></li>' for sub in range(1, 7))
+        items.append(f'                <li class="menu-item"><a href="/fr/category/{index}">{category}</a><ul class="submenu">{submenu}</ul></li>')
+    return "\n".join(items)
+
+
+MENU = _render_menu()
+
+
+def _render_page(title: str, content: str, body_class: str) -> str:
+    return TEMPLATES["layout"].substitute(title=title, content=content, body_class=body_class, menu=MENU, token="b3f1c0de9a7e4d21")
+
+
+def get_market_url(market_id: int) -> str:
+    return f"/fr/market/{market_id}"
+
+
+def get_store_url(market_id: int, store_id: int) -> str:
+    return f"/fr/store/{market_id}/{store_id}"
+
+
+def get_product_url(product_id: int) -> str:
+    return f"/fr/product/{product_id}"
+
+
+def get_product_name(product_id: int) -> str:
+    return f"{PRODUCT_NAMES[product_id % len(PRODUCT_NAMES)]} {BRANDS[product_id % len(BRANDS)]} {product_id}"
+
+
+def get_product_price(product_id: int, price_version: int = 0) -> str:
+    return f"{(product_id * 37) % 500 + 5 + price_version}.{product_id % 100:02d}"
+
+
+def render_home() -> str:
+    """
+    Render the home page with the address selection form.
+    """
+
+    return _render_page("Accueil", TEMPLATES["home"].substitute(token="b3f1c0de9a7e4d21"), "home")
+
+
+def render_stores_list(address: str, market_ids: list[int]) -> str:
+    """
+    Render the stores list shown once an address is selected.
+
+    Parameters:
+    - address (str): The selected address.
+    - market_ids (list): The markets delivering the address.
+    """
+
+    markets = "\n".join(
+        TEMPLATES["market_tile"].substitute(
+            market_url=get_market_url(market_id), market_id=market_id, market_title=f"Market {market_id}",
+            close_program="Fermé" if market_id % 4 == 3 else ""
+        )
+        for market_id in market_ids
+    )
+    return _render_page("Magasins", TEMPLATES["stores_list"].substitute(address=address, markets=markets), "stores")
+
+
+def render_market(market_id: int, store_count: int) -> str:
+    """
+    Render the page of a market, listing its stores (categories).
+
+    Parameters:
+    - market_id (int): The market.
+    - store_count (int): Number of stores of the market.
+    """
+
+    stores = "\n".join(
+        TEMPLATES["store_tile"].substitute(store_url=get_store_url(market_id, store_id), store_id=store_id, store_name=f"{MENU_CATEGORIES[store_id % len(MENU_CATEGORIES)]} {market_id}-{store_id}")
+        for store_id in range(store_count)
+    )
+    return _render_page(f"Market {market_id}", TEMPLATES["market"].substitute(market_title=f"Market {market_id}", stores=stores), "market")
+
+
+def _render_pagination(page: int, page_count: int, window: int) -> str:
+    if page_count <= 1:
+        return ""
+    window = window or page_count
+    first = max(1, min(page - window // 2, page_count - window + 1))
+    last = min(page_count, first + window - 1)
+    items = []
+    if page > 1:
+        items.append(f'<li class="page-item"><a class="page-link" href="?page={page - 1}">&laquo;</a></li>')
+    for number in range(first, last + 1):
+        active = " active" if number == page else ""
+        items.append(f'<li class="page-item{active}"><a class="page-link" href="?page={number}">{number}</a></li>')
+    if last < page_count:
+        items.append('<li class="page-item disabled"><span class="page-link">...</span></li>')  # The last page is hidden
+    if page < page_count:
+        items.append(f'<li class="page-item"><a class="page-link" href="?page={page + 1}">&raquo;</a></li>')
+    return "\n".join(f"                    {item}" for item in items)
+
+
+def render_listing(store_name: str, product_ids: list[int], page: int, page_count: int, window: int = 0, price_version: int = 0) -> str:
+    """
+    Render a listing page of a store.
+
+    Parameters:
+    - store_name (str): Name of the store.
+    - product_ids (list): Products of the page, empty past the last page.
+    - page (int): Number of the page.
+    - page_count (int): Number of pages of the store.
+    - window (int): Number of pages shown by the paginator, 0 shows every page.
+    - price_version (int): Added to every price, to simulate a price update.
+    """
+
+    products = "\n".join(
+        TEMPLATES["product_tile"].substitute(
+            product_id=product_id, product_url=get_product_url(product_id), product_name=get_product_name(product_id),
+            price=get_product_price(product_id, price_version)
+        )
+        for product_id in product_ids
+    )
+    content = TEMPLATES["listing"].substitute(
+        store_name=store_name, product_count=len(product_ids), products=products,
+        pagination=_render_pagination(page, page_count, window) if product_ids else ""
+    )
+    return _render_page(store_name, content, "category")
+
+
+def render_product(product_id: int, price_version: int = 0) -> str:
+    """
+    Render a product page, every fifth product is sold by weight and shows a price calculator.
+
+    Parameters:
+    - product_id (int): The product.
+    - price_version (int): Added to the price, to simulate a price update.
+    """
+
+    price = get_product_price(product_id, price_version)
+    if product_id % 5 == 0:
+        price_block = (
+            f'                    <div class="product-price">~ {price} MAD / kg</div>\n'
+            f'                    <div class="product-price-calculator"><p>~ {price} MAD</p><p>pour 1 kg</p></div>'
+        )
+    else:
+        price_block = f'                    <div class="product-price" itemprop="price">{price} MAD</div>'
+    name = get_product_name(product_id)
+    content = TEMPLATES["product"].substitute(
+        product_id=product_id, product_name=name, price_block=price_block, product_number=f"{100000 + product_id}",
+        brand=BRANDS[product_id % len(BRANDS)],
+        description=f"{name}, sélectionné pour sa qualité. À conserver dans un endroit frais et sec après ouverture."
+    )
+    return _render_page(name, content, "product")
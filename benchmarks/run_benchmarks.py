@@ -0,0 +1,217 @@
+import argparse
+import json
+import multiprocessing
+import os
+import resource
+import sys
+import tempfile
+import time
+import timeit
+import urllib.request
+
+from benchmarks import corpus
+from benchmarks.stand_in_server import StandInServer
+
+
+# End-to-end scenarios: options of the stand-in site, settings of the scraper, and number of runs
+# sharing the same cache folder (the runs after the first one start with a warm cache and index)
+SCENARIOS = {
+    "baseline": {"site": {}, "env": {}, "runs": 1},
+    "latency": {"site": {"latency": 0.05, "jitter": 0.05}, "env": {}, "runs": 1},
+    "errors": {"site": {"error_rate": 0.02, "throttle_rate": 0.05}, "env": {}, "runs": 1},
+    "deep": {"site": {"stores": 2, "page_count": 30, "window": 5}, "env": {}, "runs": 1},
+    "warm": {"site": {}, "env": {"SCRAPE_MODE": "incremental"}, "runs": 2},
+    "fast": {"site": {}, "env": {"SCRAPE_MODE": "fast"}, "runs": 2},
+}
+
+# Settings every benchmark run starts from, so the environment of the shell doesn't change the results.
+# Pages are parsed on the event loop so the CPU time of the parsing is counted with the scraper.
+SCRAPER_ENV = {
+    "PARSE_WORKERS": "0",
+    "SCRAPE_MODE": "full",
+    "SCRAPE_ROLE": "standalone",
+    "DB_SINK": "",
+    "OUTPUT_FORMAT": "",
+    "METRICS_PORT": "",
+    "BRINGO_ADDRESSES": "",
+    "HTTP_CACHE_PATH": "cache/http_cache.sqlite3",
+    "SESSIONS_PATH": "cache/sessions.json",
+    "FRONTIER_PATH": "cache/frontier.sqlite3",
+    "PRODUCT_INDEX_PATH": "cache/product_index.sqlite3",
+}
+
+
+def _run_scraper(url: str, env: dict[str, str], work_folder: str, results: multiprocessing.Queue) -> None:
+    os.environ.update(env)
+    os.chdir(work_folder)  # The cache and results folders of the run, and no proxies.txt
+    sys.stdout = open("output.txt", "a", encoding="utf-8")
+    import bringo
+    from metrics import metrics
+
+    bringo.BringoScraper.main_url = url
+    start_time = time.perf_counter()
+    bringo.BringoScraper().run()
+    duration = time.perf_counter() - start_time
+    usage = resource.getrusage(resource.RUSAGE_SELF)
+    children_usage = resource.getrusage(resource.RUSAGE_CHILDREN)
+    results.put({
+        "duration": duration,
+        "pages": metrics.get_counter("pipeline_items_total", stage="product links", outcome="success"),
+        "products": metrics.get_counter("pipeline_items_total", stage="csv", outcome="success"),
+        "requests": metrics.get_counter("http_requests_total"),
+        "retries": metrics.get_counter("http_retries_total"),
+        "megabytes": metrics.get_counter("http_response_bytes_total") / 1024 ** 2,
+        "cpu_seconds": usage.ru_utime + usage.ru_stime + children_usage.ru_utime + children_usage.ru_stime,
+        "peak_rss_mb": max(usage.ru_maxrss, children_usage.ru_maxrss) / 1024  # Kilobytes on Linux
+    })
+
+
+def run_scenario(name: str, overrides: dict[str, str]) -> list[dict]:
+    """
+    Run a scenario end to end against the stand-in site.
+
+    Every run is a new process, so its peak memory and CPU time only measure that run.
+
+    Parameters:
+    - name (str): Name of the scenario.
+    - overrides (dict): Scraper settings replacing the ones of the scenario.
+
+    Returns:
+    - list: The measures of every run of the scenario.
+    """
+
+    scenario = SCENARIOS[name]
+    env = {**SCRAPER_ENV, **scenario["env"], **overrides}
+    measures = []
+    context = multiprocessing.get_context("spawn")
+    with tempfile.TemporaryDirectory(prefix=f"bringo_benchmark_{name}_") as work_folder, StandInServer(**scenario["site"]) as server:
+        os.makedirs(os.path.join(work_folder, "results", "bringo_products"))  # Created by the deployment, not by the scraper
+        for run in range(1, scenario["runs"] + 1):
+            results = context.Queue()
+            process = context.Process(target=_run_scraper, args=(server.url, env, work_folder, results))
+            process.start()
+            process.join()
+            if process.exitcode != 0 or results.empty():
+                with open(os.path.join(work_folder, "output.txt"), encoding="utf-8") as file:
+                    print(file.read()[-3000:])
+                raise RuntimeError(f"The run {run} of the scenario {name} failed with exit code {process.exitcode}")
+            measure = {"scenario": name, "run": run, **results.get()}
+            measure["pages_per_second"] = measure["pages"] / measure["duration"]
+            measure["products_per_second"] = measure["products"] / measure["duration"]
+            with urllib.request.urlopen(f"{server.url}/_stats") as response:
+                measure["served"] = json.loads(response.read())  # Cumulated over the runs of the scenario
+            measures.append(measure)
+            print(
+                f"{name:<10} run {run} : {measure['pages']:.0f} pages, {measure['products']:.0f} products in {measure['duration']:.2f}s"
+                f" -> {measure['pages_per_second']:.1f} pages/s, {measure['products_per_second']:.1f} products/s,"
+                f" {measure['requests']:.0f} requests ({measure['retries']:.0f} retried), cpu {measure['cpu_seconds']:.2f}s,"
+                f" peak rss {measure['peak_rss_mb']:.1f} MiB"
+            )
+    return measures
+
+
+def run_parser_benchmarks(iterations: int) -> list[dict]:
+    """
+    Time the extractors on the pages of the corpus with every available parser backend.
+
+    Parameters:
+    - iterations (int): Number of extractions timed per measure, the best of 3 measures is kept.
+
+    Returns:
+    - list: The time per extraction of every extractor and backend.
+    """
+
+    import extractors
+    import html_parser
+
+    cases = [
+        ("product", extractors.extract_product, corpus.render_product(3).encode()),
+        ("product by weight", extractors.extract_product, corpus.render_product(10).encode()),
+        ("listing", extractors.extract_listing, corpus.render_listing("Épicerie salée", list(range(24)), 3, 30, 5).encode()),
+        ("product tiles", extractors.extract_product_tiles, corpus.render_listing("Épicerie salée", list(range(24)), 3, 30, 5).encode()),
+        ("stores", extractors.extract_stores, corpus.render_market(1, 12).encode()),
+        ("markets", extractors.extract_markets, corpus.render_stores_list("Casablanca", list(range(6))).encode()),
+    ]
+    backends = ["html.parser"]
+    if html_parser.lxml_html is not None:
+        backends.append("lxml")
+    if html_parser.LexborHTMLParser is not None:
+        backends.append("selectolax")
+
+    measures = []
+    default_backend = html_parser.DEFAULT_BACKEND
+    try:
+        for backend in backends:
+            html_parser.DEFAULT_BACKEND = backend  # Read by parse_html on every call
+            for name, extract, payload in cases:
+                extract(payload)  # Imports and selector compilation are not measured
+                seconds = min(timeit.repeat(lambda: extract(payload), number=iterations, repeat=3)) / iterations
+                measures.append({"extractor": name, "backend": backend, "microseconds": seconds * 1e6, "per_second": 1 / seconds})
+                print(f"{name:<18} {backend:<12} {seconds * 1e6:9.1f} µs  {1 / seconds:9.0f} /s")
+    finally:
+        html_parser.DEFAULT_BACKEND = default_backend
+    return measures
+
+
+def compare(results: dict, baseline: dict, tolerance: float) -> list[str]:
+    """
+    Compare the results with the ones of a previous run.
+
+    Parameters:
+    - results (dict): The results of this run.
+    - baseline (dict): The results of the reference run.
+    - tolerance (float): Slowdown tolerated before a measure is reported, 0.15 for 15%.
+
+    Returns:
+    - list: A description of every regression.
+    """
+
+    regressions = []
+    previous = {(measure["scenario"], measure["run"]): measure for measure in baseline.get("e2e", [])}
+    for measure in results.get("e2e", []):
+        reference = previous.get((measure["scenario"], measure["run"]))
+        if reference and measure["products_per_second"] < reference["products_per_second"] * (1 - tolerance):
+            regressions.append(f"{measure['scenario']} run {measure['run']} : {measure['products_per_second']:.1f} products/s instead of {reference['products_per_second']:.1f}")
+        if reference and measure["peak_rss_mb"] > reference["peak_rss_mb"] * (1 + tolerance):
+            regressions.append(f"{measure['scenario']} run {measure['run']} : peak rss {measure['peak_rss_mb']:.1f} MiB instead of {reference['peak_rss_mb']:.1f}")
+    previous = {(measure["extractor"], measure["backend"]): measure for measure in baseline.get("parsers", [])}
+    for measure in results.get("parsers", []):
+        reference = previous.get((measure["extractor"], measure["backend"]))
+        if reference and measure["microseconds"] > reference["microseconds"] * (1 + tolerance):
+            regressions.append(f"{measure['extractor']} with {measure['backend']} : {measure['microseconds']:.1f} µs instead of {reference['microseconds']:.1f}")
+    return regressions
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Offline benchmarks of the Bringo scraper against a local stand-in site")
+    parser.add_argument("--scenario", action="append", choices=list(SCENARIOS), help="End-to-end scenario to run (every scenario by default), can be repeated")
+    parser.add_argument("--skip-e2e", action="store_true", help="Only run the parser benchmarks")
+    parser.add_argument("--skip-parsers", action="store_true", help="Only run the end-to-end scenarios")
+    parser.add_argument("--iterations", type=int, default=200, help="Extractions timed per parser measure")
+    parser.add_argument("--set", action="append", default=[], metavar="NAME=VALUE", help="Scraper setting for every scenario (HTML_PARSER=selectolax)")
+    parser.add_argument("--output", help="Write the results to this JSON file")
+    parser.add_argument("--compare", help="JSON results of a previous run, the regressions make the command fail")
+    parser.add_argument("--tolerance", type=float, default=0.15, help="Slowdown tolerated by --compare")
+    arguments = parser.parse_args()
+
+    overrides = dict(setting.split("=", 1) for setting in arguments.set)
+    results = {"started_at": time.strftime("%Y-%m-%dT%H:%M:%S"), "settings": overrides}
+    if not arguments.skip_e2e:
+        results["e2e"] = []
+        for name in arguments.scenario or list(SCENARIOS):
+            results["e2e"] += run_scenario(name, overrides)
+    if not arguments.skip_parsers:
+        results["parsers"] = run_parser_benchmarks(arguments.iterations)
+
+    if arguments.output:
+        with open(arguments.output, "w", encoding="utf-8") as file:
+            json.dump(results, file, indent=2)
+        print(f"---> results : {arguments.output}")
+    if arguments.compare:
+        with open(arguments.compare, encoding="utf-8") as file:
+            regressions = compare(results, json.load(file), arguments.tolerance)
+        for regression in regressions:
+            print(f"REGRESSION {regression}")
+        if regressions:
+            sys.exit(1)
+        print("---> no regression")
@@ -0,0 +1,234 @@
+import argparse
+import asyncio
+import hashlib
+import itertools
+import multiprocessing
+import random
+import socket
+
+from aiohttp import web
+
+from benchmarks import corpus
+
+
+class StandInSite:
+    """
+    Local stand-in of bringo.ma serving the fixture corpus, with configurable latency, errors and pagination.
+
+    The home page sets the PHPSESSID cookie and holds the address form, whose submission returns the
+    stores list. Market, listing and product pages need the cookie, without it the address page is
+    served instead, as the site does once a session expired. Every page has an ETag and answers
+    conditional requests with 304. The injected errors and throttling only hit the crawled pages,
+    the address selection always succeeds.
+    """
+
+    def __init__(self, markets: int = 2, stores: int = 4, page_count: int = 3, products_per_page: int = 24, catalogue_size: int = 500,
+                 window: int = 0, latency: float = 0.0, jitter: float = 0.0, error_rate: float = 0.0, throttle_rate: float = 0.0,
+                 price_version: int = 0, seed: int = 0):
+        """
+        Initialize the site.
+
+        Parameters:
+        - markets (int): Number of markets delivering the address.
+        - stores (int): Number of stores (categories) of every market.
+        - page_count (int): Number of listing pages of every store (pagination depth).
+        - products_per_page (int): Number of products of a listing page.
+        - catalogue_size (int): Number of distinct products, the stores share them so products are listed several times.
+        - window (int): Number of pages shown by the paginator, 0 shows every page.
+        - latency (float): Time (in seconds) taken to serve every page.
+        - jitter (float): Random time (in seconds) added to the latency.
+        - error_rate (float): Share of the crawled pages answered with a 500 error.
+        - throttle_rate (float): Share of the crawled pages answered with a 429 and a Retry-After header.
+        - price_version (int): Added to every price, to simulate a price update between two runs.
+        - seed (int): Seed of the random latency and errors, a run is reproducible.
+        """
+
+        self.markets = markets
+        self.stores = stores
+        self.page_count = page_count
+        self.products_per_page = products_per_page
+        self.catalogue_size = catalogue_size
+        self.window = window
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.throttle_rate = throttle_rate
+        self.price_version = price_version
+        self.random = random.Random(seed)
+        self.sessions = itertools.count(1)
+        self.requests = {}  # Number of requests by kind of page and status
+
+    def get_product_ids(self, market_id: int, store_id: int, page: int) -> list[int]:
+        """
+        Get the products of a listing page, half of the products of a store are also listed by the next store.
+
+        Parameters:
+        - market_id (int): The market.
+        - store_id (int): The store.
+        - page (int): Number of the page, past the last page the listing is empty.
+
+        Returns:
+        - list: The product ids.
+        """
+
+        if page < 1 or page > self.page_count:
+            return []
+        first = (market_id * self.stores + store_id) * self.products_per_page * self.page_count // 2 + (page - 1) * self.products_per_page
+        return [(first + index) % self.catalogue_size for index in range(self.products_per_page)]
+
+    def _count(self, kind: str, status: int) -> None:
+        key = f"{kind} {status}"
+        self.requests[key] = self.requests.get(key, 0) + 1
+
+    def _respond(self, request: web.Request, kind: str, body: str) -> web.Response:
+        etag = '"' + hashlib.md5(body.encode()).hexdigest() + '"'
+        if request.headers.get("If-None-Match") == etag:
+            self._count(kind, 304)
+            return web.Response(status=304, headers={"ETag": etag})
+        self._count(kind, 200)
+        return web.Response(text=body, content_type="text/html", headers={"ETag": etag})
+
+    async def _handle_home(self, request: web.Request) -> web.Response:
+        response = self._respond(request, "home", corpus.render_home())
+        response.set_cookie("PHPSESSID", f"benchmark{next(self.sessions)}")
+        return response
+
+    async def _handle_address(self, request: web.Request) -> web.Response:
+        form = await request.post()
+        if not form.get("address") or not request.cookies.get("PHPSESSID"):
+            self._count("address", 400)
+            return web.Response(status=400)
+        return self._respond(request, "address", corpus.render_stores_list(form["address"], list(range(self.markets))))
+
+    async def _handle_page(self, request: web.Request) -> web.Response:
+        kind = request.match_info["kind"]
+        await asyncio.sleep(self.latency + self.random.uniform(0, self.jitter))
+        draw = self.random.random()
+        if draw < self.error_rate:
+            self._count(kind, 500)
+            return web.Response(status=500, text="Internal Server Error")
+        if draw < self.error_rate + self.throttle_rate:
+            self._count(kind, 429)
+            return web.Response(status=429, text="Too Many Requests", headers={"Retry-After": "1"})
+        if not request.cookies.get("PHPSESSID"):
+            return self._respond(request, "expired", corpus.render_home())  # The address has to be selected again
+
+        ids = [int(part) for part in request.match_info["ids"].split("/")]
+        if kind == "market" and len(ids) == 1 and ids[0] < self.markets:
+            return self._respond(request, kind, corpus.render_market(ids[0], self.stores))
+        if kind == "store" and len(ids) == 2 and ids[0] < self.markets and ids[1] < self.stores:
+            page = int(request.query.get("page", 1))
+            store_name = f"{corpus.MENU_CATEGORIES[ids[1] % len(corpus.MENU_CATEGORIES)]} {ids[0]}-{ids[1]}"
+            body = corpus.render_listing(store_name, self.get_product_ids(ids[0], ids[1], page), page, self.page_count, self.window, self.price_version)
+            return self._respond(request, kind, body)
+        if kind == "product" and len(ids) == 1 and ids[0] < self.catalogue_size:
+            return self._respond(request, kind, corpus.render_product(ids[0], self.price_version))
+        self._count(kind, 404)
+        return web.Response(status=404)
+
+    async def _handle_stats(self, request: web.Request) -> web.Response:
+        return web.json_response(self.requests)
+
+    def create_app(self) -> web.Application:
+        """
+        Create the aiohttp application of the site.
+
+        Returns:
+        - web.Application: The application, its /_stats route returns the number of requests served by kind and status.
+        """
+
+        app = web.Application()
+        app.router.add_get("/", self._handle_home)
+        app.router.add_get("/fr", self._handle_home)
+        app.router.add_post("/fr/address", self._handle_address)
+        app.router.add_get("/_stats", self._handle_stats)
+        app.router.add_get(r"/fr/{kind:market|store|product}/{ids:[\d/]+}", self._handle_page)
+        return app
+
+
+def _serve(port: int, options: dict, ready: multiprocessing.Event = None) -> None:
+    async def serve():
+        runner = web.AppRunner(StandInSite(**options).create_app(), access_log=None)
+        await runner.setup()
+        await web.TCPSite(runner, "127.0.0.1", port).start()
+        if ready is not None:
+            ready.set()
+        await asyncio.Event().wait()  # Served until the process is terminated
+
+    asyncio.run(serve())
+
+
+class StandInServer:
+    """
+    Stand-in site served by a separate process, so its CPU time is not counted in the measures of the scraper.
+    """
+
+    def __init__(self, **options):
+        """
+        Initialize the server.
+
+        Parameters:
+        - options: Options of `StandInSite`.
+        """
+
+        self.options = options
+        self.process = None
+        self.url = None
+
+    def start(self) -> str:
+        """
+        Start the server on a free local port.
+
+        Returns:
+        - str: The URL of the site.
+        """
+
+        with socket.socket() as sock:
+            sock.bind(("127.0.0.1", 0))
+            port = sock.getsockname()[1]
+        context = multiprocessing.get_context("spawn")
+        ready = context.Event()
+        self.process = context.Process(target=_serve, args=(port, self.options, ready), daemon=True)
+        self.process.start()
+        if not ready.wait(30):
+            self.stop()
+            raise RuntimeError("The stand-in server didn't start")
+        self.url = f"http://127.0.0.1:{port}"
+        return self.url
+
+    def stop(self) -> None:
+        """
+        Stop the server.
+        """
+
+        if self.process is not None:
+            self.process.terminate()
+            self.process.join()
+            self.process = None
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Serve the benchmark corpus as a local stand-in of bringo.ma")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--markets", type=int, default=2)
+    parser.add_argument("--stores", type=int, default=4)
+    parser.add_argument("--page-count", type=int, default=3)
+    parser.add_argument("--products-per-page", type=int, default=24)
+    parser.add_argument("--catalogue-size", type=int, default=500)
+    parser.add_argument("--window", type=int, default=0)
+    parser.add_argument("--latency", type=float, default=0.0)
+    parser.add_argument("--jitter", type=float, default=0.0)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--throttle-rate", type=float, default=0.0)
+    parser.add_argument("--price-version", type=int, default=0)
+    arguments = vars(parser.parse_args())
+    port = arguments.pop("port")
+    print(f"Serving the stand-in site on http://127.0.0.1:{port}")
+    _serve(port, arguments)
@@ -1,35 +1,52 @@
 import time
-from seleniumwire import webdriver
+import asyncio
 from selenium.webdriver.common.by import By
 from selenium.webdriver.support.ui import WebDriverWait
 from selenium.webdriver.chrome.options import Options
 from selenium.common.exceptions import StaleElementReferenceException, NoSuchElementException
 from selenium.webdriver.common.action_chains import ActionChains
 
-from bs4 import BeautifulSoup
+import requests
 import datetime
-from concurrent.futures import ThreadPoolExecutor, as_completed
+import itertools
+import os
+import socket
+import signal
+from collections import OrderedDict
+from typing import Any, Callable
 
 from utils import all_elements_clickable
 from scraper import Scraper
+from product_index import ProductIndex
+from pipeline import Pipeline
+from session_manager import SessionManager
+from db_writer import ProductDbWriter
+from output_sink import ProductFileSink
+from change_capture import ChangeCapture
+from recrawl_scheduler import RecrawlScheduler
+from frontier import Frontier
+from work_queue import WorkQueue
+from url_frontier import normalize_url, SeenUrls, InflightRequests
+from metrics import metrics
+from type_classes import StoreTable, ProductLink, Product
+from log_queue import logger
+from extractors import extract_product_tiles, extract_product, extract_stores, extract_listing, extract_markets, extract_address_form, is_address_page
 from selenium.webdriver.support import expected_conditions as EC
 
 
-def remove_duplicates(list_of_dicts, key):
-    seen = set()
-    new_list = []
-    for d in list_of_dicts:
-        value = d[key]
-        if value not in seen:
-            seen.add(value)
-            new_list.append(d)
-    return new_list
-
 class BringoScraper(Scraper):
     # Class variables - Name of scraper, main url of the site and the url of the page that contain urls of cities
     name = 'Bringo-Scraper'
     city = 'Boulevard Mohamed V, Casablanca'
     tower = 44
+    # Coordinates of the address, filled in by the Google Places widget in a browser
+    latitude = os.getenv("BRINGO_LATITUDE")
+    longitude = os.getenv("BRINGO_LONGITUDE")
+    # Delivery addresses scraped together, "address|street number|latitude|longitude" separated by ";" (coordinates
+    # optional). The address above is used when empty. Markets seen from several addresses are scraped once.
+    addresses = os.getenv("BRINGO_ADDRESSES", "")
+    # Chrome start attempts of the selenium fallback before giving up
+    chrome_start_attempts = int(os.getenv("CHROME_START_ATTEMPTS", 5))
     main_url = "https://www.bringo.ma"
 
     # Name of the database table
@@ -37,7 +54,77 @@ class BringoScraper(Scraper):
     
     # Folder name for storing csv files
     folder_name = "bringo_products"
-    cookies = {}
+
+    # Progress of the run checkpointed on disk, a restarted run resumes from the outstanding work (empty path disables it)
+    frontier_path = os.getenv("FRONTIER_PATH", "cache/frontier.sqlite3")
+
+    # "standalone" scrapes everything in this process, "coordinator" publishes the listing pages as work units
+    # of a queue shared by the hosts, and "worker" claims the listing pages and scrapes their products
+    scrape_role = os.getenv("SCRAPE_ROLE", "standalone")
+    work_queue_path = os.getenv("WORK_QUEUE_PATH", "cache/work_queue.sqlite3")
+    worker_id = os.getenv("WORKER_ID") or f"{socket.gethostname()}_{os.getpid()}"
+    # Listing pages leased at once by a worker, lease renewed by its heartbeats, and idle time before a worker stops
+    worker_batch_size = int(os.getenv("WORKER_BATCH_SIZE", 20))
+    lease_seconds = float(os.getenv("LEASE_SECONDS", 120))
+    worker_idle_timeout = float(os.getenv("WORKER_IDLE_SECONDS", 300))
+
+    # "once" scrapes everything and exits (restarted by docker), "daemon" stays resident with warm sessions and
+    # connection pools, and recrawls every market, store and listing page on its own schedule
+    scrape_schedule = os.getenv("SCRAPE_SCHEDULE", "once")
+    schedule_path = os.getenv("SCHEDULE_PATH", "cache/schedule.sqlite3")
+    # Bounds of the recrawl interval of a target, shortened when it changes and lengthened when it doesn't
+    recrawl_min_interval = float(os.getenv("RECRAWL_MIN_MINUTES", 30)) * 60
+    recrawl_max_interval = float(os.getenv("RECRAWL_MAX_HOURS", 72)) * 3600
+    # Due targets recrawled at once, and timezone of the opening hours of the markets
+    recrawl_batch_size = int(os.getenv("RECRAWL_BATCH_SIZE", 200))
+    markets_timezone = os.getenv("MARKETS_TIMEZONE", "Africa/Casablanca")
+
+    # Pages fetched ahead at once when the paginator only shows a window of the pages, until an empty page
+    pagination_prefetch = int(os.getenv("PAGINATION_PREFETCH", 3))
+
+    # Details of the product pages fetched in the run kept in memory for the other stores listing them, when
+    # there is no product index to read them from
+    fetched_details_size = int(os.getenv("FETCHED_DETAILS_SIZE", 20000))
+
+    # Port of the Prometheus metrics endpoint (/metrics, and /summary in JSON), empty disables it
+    metrics_port = int(os.getenv("METRICS_PORT")) if os.getenv("METRICS_PORT") else None
+
+    # Products are also upserted in the database when set: "mysql", "sqlite" or empty for csv only
+    db_sink = os.getenv("DB_SINK", "")
+    db_sqlite_path = os.getenv("DB_SQLITE_PATH", "cache/products.sqlite3")
+    # Products written in one statement, and maximum wait (in seconds) before a partial batch is written
+    db_batch_size = int(os.getenv("DB_BATCH_SIZE", 1000))
+    db_flush_interval = float(os.getenv("DB_FLUSH_SECONDS", 5))
+
+    # Products are written in files partitioned by run date, market and store instead of a csv file per store
+    # when set: "csv", "parquet" or "arrow"
+    output_format = os.getenv("OUTPUT_FORMAT", "")
+    # Compression of the files: "zstd", "gzip", "snappy" (parquet), "lz4" (arrow) or "none"
+    output_compression = os.getenv("OUTPUT_COMPRESSION", "zstd")
+    # Products of a partition written at once (one row group)
+    output_row_group_size = int(os.getenv("OUTPUT_ROW_GROUP_SIZE", 10000))
+
+    # Changes of the products since the previous runs (inserts, updates and deletes) are written in a
+    # JSON lines file per run when set: "alongside" the full dump, or "only" instead of the csv / output files
+    changes_output = os.getenv("CHANGES_OUTPUT", "")
+    changes_index_path = os.getenv("CHANGES_INDEX_PATH", "cache/snapshot_index.sqlite3")
+
+    # Sessions (PHPSESSID cookie and markets of the address) are saved to disk and reused until their TTL ends
+    sessions_path = os.getenv("SESSIONS_PATH", "cache/sessions.json")
+    session_pool_size = int(os.getenv("SESSION_POOL_SIZE", 2))
+    session_ttl = float(os.getenv("SESSION_TTL_HOURS", 6)) * 3600
+    # A page is fetched at most this many times with a new session when the session expires
+    session_retries = 3
+    # Bootstrap attempts (address selection) before a refresh gives up, and maximum wait for a session
+    session_bootstrap_attempts = int(os.getenv("SESSION_BOOTSTRAP_ATTEMPTS", 3))
+    session_timeout = float(os.getenv("SESSION_TIMEOUT_SECONDS", 300))
+
+    # "full" fetches every product page, "incremental" skips the products that didn't change since they were last fetched,
+    # "fast" only refreshes the prices of the known products from the listing pages
+    scrape_mode = os.getenv("SCRAPE_MODE", "full")
+    product_index_path = os.getenv("PRODUCT_INDEX_PATH", "cache/product_index.sqlite3")
+    # Unchanged products are still fetched again once their last fetch is older than this
+    incremental_max_age = float(os.getenv("INCREMENTAL_MAX_AGE_HOURS", 168)) * 3600
 
     def __init__(self):
         """
@@ -47,7 +134,113 @@ class BringoScraper(Scraper):
         super().__init__(self.main_url, self.folder_name)
         current_date = datetime.datetime.now()  # Get the current date and time
         self.file_path = f"{current_date.strftime('%Y_%m_%d_%H_%M')}.csv"  # Format the date
+        self.product_index = ProductIndex(self.product_index_path) if self.product_index_path else None
+        self.skipped_products = 0
+        self.sessions = {}  # Session pool of every address by address label
+        self.db_writer = self.__create_db_writer()
+        self.file_sink = self.__create_file_sink()
+        self.change_capture = self.__create_change_capture()
+        self.daemon = self.scrape_schedule == "daemon" and self.scrape_role == "standalone"
+        # The schedule of the daemon is its own checkpoint
+        self.frontier = self.__create_frontier() if self.frontier_path and self.scrape_role != "worker" and not self.daemon else None
+        self.scheduler = RecrawlScheduler(self.schedule_path, self.recrawl_min_interval, self.recrawl_max_interval, self.markets_timezone) if self.daemon else None
+        self.work_queue = WorkQueue(self.work_queue_path, self.lease_seconds) if self.scrape_role != "standalone" else None
+        self.unit_results = {}  # Number of products scraped by work unit
+        self.run_started_at = time.time()
+        # Sets of 64 bit hashes of the URLs, see SeenUrls for the odds of a collision
+        self.listed_products = SeenUrls()  # Product links already emitted, by store
+        self.fetched_products = SeenUrls()  # Product pages already fetched in this run
+        self.fetched_details = OrderedDict()  # Details of the last product pages fetched, without a product index
+        self.inflight = InflightRequests()
+        self.stores = StoreTable()  # Markets and stores referenced by the product links and products instead of copied
     
+    def __get_configured_addresses(self) -> list[dict[str, str]]:
+        if not self.addresses.strip():
+            return [{"address": self.city, "street_number": self.tower, "latitude": self.latitude, "longitude": self.longitude}]
+        addresses = []
+        for value in self.addresses.split(";"):
+            fields = [field.strip() for field in value.split("|")] + [None] * 3
+            if fields[0]:
+                addresses.append({"address": fields[0], "street_number": fields[1] or None, "latitude": fields[2] or None, "longitude": fields[3] or None})
+        return addresses
+
+    def __open_sessions(self, addresses: list[dict[str, str]]) -> None:
+        root, extension = os.path.splitext(self.sessions_path)
+        for address in addresses:
+            label = " ".join(str(part) for part in (address.get("street_number"), address["address"]) if part)  # The street number is optional
+            # Every address keeps its own sessions, the selected address belongs to the session cookie
+            sessions_path = f"{root}_{self._get_hash(label)[:8]}{extension}" if self.sessions_path else None
+            self.sessions[label] = SessionManager(sessions_path, lambda address=address: self.__bootstrap_session(address), self.session_pool_size, self.session_ttl, self.session_bootstrap_attempts)
+
+    def __merge_markets(self) -> list[dict]:
+        """
+        Merge the markets seen from every address, a market seen from several addresses is scraped once.
+
+        Returns:
+        - list: The markets, each one with the labels of the addresses delivered by it.
+        """
+
+        markets = {}
+        for label, sessions in self.sessions.items():
+            session = sessions.get_session(self.session_timeout)  # Saved session, or a new one if they all expired
+            if session is None:
+                print(f"---> no session for the address {label}, its markets are skipped")
+            for market in (session["markets"] if session else []):
+                merged = markets.setdefault(market["market_url"], {**market, "addresses": []})
+                merged["addresses"].append(label)
+        print(f"---> {len(markets)} markets for {len(self.sessions)} addresses")
+        return list(markets.values())
+
+    def __create_db_writer(self) -> ProductDbWriter | None:
+        try:
+            if self.db_sink == "mysql":
+                return ProductDbWriter.for_mysql(os.getenv("MYSQL_HOST"), os.getenv("MYSQL_USER"), os.getenv("MYSQL_PASSWORD"), os.getenv("MYSQL_DATABASE"), self.table_name, self.db_batch_size, self.db_flush_interval)
+            if self.db_sink == "sqlite":
+                os.makedirs(os.path.dirname(self.db_sqlite_path) or ".", exist_ok=True)
+                return ProductDbWriter.for_sqlite(self.db_sqlite_path, self.table_name, self.db_batch_size, self.db_flush_interval)
+        except Exception as e:
+            print(f"Can't connect to the {self.db_sink} database, the products are only saved in csv : {e}")
+        return None
+
+    def __create_file_sink(self) -> ProductFileSink | None:
+        if not self.output_format:
+            return None
+        try:
+            return ProductFileSink(f"results/{self.folder_name}", self.output_format, self.output_compression, self.output_row_group_size)
+        except Exception as e:
+            print(f"Can't write {self.output_format} files, writing csv files instead : {e!r}")
+            return None
+
+    def __create_change_capture(self) -> ChangeCapture | None:
+        if not self.changes_output:
+            return None
+        if self.scrape_role != "standalone":
+            # A worker only sees part of the products, it can't tell which ones were delisted
+            print("The changes are only captured by standalone runs")
+            return None
+        return ChangeCapture(self.changes_index_path, f"results/{self.folder_name}")
+
+    def __create_frontier(self) -> Frontier:
+        if self.file_sink is not None:
+            # Every checkpoint writes the partial row groups of the output files (and closes the parquet
+            # files), checkpoints are spaced out so the files keep large row groups
+            return Frontier(self.frontier_path, flush_size=max(500, self.output_row_group_size), flush_interval=60, on_flush=self.__flush_outputs, on_flush_async=self.__flush_outputs_async)
+        return Frontier(self.frontier_path, on_flush=self.__flush_outputs, on_flush_async=self.__flush_outputs_async)
+
+    def __flush_outputs(self) -> None:
+        self._flush_csv_files()
+        if self.file_sink is not None:
+            self.file_sink.flush()
+        if self.change_capture is not None:
+            self.change_capture.flush()  # After the changes are written, before the checkpoint
+
+    async def __flush_outputs_async(self) -> None:
+        self._flush_csv_files()
+        if self.file_sink is not None:
+            await self.file_sink.flush_async()  # The writer thread is waited for in a thread
+        if self.change_capture is not None:
+            self.change_capture.flush()
+
     # def __del__(self):
     #     """
     #     Clean up resources when the GlovoScraper instance is deleted.
@@ -56,7 +249,7 @@ class BringoScraper(Scraper):
     #     """
     #     super()
 
-    def run(self, city=None):
+    def run(self, city=None, addresses=None):
         """
         Start the scraping process.
     
@@ -65,130 +258,454 @@ class BringoScraper(Scraper):
         
         Parameters:
         - city (str): The name of the city to scrape. If None, data will be scraped for all cities except those in the exclusion list.
+        - addresses (list[dict]): Delivery addresses ("address", "street_number", optional "latitude" and "longitude"), the configured ones by default.
         """
     
         print('START scraping')  # Print a message indicating the start of the scraping process
-        markets = self.__get_markets()
-        stores = [store for market in markets for store in self.__get_stores(market)]
-        for store in stores:
-            self.__scrape_store(store)
-    
-    def __scrape_store(self, store):
-        print(f'===> store : {store["store_name"]} / {store["store_url"]}')
-        pages = self.__get_pages(store)
-        print(f'---> pages : {len(pages)}')
-        products_list = self._apply_multi_threading(pages, self.__get_products)
-        print(f'---> product lists : {len(products_list)}')
-        products = [product for products in products_list for product in products]
-        print(f'---> found products : {len(products)}')
-        products = self._apply_multi_threading(products, self.__scrape_product)
-        print(f'---> store products : {len(products)}')
-        self._save_products_in_csv(products, self._get_file_path(f"{store['store_name']}_{self.file_path}"))
-        
-    def __get_products(self, page: dict[str, str]) -> dict[str, str]:
-        print(f'---> page : {page["store_url"]}')
-        response, _ = self._get_response_until_success(page["store_url"], cookies=self.cookies)  # Get the response from the cities URL
-        if response == "":
+        if self.metrics_port:
+            metrics.serve(self.metrics_port)
+        self.__open_sessions(addresses or self.__get_configured_addresses())
+        if self.scrape_role == "worker":
+            asyncio.run(self.__work())
+            return
+        if self.daemon:
+            asyncio.run(self.__serve())
+            return
+        markets = self.__merge_markets()
+        if not markets:
+            print("No market found for any address, stopping")
+            return
+        pending = {}
+        if self.frontier is not None:
+            self.file_path = self.frontier.start_run(self.file_path)  # The csv files of an interrupted run are completed
+            pending = self.frontier.get_pending(self.stores)
+        if self.change_capture is not None:
+            self.change_capture.start_run(os.path.splitext(self.file_path)[0])
+        asyncio.run(self.__scrape_markets(markets, pending))
+
+    async def __scrape_markets(self, markets, pending):
+        # Stores, pages, product links and products stream through bounded stages, so
+        # every store is scraped at the same time and products are saved as they arrive
+        pipeline = Pipeline(self.frontier)
+        pipeline.add_stage("stores", self.__get_stores, workers=10, fan_out=True)
+        pipeline.add_stage("pages", self.__get_pages, workers=20, fan_out=True)
+        if self.scrape_role == "coordinator":
+            self.work_queue.start_run(self.file_path)
+            pipeline.add_stage("publish", self.__publish_page, workers=1)  # The workers scrape the products
+        else:
+            self.__add_product_stages(pipeline)
+        try:
+            await pipeline.run(markets, pending)
+            finished = self.frontier.finish_run() if self.frontier is not None else True
+            if self.change_capture is not None and finished:
+                self.change_capture.finish_run()  # The delisted products are only known once the run is complete
+            if self.scrape_role == "coordinator":
+                if finished:
+                    self.work_queue.finish_publishing(self.file_path)
+                    await self.__wait_for_workers()
+                else:
+                    print(f'---> run {self.file_path} unfinished, the pages left are published when it resumes')
+        finally:
+            await self.__close()
+
+    def __add_product_stages(self, pipeline: Pipeline) -> None:
+        pipeline.add_stage("product links", self.__get_products, workers=50, fan_out=True)
+        pipeline.add_stage("products", self.__scrape_product, workers=self.max_concurrency)
+        pipeline.add_stage("csv", self.__save_product, workers=1)
+
+    async def __publish_page(self, page: dict[str, str]) -> None:
+        await asyncio.to_thread(self.work_queue.publish, self.file_path, [page])
+
+    async def __wait_for_workers(self) -> None:
+        while not await asyncio.to_thread(self.work_queue.is_run_finished, self.file_path):
+            print(f'---> work units : {self.work_queue.get_stats(self.file_path)}')
+            await asyncio.sleep(10)
+        print(f'---> run finished, work units : {self.work_queue.get_stats(self.file_path)}')
+
+    async def __work(self) -> None:
+        """
+        Claim the listing pages published by the coordinator and scrape their products, until no work
+        came in for `worker_idle_timeout` seconds.
+
+        The leases of the claimed pages are renewed while they are scraped, a page whose worker died
+        is delivered again to another worker once its lease expires.
+        """
+
+        print(f'---> worker {self.worker_id} started')
+        idle_since = time.monotonic()
+        try:
+            while True:
+                units = await asyncio.to_thread(self.work_queue.claim, self.worker_id, self.worker_batch_size)
+                if not units:
+                    if time.monotonic() - idle_since > self.worker_idle_timeout:
+                        break
+                    await asyncio.sleep(5)
+                    continue
+                for run_id, run_units in itertools.groupby(units, key=lambda unit: unit[1]):
+                    await self.__work_on_units(run_id, list(run_units))
+                idle_since = time.monotonic()
+        finally:
+            await self.__close()
+
+    async def __work_on_units(self, run_id: str, units: list[tuple[str, str, dict]]) -> None:
+        unit_ids = [unit_id for unit_id, _, _ in units]
+        self.file_path = f"{self.worker_id}_{run_id}"  # Every worker writes its own csv files of the run
+        self.unit_results = {unit_id: 0 for unit_id in unit_ids}
+        # Product links are deduplicated within a batch: a unit delivered again lists its products again
+        self.listed_products = SeenUrls()
+
+        async def heartbeat():
+            while True:
+                await asyncio.sleep(self.work_queue.lease_seconds / 3)
+                await asyncio.to_thread(self.work_queue.heartbeat, self.worker_id, unit_ids)
+
+        pipeline = Pipeline()
+        self.__add_product_stages(pipeline)
+        heartbeat_task = asyncio.ensure_future(heartbeat())
+        try:
+            await pipeline.run([{**page, "unit_id": unit_id} for unit_id, _, page in units])
+        finally:
+            heartbeat_task.cancel()
+        self.__flush_outputs()
+        for unit_id in unit_ids:
+            await asyncio.to_thread(self.work_queue.complete, self.worker_id, unit_id, self.unit_results[unit_id])
+
+    async def __serve(self) -> None:
+        """
+        Recrawl the due markets, stores and listing pages in cycles until the process is stopped (SIGTERM or SIGINT).
+
+        The event loop, the sessions and the connection pools stay the same from one cycle to the
+        next. A recrawled market adds its stores to the schedule, a store its listing pages, and a
+        listing page sends its products through the product stages. A stop cancels the cycle in
+        progress, its claimed targets are due again after the minimum interval, and the outputs
+        written so far are flushed.
+        """
+
+        stopped = asyncio.Event()
+        for signal_number in (signal.SIGTERM, signal.SIGINT):
+            asyncio.get_running_loop().add_signal_handler(signal_number, stopped.set)
+        day = None
+        try:
+            while not stopped.is_set():
+                if day != datetime.date.today():
+                    day = datetime.date.today()
+                    await self.__start_day(day)
+                targets = await asyncio.to_thread(self.scheduler.claim_due, self.recrawl_batch_size)
+                if not targets:
+                    next_due = self.scheduler.get_next_due()
+                    wait = 60 if next_due is None else min(60, max(1, next_due - time.time()))
+                    try:
+                        await asyncio.wait_for(stopped.wait(), wait)  # Wakes up early to stop
+                    except asyncio.TimeoutError:
+                        pass
+                    continue
+
+                # Products are deduplicated within a cycle, not across cycles
+                self.run_started_at = time.time()
+                self.listed_products = SeenUrls()
+                self.fetched_products = SeenUrls()
+                self.fetched_details.clear()
+                pipeline = Pipeline()
+                pipeline.add_stage("recrawl", self.__recrawl, workers=20, fan_out=True)
+                self.__add_product_stages(pipeline)
+                cycle = asyncio.ensure_future(pipeline.run(targets))
+                stop = asyncio.ensure_future(stopped.wait())
+                await asyncio.wait([cycle, stop], return_when=asyncio.FIRST_COMPLETED)
+                stop.cancel()
+                if not cycle.done():
+                    cycle.cancel()  # The fetches in flight release their slots and sessions
+                    await asyncio.gather(cycle, return_exceptions=True)
+                    print(f'---> recrawl cycle stopped after {time.time() - self.run_started_at:.1f}s')
+                self.__flush_outputs()
+                if not cycle.cancelled():
+                    cycle.result()
+                    print(f'---> recrawl cycle : {len(targets)} targets in {time.time() - self.run_started_at:.1f}s, schedule : {self.scheduler.get_stats()}')
+        finally:
+            await self.__close()
+
+    async def __start_day(self, day: datetime.date) -> None:
+        # Every day gets its own csv files and changes file, and the markets seen from the addresses are scheduled
+        self._close_csv_files()
+        self.file_path = f"{day.strftime('%Y_%m_%d')}_00_00.csv"
+        if self.change_capture is not None:
+            self.change_capture.flush()
+            self.change_capture.close_file()
+            self.change_capture.start_run(os.path.splitext(self.file_path)[0])
+        for market in await asyncio.to_thread(self.__merge_markets):
+            self.scheduler.add("market", market["market_url"], market)
+
+    async def __recrawl(self, target: tuple[str, str, dict]) -> list[dict]:
+        """
+        Recrawl a target of the schedule and record whether it changed.
+
+        Parameters:
+        - target (tuple): The kind, key and payload of the target.
+
+        Returns:
+        - list: The listing pages whose products are scraped.
+        """
+
+        kind, key, item = target
+        open_programs = item.get("market_open_programs")
+        closed = bool(item.get("market_close_program"))
+        # A read that failed or found nothing (404, expired session, empty body) leaves the target as it was:
+        # its children and statistics are kept, and the claim makes it due again after the minimum interval
+        if kind == "market":
+            stores = await self.__get_stores(item)
+            if not stores:
+                metrics.inc("recrawls_total", kind=kind, changed="failed")
+                return []
+            for store in stores:
+                self.scheduler.add("store", store["store_url"], store, key)
+            self.scheduler.retire(key, [store["store_url"] for store in stores])
+            changed = self.scheduler.observe(key, self.scheduler.get_signature(sorted(store["store_url"] for store in stores)), open_programs, closed)
+            metrics.inc("recrawls_total", kind=kind, changed=str(changed).lower())
             return []
-        soup = BeautifulSoup(response, "html.parser")
-        product_elements = soup.select(".box-product a")
+        prefetched = []  # Pages past the paginator window, fetched with their product tiles by __get_pages
+        if kind == "store":
+            # The store stands for its first page, read with the pagination: both change its signature
+            pages = await self.__get_pages(item)
+            product_tiles = pages[0]["product_tiles"] if pages else []
+            if product_tiles:
+                for page in pages[1:]:
+                    self.scheduler.add("page", page["store_url"], {field: value for field, value in page.items() if field != "product_tiles"}, key)
+                    if page.get("product_tiles"):
+                        # Scraped with this cycle and recorded as recrawled, so it isn't due again right away
+                        self.scheduler.observe(page["store_url"], self.scheduler.get_signature([tile["fingerprint"] for tile in page["product_tiles"]]), open_programs, closed)
+                        prefetched.append(page)
+                self.scheduler.retire(key, [page["store_url"] for page in pages[1:]])
+            signature = [page["store_url"] for page in pages] + [tile["fingerprint"] for tile in product_tiles]
+        else:
+            product_tiles = await self.__fetch_page(item["store_url"], extract_product_tiles, addresses=item.get("addresses")) or []
+            signature = [tile["fingerprint"] for tile in product_tiles]
+        if not product_tiles:
+            metrics.inc("recrawls_total", kind=kind, changed="failed")
+            return []
+        changed = self.scheduler.observe(key, self.scheduler.get_signature(signature), open_programs, closed)
+        metrics.inc("recrawls_total", kind=kind, changed=str(changed).lower())
+        return [{**item, "product_tiles": product_tiles}] + prefetched
+
+    async def __close(self) -> None:
+        self._close_csv_files()
+        if self.file_sink is not None:
+            self.file_sink.close()  # Writes the last row groups
+            print(f'---> output files : {self.file_sink.written} products in {len(self.file_sink.file_paths)} {self.output_format} files ({self.file_sink.get_size() / 1024 ** 2:.1f} MiB), {self.file_sink.failed} failed')
+        if self.db_writer is not None:
+            self.db_writer.close()  # Writes the last batch
+            print(f'---> database : {self.db_writer.written} products written, {self.db_writer.failed} failed')
+        if self.change_capture is not None:
+            self.change_capture.flush()
+            self.change_capture.close_file()
+            print(f'---> changes : {self.change_capture.counts} in {self.change_capture.changes_path}')
+        self.parse_pool.close()
+        await self.fetcher.close()  # Release the pooled connections of the event loop
+        print(f'---> connection pool : {self.fetcher.pool.get_stats()}')
+        print(f'---> proxies : {self.proxy_scheduler.get_stats()}')
+        print(f'---> concurrency : {self.fetcher.controller.get_stats()}')
+        if self.http_cache is not None:
+            print(f'---> http cache : {self.http_cache.stats}')
+        if self.scrape_mode == "incremental":
+            print(f'---> unchanged products skipped : {self.skipped_products}')
+        elif self.scrape_mode == "fast":
+            print(f'---> prices refreshed from the listings : {self.skipped_products}')
+        print(f'---> duplicates : {self.listed_products.duplicates} product links, {self.fetched_products.duplicates} product pages, {self.inflight.coalesced} requests coalesced')
+        print(f'---> sessions created : {sum(sessions.refreshes for sessions in self.sessions.values())}')
+        if self.scheduler is not None:
+            print(f'---> schedule : {self.scheduler.get_stats()}')
+        summary_path = self._get_file_path(f"{os.path.splitext(self.file_path)[0]}_metrics.json")
+        try:
+            metrics.save_summary(summary_path)  # Timings, bytes, retries and proxy outcomes of the run
+            print(f'---> metrics summary : {summary_path}')
+        except OSError as e:
+            print(f"Can't save the metrics summary : {e}")
+
+    async def __save_product(self, product: Product | dict[str, str]) -> None:
+        if not product:
+            return
+        if self.change_capture is not None:
+            self.change_capture.capture(product)
+        if self.change_capture is not None and self.changes_output == "only":
+            pass  # Only the changes are written, no full dump
+        elif self.file_sink is not None:
+            await self.file_sink.put_async(product, os.path.splitext(self.file_path)[0])
+        else:
+            with metrics.timer("sink_write_seconds", sink="csv"):
+                self._write_product_in_csv(product, self._get_file_path(f"{product['store']}_{self.file_path}"))
+            metrics.inc("sink_rows_total", sink="csv")
+        if self.db_writer is not None:
+            await self.db_writer.put_async(product)
+
+    async def __get_products(self, page: dict[str, str]) -> list[ProductLink]:
+        logger.info(f'---> page : {page["store_url"]}')
+        product_tiles = page.get("product_tiles")  # Already read when discovering the pagination
+        try:
+            if product_tiles is None:
+                product_tiles = await self.__fetch_page(page["store_url"], extract_product_tiles, addresses=page.get("addresses"))
+        finally:
+            if not product_tiles and self.change_capture is not None:
+                # A listed page without products (or that failed) doesn't tell which products were delisted
+                self.change_capture.mark_incomplete(page["market_name"], page["store_name"])
+        if not product_tiles:
+            return []
+        store = self.stores.intern(page)  # Shared by every product of the store
         products = []
-        for element in product_elements:
-            products.append({
-                **page,
-                "product_url": element.get("href")
-            })
+        for tile in product_tiles:
+            product_url = normalize_url(tile["url"], self.main_url)
+            # A product listed twice in a store (several links of a tile, several pages) is scraped once for it
+            if not self.listed_products.add(f"{store.market.name} {store.name} {product_url}"):
+                continue
+            if self.change_capture is not None:
+                self.change_capture.mark_listed(store.market.name, store.name, product_url)
+            products.append(ProductLink(store, product_url, tile["fingerprint"], tile["name"], tile["price"], tile["currency"], page.get("unit_id")))
         return products
     
-    def __scrape_product(self, product: dict[str, str]) -> dict[str, str]:
-        print(f'---> product : {product["product_url"]}')
-        response, _ = self._get_response_until_success(product["product_url"], cookies=self.cookies)  # Get the response from the cities URL
-        if response == "":
-            return []
-        soup = BeautifulSoup(response, "html.parser")
-        product_name = soup.select_one("h1.product-name").get_text(strip=True)
-        price_list = soup.select_one(".product-price").get_text(strip=True).split()
-        calculator = soup.select_one("div.product-price-calculator")
-        product_price= ""
-        product_currency= ""
-        
-        if calculator:
-            price_element = soup.select_one("div.product-price-calculator p:first-child")
-            product_price, product_currency = price_element.get_text(strip=True).replace("~", "").replace("/", "").strip().split()
-        else: product_price, product_currency = soup.select_one(".product-price").get_text(strip=True).replace("~", "").replace("/", "").strip().split()
-        product_brand = ""
-        product_number = ""
-        product_description = ""
-        
-        images_elements = soup.select(".thumbnail-image img")
-        product_images = [element.get("src") for element in images_elements]
-        
-        details_elements = soup.select("#details p")
-        if len(details_elements) == 0:
-            description_element = soup.select_one("#details")
-            product_description = description_element.get_text(separator="\n", strip=True) if description_element else ""
-        else :
-            for element in details_elements:
-                content = element.get_text(strip=True)
-                if "Numéro du produit" in content:
-                    product_number = content.split(":").pop().strip()
-                elif "Marque" in content:
-                    product_brand = content.split(":").pop().strip()
-                else:
-                    product_description += element.get_text(separator="\n", strip=True)
-        product_image = soup.select_one("#main-image").get("src")
-        return {
-            "product_id": self._get_hash(f"{product_name}_{product_image}"),
-            "market": product["market_name"],
-            "market_image": product["market_image"],
-            "store": product["store_name"],
-            "store_image": product["store_image"],
-            "name": product_name,
-            "price": product_price,
-            "currency": product_currency,
-            "brand": product_brand,
-            "description": product_description,
-            "number": product_number,
-            "image": product_image,
-            "images": ",".join(product_images),
-            "url": self._get_full_url(product["product_url"]),
-            "date": datetime.datetime.utcnow().isoformat() + "Z"
-        }
-
-    def __get_stores(self, market: dict[str, str]) -> list[dict[str, str]]:
-        response, _ = self._get_response_until_success(market["market_url"], cookies=self.cookies)  # Get the response from the cities URL
-        # with open("response.html", "w") as file:
-        #     file.write(str(response))
-        if response == "":
+    async def __scrape_product(self, product: ProductLink) -> list[Product] | Product:
+        product_url = self._get_full_url(product.product_url)
+        details = None
+        if self.scrape_mode == "incremental" and self.product_index is not None:
+            details = self.product_index.get_unchanged_details(product_url, product.fingerprint, self.incremental_max_age)
+        elif self.scrape_mode == "fast" and self.product_index is not None:
+            details = self.__get_refreshed_details(product_url, product)
+        if details is not None:
+            self.skipped_products += 1
+            metrics.inc("products_total", source=self.scrape_mode)  # Known details reused instead of a fetch
+        elif not self.fetched_products.add(product_url):
+            # Already fetched for another store
+            if self.product_index is not None:
+                details = self.product_index.get_details(product_url, self.run_started_at)
+            else:
+                details = self.fetched_details.get(product_url)
+        if details is None:
+            logger.info(f'---> product : {product.product_url}')
+            details = await self.__fetch_page(product.product_url, extract_product, addresses=product.store.addresses)
+            if details is None:
+                return []
+            metrics.inc("products_total", source="page")
+            if self.product_index is not None:
+                self.product_index.update(product_url, self._get_hash(f"{details['name']}_{details['image']}"), product.fingerprint, details)
+            elif self.fetched_details_size:
+                self.fetched_details[product_url] = details
+                if len(self.fetched_details) > self.fetched_details_size:
+                    self.fetched_details.popitem(last=False)  # The oldest details, the least likely listed again
+        if product.unit_id is not None:
+            self.unit_results[product.unit_id] += 1  # Reported to the coordinator with the work unit
+        # The date has a second resolution so the products scraped in the same second share it
+        date = datetime.datetime.utcnow().replace(microsecond=0).isoformat() + "Z"
+        return Product(self._get_hash(f"{details['name']}_{details['image']}"), product.store, details, product_url, date)
+
+    def __get_refreshed_details(self, product_url: str, product: ProductLink) -> dict[str, str] | None:
+        """
+        Get the details of a known product with the price shown on its listing tile.
+
+        Parameters:
+        - product_url (str): The full URL of the product page.
+        - product (ProductLink): The product link, with the name, price and currency shown on its tile.
+
+        Returns:
+        - dict: The known details with the new price, or None if the product page must be fetched (new
+          product, no price on the tile, or a tile name not matching the known product).
+        """
+
+        if not product.tile_price:
+            return None
+        details = self.product_index.get_details(product_url, 0)
+        if details is None or " ".join(product.tile_name.split()).lower() != " ".join(details["name"].split()).lower():
+            return None
+        return {**details, "price": product.tile_price, "currency": product.tile_currency}
+
+    async def __fetch_page(self, url: str, extract: Callable, is_incomplete: Callable = lambda values: not values, addresses: list[str] = None) -> Any:
+        """
+        Fetch a page with one of the pooled sessions and extract values from it.
+
+        The values stored in the response cache are reused when the page didn't change. A page
+        with incomplete values that turns out to be the address selection page means the session
+        expired: the session is replaced and the page is fetched again with another one.
+        Concurrent calls for the same page and extractor share a single fetch.
+
+        Parameters:
+        - url (str): The URL of the page.
+        - extract (Callable): Module level function extracting JSON serializable values from the content.
+        - is_incomplete (Callable): Tells whether the extracted values look like the page wasn't served as expected.
+        - addresses (list[str]): Labels of the addresses seeing the page, the page is fetched with the session of one of them.
+
+        Returns:
+        - Any: The extracted values, None if the page doesn't exist.
+        """
+
+        full_url = self._get_full_url(url)
+        return await self.inflight.run((full_url, extract.__name__), lambda: self.__fetch_and_extract(url, full_url, extract, is_incomplete, addresses))
+
+    async def __fetch_and_extract(self, url: str, full_url: str, extract: Callable, is_incomplete: Callable, addresses: list[str] | None) -> Any:
+        labels = [label for label in (addresses or []) if label in self.sessions] or list(self.sessions)
+        for attempt in range(self.session_retries):
+            sessions = self.sessions[labels[attempt % len(labels)]]
+            cookies = await self.__get_cookies(sessions)
+            response, status_code = await self._fetch_until_success(url, cookies=cookies)
+            if response == "":
+                return None
+            values = None
+            expired = False
+            if status_code == 304 and self.http_cache is not None:
+                values = self.http_cache.get_parsed(full_url, extract.__name__)  # Unchanged page, no need to parse it again
+            if values is None:
+                try:
+                    values = await self.parse_pool.parse(extract, response)
+                except Exception:
+                    expired = await self.parse_pool.parse(is_address_page, response)
+                    if not expired:
+                        raise
+            if not expired and (values is None or is_incomplete(values)):
+                expired = await self.parse_pool.parse(is_address_page, response)
+            if not expired:
+                break
+            sessions.invalidate(cookies)
+            if self.http_cache is not None:
+                self.http_cache.delete(full_url)  # Don't serve the address page again from the cache
+        else:
+            raise RuntimeError(f"Session expired {self.session_retries} times in a row for {url}")
+
+        if self.http_cache is not None and values is not None:
+            self.http_cache.set_parsed(full_url, extract.__name__, values)
+        return values
+
+    async def __get_cookies(self, sessions: SessionManager) -> dict[str, str]:
+        session = sessions.get_session(timeout=0)
+        if session is None:
+            # Every session expired, wait for the background refresh without blocking the event loop
+            session = await asyncio.to_thread(sessions.get_session, self.session_timeout)
+        if session is None:
+            raise RuntimeError("No session could be created for the address")
+        return session["cookies"]
+
+    def __bootstrap_session(self, address: dict[str, str]) -> dict | None:
+        markets, cookies = self.__get_markets(address)
+        if not markets or not cookies:
+            return None
+        return {"cookies": cookies, "markets": markets}
+
+    async def __get_stores(self, market: dict[str, str]) -> list[dict[str, str]]:
+        market_stores = await self.__fetch_page(market["market_url"], extract_stores, addresses=market.get("addresses"))
+        if not market_stores:
             return []
-        soup = BeautifulSoup(response, "html.parser")
-        store_elements = soup.select(".box-inner")
         stores = []
-        for store_element in store_elements:
-            store_url = store_element.get("href")
-            store_image = store_element.select_one("img").get("src")
-            store_name = store_element.select_one("h4").get_text(strip=True)
+        for store in market_stores:
             stores.append({
                 "market_name": market["market_title"],
                 "market_image": market["market_image"],
                 "market_open_programs": market["market_open_programs"],
                 "market_close_program": market["market_close_program"],
-                "store_url": store_url,
-                "store_image": store_image,
-                "store_name": store_name
+                "addresses": market.get("addresses", []),
+                **store
             })
         return stores
 
-    def __get_pages(self, store: dict[str, str]) -> list[dict[str, str]]:
-        response, _ = self._get_response_until_success(store["store_url"])
-        if response == "":
+    async def __get_pages(self, store: dict[str, str]) -> list[dict[str, str]]:
+        # The first page is parsed once for its pagination and its product tiles, which travel with it
+        listing = await self.__fetch_page(store["store_url"], extract_listing, is_incomplete=lambda listing: not listing["tiles"], addresses=store.get("addresses"))
+        if listing is None:
             return []
-        soup = BeautifulSoup(response, "html.parser")
-        pagination = soup.select('ul.pagination a.page-link')
-        page_size = 1
-        if pagination:
-            page_size = int(pagination[-2].get_text()) if len(pagination) >= 2 else 1
-        pages = [store]
+        page_size = listing["page_count"]
+        pages = [{**store, "product_tiles": listing["tiles"]}]
         count = 2
         while count <= page_size:
             page_url = f"{store['store_url']}?page={count}"
@@ -196,80 +713,151 @@ class BringoScraper(Scraper):
             page["store_url"] = page_url
             pages.append(page)
             count += 1
+        if listing["truncated"]:
+            pages += await self.__prefetch_pages(store, page_size + 1)
 
-        print(f"Page size of category {store['store_name']} : {len(pages)}")
+        logger.info(f"Page size of category {store['store_name']} : {len(pages)}")
         return pages
 
-    def __get_markets(self):
+    async def __prefetch_pages(self, store: dict[str, str], first_page: int) -> list[dict[str, str]]:
+        """
+        Fetch the pages past the window shown by the paginator, a few at a time, until a page has no products.
+
+        Parameters:
+        - store (dict): The store.
+        - first_page (int): The first page not shown by the paginator.
+
+        Returns:
+        - list: The pages found, with their product tiles.
+        """
+
+        pages = []
+        last_tiles = None
+        number = first_page
+        while True:
+            urls = [f"{store['store_url']}?page={page_number}" for page_number in range(number, number + self.pagination_prefetch)]
+            listings = await asyncio.gather(*[self.__fetch_page(url, extract_listing, addresses=store.get("addresses")) for url in urls], return_exceptions=True)
+            for url, listing in zip(urls, listings):
+                # Past the last page the site serves an empty listing, or the last page again
+                if isinstance(listing, BaseException) and self.change_capture is not None:
+                    self.change_capture.mark_incomplete(store["market_name"], store["store_name"])  # More pages may have followed
+                if isinstance(listing, BaseException) or not listing or not listing["tiles"] or listing["tiles"] == last_tiles:
+                    return pages
+                pages.append({**store, "store_url": url, "product_tiles": listing["tiles"]})
+                last_tiles = listing["tiles"]
+            number += self.pagination_prefetch
+
+    def __get_markets(self, address: dict[str, str]):
+        markets, cookies, status_code = self.__get_markets_over_http(address)
+        print(f'{self.main_url} -> status : {status_code}')
+        if markets:
+            return (markets, cookies)
+        if status_code == 404 or status_code == 301 or (status_code is not None and status_code >= 500):
+            return ([], None)  # The site itself is down, a browser wouldn't get further
+        print("Can't select the address over HTTP, falling back to selenium")
+        return self.__get_markets_with_selenium(address)
+
+    def __get_markets_over_http(self, address: dict[str, str]):
+        """
+        Select the delivery address with plain HTTP requests, without starting a browser.
+
+        The address form of the home page is submitted with its hidden fields, the address and the
+        street number (and the coordinates the Google Places widget would fill in, when configured),
+        then the stores list is read from the response and the PHPSESSID cookie from the session.
+
+        Parameters:
+        - address (dict): The address, street number and optional coordinates to select.
+
+        Returns:
+        - tuple: The markets of the address (empty if the stores list couldn't be reached), the session cookies
+          and the status code of the home page (None if it couldn't be fetched).
+        """
+
+        proxy = self._get_proxy()
+        proxy_url = proxy["http"] if proxy is not None else None
+        start_time = time.monotonic()
+        status_code = None
+        try:
+            session = requests.Session()  # Own cookie jar, the session cookie belongs to this address only
+            session.headers.update({'User-Agent': 'Mozilla/5.0'})
+            if proxy is not None:
+                session.proxies = proxy
+            response = session.get(self.main_url, timeout=20)
+            status_code = response.status_code
+            self.proxy_scheduler.report(proxy_url, time.monotonic() - start_time, status_code < 500 and status_code != 429, banned=status_code == 403)
+            form = extract_address_form(response.content)
+            if form is None:
+                return ([], None, status_code)
+
+            fields = {**form["fields"], form["address_field"]: address["address"]}
+            if form["street_number_field"] and address.get("street_number"):
+                fields[form["street_number_field"]] = str(address["street_number"])
+            for name in fields:
+                if address.get("latitude") and name in ("lat", "latitude"): fields[name] = address["latitude"]
+                if address.get("longitude") and name in ("lng", "lon", "longitude"): fields[name] = address["longitude"]
+
+            action = self._get_full_url(form["action"] or "/")
+            if form["method"] == "get": response = session.get(action, params=fields, timeout=20)
+            else: response = session.post(action, data=fields, timeout=20)
+
+            markets = extract_markets(response.content)
+            if not markets:
+                markets = extract_markets(session.get(self.main_url, timeout=20).content)  # The address is kept in the session
+            cookie = session.cookies.get("PHPSESSID")
+            if not markets or cookie is None:
+                return ([], None, status_code)
+            print(f"---> address selected over HTTP : {len(markets)} markets")
+            return (markets, {"PHPSESSID": cookie}, status_code)
+        except Exception as e:
+            if status_code is None:
+                self.proxy_scheduler.report(proxy_url, time.monotonic() - start_time, False)
+            print(f"Error while selecting the address over HTTP : {e}")
+            return ([], None, status_code)
+        finally:
+            self.proxy_scheduler.release(proxy_url)  # No probe left behind when the first request didn't go through
+
+    def __get_markets_with_selenium(self, address: dict[str, str]):
+        driver = None
         try:
-            (_, status_code) = self._get_response_until_success(self.main_url)
-            print(f'{self.main_url} -> status : {status_code}')
-            if status_code == 404 or status_code == 301 or status_code == 500: return []
             driver, wait = self._create_driver()
-            while driver is None:
+            attempts = 1
+            while driver is None and attempts < self.chrome_start_attempts:
                 time.sleep(5)
                 driver, wait = self._create_driver()
+                attempts += 1
             if driver is None:
                 print("can't create chrome driver")
-                return []
+                return ([], None)
             driver.get(self.main_url)
                 
             address_xpath = '//*[@id="address"]'
             street_num_xpath = '//*[@id="street_number"]'
 
-            street_num = driver.find_element(By.XPATH, street_num_xpath)
-            street_num.send_keys(self.tower)
+            if address.get("street_number"):
+                street_num = driver.find_element(By.XPATH, street_num_xpath)
+                street_num.send_keys(str(address["street_number"]))
 
-            address = driver.find_element(By.XPATH, address_xpath)
-            address.send_keys(self.city)
-            address.click()
+            address_input = driver.find_element(By.XPATH, address_xpath)
+            address_input.send_keys(address["address"])
+            address_input.click()
             
             wait.until(EC.element_to_be_clickable((By.CLASS_NAME, 'pac-item'))).click()
 
             button = driver.find_element(By.XPATH, '//*[@id="view_stores"]')
             button.click()
             markets_list = wait.until(EC.presence_of_element_located((By.ID, 'stores-list')))
-            markets_elements_soup = BeautifulSoup(markets_list.get_attribute("outerHTML"), "html.parser")
-            markets_elements = markets_elements_soup.select(".box-store")
-            markets = []
-            for market_element in markets_elements:
-                market_url = market_element.select_one("a").get("href")
-                market_title = market_element.select_one(".store-title").get_text(strip=True)
-                market_image = market_element.select_one(".store-image-thumbnail img").get("src")
-                market_close_program_element = market_element.select_one(".store-close-program")
-                market_close_program = ""
-                if market_close_program_element:
-                    market_close_program = market_close_program_element.get_text(strip=True)
-                market_open_program_elements = market_element.select(".store-program-day")
-                market_open_programs = []
-                for market_open_program_element in market_open_program_elements:
-                    print(4)
-                    market_open_program_week_day = market_open_program_element.select_one(".store-program-week-day").get_text(strip=True)
-                    print(5)
-                    market_open_program_time = market_open_program_element.get_text(strip=True).replace(market_open_program_week_day, "").strip()
-                    market_open_programs.append({
-                        "week_day": market_open_program_week_day,
-                        "time": market_open_program_time
-                    })
-                markets.append({
-                    "market_url": market_url,
-                    "market_image": market_image,
-                    "market_title": market_title,
-                    "market_close_program": market_close_program,
-                    "market_open_programs": market_open_programs 
-                })
-                pass
+            markets = extract_markets(markets_list.get_attribute("outerHTML"))
             print(driver.get_cookies())
             cookie = driver.get_cookie("PHPSESSID")
             driver.quit()
-            self.cookies = {"PHPSESSID": cookie["value"]}
-            return markets
+            return (markets, {"PHPSESSID": cookie["value"]})
                 
 
         except Exception as e:
             print(f"Error in selenium : {e}")
-            driver.quit()
-            return []
+            if driver is not None:
+                driver.quit()
+            return ([], None)
   
 if __name__ == "__main__":
     bot = BringoScraper()
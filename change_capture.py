@@ -0,0 +1,221 @@
+import hashlib
+import json
+import os
+import time
+from typing import Any
+from urllib.parse import urlsplit
+
+from metrics import metrics
+from sqlite_store import SqliteStore
+
+
+class ChangeCapture(SqliteStore):
+    """
+    Change data capture of the scraped products against the snapshot of the previous runs.
+
+    The snapshot keeps one compact row per product of a store: a 64 bit key of its market, store
+    and URL, a 64 bit digest of its tracked fields and the tracked fields themselves. Every product
+    scraped is compared with it, and an insert or an update event with the changed fields is
+    appended to the changes file of the run (JSON lines). Once the run is complete, the products
+    of the stores listed by the run that were not listed anymore are emitted as delete events,
+    except in the stores with a listing page that couldn't be read.
+
+    Snapshot updates are buffered and committed by `flush`, after the changes file is flushed, so
+    a crashed run replays the events of its uncommitted products instead of losing them.
+    """
+
+    schema = """
+        CREATE TABLE IF NOT EXISTS snapshot (
+            product_key INTEGER PRIMARY KEY,
+            digest INTEGER NOT NULL,
+            product_id TEXT,
+            market TEXT,
+            store TEXT,
+            url TEXT,
+            fields TEXT  -- JSON list of the tracked fields, in order
+        );
+        CREATE TABLE IF NOT EXISTS listed (product_key INTEGER PRIMARY KEY);
+        CREATE TABLE IF NOT EXISTS listed_stores (market TEXT, store TEXT, PRIMARY KEY (market, store));
+        CREATE TABLE IF NOT EXISTS incomplete_stores (market TEXT, store TEXT, PRIMARY KEY (market, store));
+        CREATE TABLE IF NOT EXISTS runs (run_name TEXT PRIMARY KEY, started_at REAL, finished_at REAL);
+    """
+
+    # Fields compared between two runs, the date changes on every run
+    tracked_fields = ["product_id", "name", "price", "currency", "brand", "description", "number", "image", "images", "addresses"]
+
+    def __init__(self, file_path: str, folder_path: str, flush_size: int = 1000):
+        """
+        Open the snapshot index.
+
+        Parameters:
+        - file_path (str): Path to the SQLite database of the snapshot.
+        - folder_path (str): Folder of the changes files.
+        - flush_size (int): Number of buffered snapshot updates committed at once when no checkpoint flushes them before.
+        """
+
+        super().__init__(file_path)
+        self.folder_path = folder_path
+        self.flush_size = flush_size
+        self.changes_path = None
+        self.counts = {"insert": 0, "update": 0, "delete": 0, "unchanged": 0}
+        self._file = None
+        self._upserts = {}  # Snapshot rows not committed yet by product key
+        self._listed = set()  # Product keys listed since the last commit
+        self._listed_stores = set()
+        self._incomplete_stores = set()  # Stores with a listing page that couldn't be read, since the last commit
+
+    @staticmethod
+    def _get_product_key(market: str, store: str, url: str) -> int:
+        parts = urlsplit(url)  # The host isn't part of the key, the products stay the same behind another domain
+        return ChangeCapture._get_hash(market, store, f"{parts.path}?{parts.query}")
+
+    @staticmethod
+    def _get_hash(*values: Any) -> int:
+        digest = hashlib.blake2b("\x1f".join("" if value is None else str(value) for value in values).encode(), digest_size=8).digest()
+        return int.from_bytes(digest, "little", signed=True)  # SQLite integers are signed 64 bit
+
+    def start_run(self, run_name: str) -> None:
+        """
+        Start capturing the changes of a run, or resume the capture of an interrupted run.
+
+        Parameters:
+        - run_name (str): Name of the run, the changes are written to `<run_name>_changes.jsonl`.
+        """
+
+        row = self._query_one("SELECT finished_at FROM runs WHERE run_name = ?", (run_name,))
+        if row is None:
+            with self._lock:
+                self._connection.execute("DELETE FROM listed")  # Listings of an unfinished older run
+                self._connection.execute("DELETE FROM listed_stores")
+                self._connection.execute("DELETE FROM incomplete_stores")
+                self._connection.execute("INSERT INTO runs (run_name, started_at) VALUES (?, ?)", (run_name, time.time()))
+                self._connection.commit()
+        self.changes_path = os.path.join(self.folder_path, f"{run_name}_changes.jsonl")
+        os.makedirs(self.folder_path, exist_ok=True)
+        self._file = open(self.changes_path, "a", encoding="utf-8")
+        self._run_name = run_name
+
+    def mark_listed(self, market: str, store: str, url: str) -> None:
+        """
+        Record that a product is still listed by a store, products of the store not listed by the run are deleted.
+
+        Parameters:
+        - market (str): Name of the market.
+        - store (str): Name of the store.
+        - url (str): Full URL of the product.
+        """
+
+        self._listed.add(self._get_product_key(market, store, url))
+        self._listed_stores.add((market, store))
+
+    def mark_incomplete(self, market: str, store: str) -> None:
+        """
+        Record that a listing page of a store couldn't be read, none of its products are deleted by the run.
+
+        Parameters:
+        - market (str): Name of the market.
+        - store (str): Name of the store.
+        """
+
+        self._incomplete_stores.add((market, store))
+
+    def capture(self, product: Any) -> dict[str, Any] | None:
+        """
+        Compare a scraped product with the snapshot and emit its change.
+
+        Parameters:
+        - product (Product | dict): The scraped product.
+
+        Returns:
+        - dict: The insert or update event written to the changes file, None if the product didn't change.
+        """
+
+        key = self._get_product_key(product["market"], product["store"], product["url"])
+        fields = [product.get(field) for field in self.tracked_fields]
+        digest = self._get_hash(*fields)
+        self._listed.add(key)  # A product scraped from a listing is listed, even if the listing wasn't marked (resumed run)
+        self._listed_stores.add((product["market"], product["store"]))
+        known = self._upserts.get(key)
+        if known is None:
+            row = self._query_one("SELECT digest, fields FROM snapshot WHERE product_key = ?", (key,))
+            known = (row[0], row[1]) if row is not None else None
+        if known is not None and known[0] == digest:
+            self.counts["unchanged"] += 1
+            return None
+
+        event = {"op": "insert" if known is None else "update", "product_id": product["product_id"], "market": product["market"], "store": product["store"], "url": product["url"], "date": product["date"]}
+        if known is None:
+            event["product"] = dict(zip(self.tracked_fields, fields))
+        else:
+            previous = json.loads(known[1])
+            event["changes"] = {field: [old, new] for field, old, new in zip(self.tracked_fields, previous, fields) if old != new}
+        self._emit(event)
+        self._upserts[key] = (digest, json.dumps(fields, ensure_ascii=False), product["product_id"], product["market"], product["store"], product["url"])
+        if len(self._upserts) >= self.flush_size:
+            self.flush()
+        return event
+
+    def _emit(self, event: dict[str, Any]) -> None:
+        self._file.write(json.dumps(event, ensure_ascii=False) + "\n")
+        self.counts[event["op"]] += 1
+        metrics.inc("changes_total", op=event["op"])
+
+    def flush(self) -> None:
+        """
+        Flush the changes file, then commit the snapshot updates and the listings.
+        """
+
+        if self._file is not None:
+            self._file.flush()
+        upserts, self._upserts = self._upserts, {}
+        listed, self._listed = self._listed, set()
+        listed_stores, self._listed_stores = self._listed_stores, set()
+        incomplete_stores, self._incomplete_stores = self._incomplete_stores, set()
+        with self._lock:
+            self._connection.executemany(
+                "INSERT OR REPLACE INTO snapshot (product_key, digest, fields, product_id, market, store, url) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                [(key, *values) for key, values in upserts.items()]
+            )
+            self._connection.executemany("INSERT OR IGNORE INTO listed (product_key) VALUES (?)", [(key,) for key in listed])
+            self._connection.executemany("INSERT OR IGNORE INTO listed_stores (market, store) VALUES (?, ?)", list(listed_stores))
+            self._connection.executemany("INSERT OR IGNORE INTO incomplete_stores (market, store) VALUES (?, ?)", list(incomplete_stores))
+            self._connection.commit()
+
+    def finish_run(self) -> None:
+        """
+        Emit the products of the listed stores that are not listed anymore as deletes, and close the changes file.
+
+        Only called once every product of the run was scraped: the products of a store with a listing
+        page that couldn't be read (or none read at all) are kept, rather than deleted.
+        """
+
+        self.flush()
+        rows = self._query(
+            """
+            SELECT product_key, product_id, market, store, url, fields FROM snapshot
+            WHERE product_key NOT IN (SELECT product_key FROM listed)
+            AND (market, store) IN (SELECT market, store FROM listed_stores)
+            AND (market, store) NOT IN (SELECT market, store FROM incomplete_stores)
+            """
+        )
+        date = time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime())
+        for _, product_id, market, store, url, fields in rows:
+            self._emit({"op": "delete", "product_id": product_id, "market": market, "store": store, "url": url, "date": date, "product": dict(zip(self.tracked_fields, json.loads(fields)))})
+        self._file.flush()
+        with self._lock:
+            self._connection.executemany("DELETE FROM snapshot WHERE product_key = ?", [(row[0],) for row in rows])
+            self._connection.execute("DELETE FROM listed")
+            self._connection.execute("DELETE FROM listed_stores")
+            self._connection.execute("DELETE FROM incomplete_stores")
+            self._connection.execute("UPDATE runs SET finished_at = ? WHERE run_name = ?", (time.time(), self._run_name))
+            self._connection.commit()
+        self.close_file()
+
+    def close_file(self) -> None:
+        """
+        Close the changes file of the run.
+        """
+
+        if self._file is not None:
+            self._file.close()
+            self._file = None
@@ -0,0 +1,235 @@
+import asyncio
+import email.utils
+import time
+
+
+class AimdLimiter:
+    """
+    Adaptive concurrency limit (additive increase, multiplicative decrease).
+
+    The limit grows by about one request per round trip while responses are fast and
+    successful, and is cut in half when the server pushes back (429, 5xx, timeouts).
+    A Retry-After header blocks new requests until the requested time.
+    """
+
+    def __init__(self, initial: float, minimum: float = 1, maximum: float = 1000, decrease: float = 0.5, latency_tolerance: float = 2.0):
+        """
+        Initialize the limiter.
+
+        Parameters:
+        - initial (float): Initial number of requests in flight.
+        - minimum (float): The limit never goes below this value.
+        - maximum (float): The limit never goes above this value.
+        - decrease (float): Factor applied to the limit on pushback.
+        - latency_tolerance (float): Responses slower than this multiple of the best average latency stop the increase.
+        """
+
+        self.limit = float(initial)
+        self.minimum = minimum
+        self.maximum = maximum
+        self.decrease = decrease
+        self.latency_tolerance = latency_tolerance
+        self.in_flight = 0
+        self.blocked_until = 0.0
+        self.latency = None  # EWMA of the response time (in seconds)
+        self.best_latency = None
+        self.last_decrease = 0.0
+        self._condition = None
+
+    def _get_condition(self) -> asyncio.Condition:
+        # The condition must be created inside the running event loop
+        if self._condition is None:
+            self._condition = asyncio.Condition()
+        return self._condition
+
+    async def acquire(self) -> None:
+        """
+        Wait for a free slot under the current limit.
+        """
+
+        await self.wait_available()
+        self.in_flight += 1  # No await since the wait, the slot can't be taken in between
+
+    def try_acquire(self) -> bool:
+        """
+        Take a free slot without waiting.
+
+        Returns:
+        - bool: True if a slot was taken.
+        """
+
+        if not self._has_slot():
+            return False
+        self.in_flight += 1
+        return True
+
+    async def wait_available(self) -> None:
+        """
+        Wait until a slot is free under the current limit, without taking it.
+        """
+
+        condition = self._get_condition()
+        async with condition:
+            while not self._has_slot():
+                wait_time = self.blocked_until - time.monotonic()
+                if wait_time <= 0:
+                    await condition.wait()
+                    continue
+                try:
+                    await asyncio.wait_for(condition.wait(), wait_time)
+                except asyncio.TimeoutError:
+                    pass
+
+    def _has_slot(self) -> bool:
+        return self.blocked_until <= time.monotonic() and self.in_flight < max(int(self.limit), 1)
+
+    async def cancel(self) -> None:
+        """
+        Give back a slot taken for a request that wasn't sent, without adjusting the limit.
+        """
+
+        self.in_flight -= 1
+        condition = self._get_condition()
+        async with condition:
+            condition.notify_all()
+
+    async def release(self, latency: float, success: bool, pushback: bool, retry_after: float = None) -> None:
+        """
+        Free the slot of a finished request and adjust the limit.
+
+        Parameters:
+        - latency (float): Response time of the request (in seconds).
+        - success (bool): True if the request succeeded.
+        - pushback (bool): True if the server pushed back (429, 5xx, timeout).
+        - retry_after (float): Seconds to wait before the next request, from the Retry-After header.
+        """
+
+        now = time.monotonic()
+        self.in_flight -= 1
+        if success:
+            self.latency = latency if self.latency is None else 0.2 * latency + 0.8 * self.latency
+            self.best_latency = self.latency if self.best_latency is None else min(self.best_latency, self.latency)
+            if self.latency <= self.best_latency * self.latency_tolerance:
+                self.limit = min(self.maximum, self.limit + 1 / self.limit)  # About +1 per round trip of the whole window
+        elif pushback:
+            # Cut at most once per round trip, a burst of errors from one window counts as one signal
+            if now - self.last_decrease >= (self.latency or 1.0):
+                self.limit = max(self.minimum, self.limit * self.decrease)
+                self.last_decrease = now
+            if retry_after:
+                self.blocked_until = max(self.blocked_until, now + retry_after)
+
+        condition = self._get_condition()
+        async with condition:
+            condition.notify_all()
+
+    def to_dict(self) -> dict:
+        return {
+            "limit": round(self.limit, 2),
+            "in_flight": self.in_flight,
+            "latency": round(self.latency, 3) if self.latency is not None else None
+        }
+
+
+class ConcurrencyController:
+    """
+    Feedback controller keeping one AIMD limit per host and one per proxy.
+
+    A request needs a slot from both the limiter of its host and the limiter of its proxy,
+    so a host pushing back slows every proxy down and a struggling proxy only slows itself.
+    """
+
+    def __init__(self, host_initial: float = 30, proxy_initial: float = 10, maximum: float = 1000):
+        """
+        Initialize the controller.
+
+        Parameters:
+        - host_initial (float): Initial concurrency of a host.
+        - proxy_initial (float): Initial concurrency of a proxy.
+        - maximum (float): Maximum concurrency of a host or proxy.
+        """
+
+        self.host_initial = host_initial
+        self.proxy_initial = proxy_initial
+        self.maximum = maximum
+        self.hosts = {}
+        self.proxies = {}
+
+    def _get_limiters(self, host: str, proxy: str | None) -> list[AimdLimiter]:
+        limiters = [self.hosts.setdefault(host, AimdLimiter(self.host_initial, maximum=self.maximum))]
+        if proxy is not None:
+            limiters.append(self.proxies.setdefault(proxy, AimdLimiter(self.proxy_initial, maximum=self.maximum)))
+        return limiters
+
+    async def acquire(self, host: str, proxy: str | None) -> None:
+        """
+        Wait for a slot of the host and of the proxy.
+
+        Both slots are taken together or not at all: the slot of the host is given back while the
+        proxy is full, so a busy proxy doesn't hold back the requests sent to the host through the
+        other proxies, and a task cancelled while waiting holds no slot.
+
+        Parameters:
+        - host (str): The host of the request.
+        - proxy (str): The proxy url, or None for direct connections.
+        """
+
+        host_limiter, *proxy_limiters = self._get_limiters(host, proxy)
+        while True:
+            await host_limiter.acquire()
+            if not proxy_limiters or proxy_limiters[0].try_acquire():
+                return
+            await host_limiter.cancel()
+            await proxy_limiters[0].wait_available()
+
+    async def release(self, host: str, proxy: str | None, latency: float, status_code: int = None, retry_after: str = None) -> None:
+        """
+        Free the slots of a finished request and feed its outcome back to the limits.
+
+        Parameters:
+        - host (str): The host of the request.
+        - proxy (str): The proxy url, or None for direct connections.
+        - latency (float): Response time of the request (in seconds).
+        - status_code (int): The HTTP status code, None if the request failed (timeout, connection error).
+        - retry_after (str): The Retry-After header of the response.
+        """
+
+        success = status_code is not None and (status_code < 400 or status_code == 404)
+        pushback = status_code is None or status_code == 429 or status_code >= 500
+        retry_after_seconds = self.parse_retry_after(retry_after)
+        for limiter in self._get_limiters(host, proxy):
+            await limiter.release(latency, success, pushback, retry_after_seconds)
+
+    @staticmethod
+    def parse_retry_after(retry_after: str | None) -> float | None:
+        """
+        Convert a Retry-After header (seconds or HTTP date) to seconds.
+
+        Parameters:
+        - retry_after (str): The header value.
+
+        Returns:
+        - float: The number of seconds to wait, or None.
+        """
+
+        if not retry_after:
+            return None
+        if retry_after.strip().isdigit():
+            return float(retry_after)
+        try:
+            return max(0.0, email.utils.parsedate_to_datetime(retry_after).timestamp() - time.time())
+        except (TypeError, ValueError):
+            return None
+
+    def get_stats(self) -> dict[str, dict]:
+        """
+        Get the current limits.
+
+        Returns:
+        - dict: The limit, requests in flight and latency of every host and proxy.
+        """
+
+        return {
+            "hosts": {host: limiter.to_dict() for host, limiter in self.hosts.items()},
+            "proxies": {proxy: limiter.to_dict() for proxy, limiter in self.proxies.items()}
+        }
@@ -0,0 +1,142 @@
+import threading
+from collections import defaultdict
+
+import aiohttp
+import requests
+from requests.adapters import HTTPAdapter
+
+
+class ConnectionPool:
+    """
+    Keep-alive HTTP sessions, one per proxy.
+
+    Every proxy gets its own persistent session with a bounded connection pool, so the
+    TCP+TLS handshake through a proxy is paid once per connection instead of once per page.
+    Compressed responses (gzip/deflate/brotli) are negotiated and counted per proxy.
+    """
+
+    accept_encoding = "gzip, deflate, br"
+
+    def __init__(self, headers: dict[str, str], timeout: int = 20, pool_size: int = 20):
+        """
+        Initialize the connection pool.
+
+        Parameters:
+        - headers (dict): Headers sent with every request.
+        - timeout (int): Total timeout of a single request (in seconds).
+        - pool_size (int): Maximum number of open connections per proxy.
+        """
+
+        self.headers = {**headers, "Accept-Encoding": self.accept_encoding}
+        self.timeout = timeout
+        self.pool_size = pool_size
+        self._sessions = {}
+        self._requests_sessions = {}
+        self._lock = threading.Lock()
+        self._stats = defaultdict(lambda: {
+            "connections_opened": 0,
+            "connections_reused": 0,
+            "requests": 0,
+            "bytes": 0,
+            "encodings": defaultdict(int)
+        })
+
+    def _create_trace_config(self, key: str) -> aiohttp.TraceConfig:
+        trace_config = aiohttp.TraceConfig()
+
+        async def on_connection_create_end(session, context, params):
+            self._stats[key]["connections_opened"] += 1
+
+        async def on_connection_reuseconn(session, context, params):
+            self._stats[key]["connections_reused"] += 1
+
+        trace_config.on_connection_create_end.append(on_connection_create_end)
+        trace_config.on_connection_reuseconn.append(on_connection_reuseconn)
+        return trace_config
+
+    def get_session(self, proxy: str = None) -> aiohttp.ClientSession:
+        """
+        Get the keep-alive session of a proxy, creating it on first use.
+
+        Must be called from inside the running event loop.
+
+        Parameters:
+        - proxy (str): The proxy url, or None for direct connections.
+
+        Returns:
+        - aiohttp.ClientSession: The session bound to this proxy.
+        """
+
+        key = proxy or "direct"
+        session = self._sessions.get(key)
+        if session is None or session.closed:
+            connector = aiohttp.TCPConnector(limit=self.pool_size, keepalive_timeout=60)
+            session = aiohttp.ClientSession(
+                connector=connector,
+                headers=self.headers,
+                timeout=aiohttp.ClientTimeout(total=self.timeout),
+                cookie_jar=aiohttp.DummyCookieJar(),  # Cookies are passed explicitly per request
+                trace_configs=[self._create_trace_config(key)]
+            )
+            self._sessions[key] = session
+        return session
+
+    def get_requests_session(self, proxy: str = None) -> requests.Session:
+        """
+        Get the blocking keep-alive session of a proxy, used outside of the event loop.
+
+        Parameters:
+        - proxy (str): The proxy url, or None for direct connections.
+
+        Returns:
+        - requests.Session: The session bound to this proxy.
+        """
+
+        key = proxy or "direct"
+        with self._lock:
+            session = self._requests_sessions.get(key)
+            if session is None:
+                session = requests.Session()
+                adapter = HTTPAdapter(pool_connections=1, pool_maxsize=self.pool_size)
+                session.mount("http://", adapter)
+                session.mount("https://", adapter)
+                session.headers.update(self.headers)
+                if proxy is not None:
+                    session.proxies = {"http": proxy, "https": proxy}
+                self._requests_sessions[key] = session
+            return session
+
+    def record_response(self, proxy: str, content_encoding: str, size: int) -> None:
+        """
+        Count a received response for the proxy that served it.
+
+        Parameters:
+        - proxy (str): The proxy url, or None for direct connections.
+        - content_encoding (str): The Content-Encoding header of the response.
+        - size (int): Size of the decoded body (in bytes).
+        """
+
+        stats = self._stats[proxy or "direct"]
+        stats["requests"] += 1
+        stats["bytes"] += size
+        stats["encodings"][content_encoding or "identity"] += 1
+
+    def get_stats(self) -> dict[str, dict]:
+        """
+        Get the per-proxy counters of the pool.
+
+        Returns:
+        - dict: Counters of opened/reused connections, requests, bytes and content encodings per proxy.
+        """
+
+        return {key: {**stats, "encodings": dict(stats["encodings"])} for key, stats in self._stats.items()}
+
+    async def close(self) -> None:
+        """
+        Close every async session and release its connections.
+        """
+
+        for session in self._sessions.values():
+            if not session.closed:
+                await session.close()
+        self._sessions = {}
@@ -0,0 +1,175 @@
+import asyncio
+import queue
+import sqlite3
+import threading
+import time
+from typing import Any
+
+from metrics import metrics
+
+
+class ProductDbWriter:
+    """
+    Batched database sink of the scraped products.
+
+    Products are received over a bounded queue and written by a dedicated thread in
+    large `executemany` upserts keyed on product_id, so the scraping stages never wait
+    for the database and the database never sees row-at-a-time inserts.
+    """
+
+    columns = ["product_id", "market", "market_image", "store", "store_image", "name", "price", "currency", "brand", "description", "number", "image", "images", "url", "date", "addresses"]
+
+    def __init__(self, connect: callable, dialect: str, table_name: str, batch_size: int = 1000, flush_interval: float = 5.0):
+        """
+        Initialize the writer and start its thread.
+
+        Parameters:
+        - connect (callable): Function returning a DB-API connection (pooled for MySQL).
+        - dialect (str): "mysql" or "sqlite", selects the placeholders and the upsert syntax.
+        - table_name (str): Name of the products table, created if it doesn't exist.
+        - batch_size (int): Maximum number of products written in one statement.
+        - flush_interval (float): Maximum time (in seconds) a product waits before being written.
+        """
+
+        self.connect = connect
+        self.dialect = dialect
+        self.table_name = table_name
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.written = 0
+        self.failed = 0
+        self._queue = queue.Queue(maxsize=batch_size * 4)
+        self._stop = object()
+        self._create_table()
+        self._thread = threading.Thread(target=self._run, name="db-writer", daemon=True)
+        self._thread.start()
+
+    @classmethod
+    def for_mysql(cls, host: str, user: str, password: str, database: str, table_name: str, batch_size: int = 1000, flush_interval: float = 5.0) -> "ProductDbWriter":
+        """
+        Create a writer on a MySQL connection pool.
+        """
+
+        from mysql.connector import pooling
+
+        pool = pooling.MySQLConnectionPool(pool_name="bringo_writer", pool_size=2, host=host, user=user, password=password, database=database, charset="utf8mb4")
+        return cls(pool.get_connection, "mysql", table_name, batch_size, flush_interval)
+
+    @classmethod
+    def for_sqlite(cls, file_path: str, table_name: str, batch_size: int = 1000, flush_interval: float = 5.0) -> "ProductDbWriter":
+        """
+        Create a writer on a local SQLite database, a stand-in for MySQL.
+        """
+
+        return cls(lambda: sqlite3.connect(file_path, check_same_thread=False), "sqlite", table_name, batch_size, flush_interval)
+
+    def _create_table(self) -> None:
+        text_type = "TEXT" if self.dialect == "sqlite" else "LONGTEXT"
+        key_type = "TEXT" if self.dialect == "sqlite" else "VARCHAR(64)"
+        columns = ", ".join(f"{column} {key_type if column == 'product_id' else text_type}" for column in self.columns)
+        connection = self.connect()
+        try:
+            cursor = connection.cursor()
+            cursor.execute(f"CREATE TABLE IF NOT EXISTS {self.table_name} ({columns}, PRIMARY KEY (product_id))")
+            # A table created by an older version misses the columns added since (addresses), the upserts name them all
+            for column in self._get_missing_columns(cursor):
+                print(f"Adding the column {column} to the table {self.table_name}")
+                cursor.execute(f"ALTER TABLE {self.table_name} ADD COLUMN {column} {text_type}")
+            connection.commit()
+            cursor.close()
+        finally:
+            connection.close()
+
+    def _get_missing_columns(self, cursor: Any) -> list[str]:
+        if self.dialect == "mysql":
+            cursor.execute("SELECT column_name FROM information_schema.columns WHERE table_schema = DATABASE() AND table_name = %s", (self.table_name,))
+            existing = {row[0].lower() for row in cursor.fetchall()}
+        else:
+            cursor.execute(f"PRAGMA table_info({self.table_name})")
+            existing = {row[1].lower() for row in cursor.fetchall()}
+        return [column for column in self.columns if column not in existing]
+
+    def _get_upsert_query(self) -> str:
+        columns = ", ".join(self.columns)
+        updated_columns = [column for column in self.columns if column != "product_id"]
+        if self.dialect == "mysql":
+            placeholders = ", ".join(["%s"] * len(self.columns))
+            updates = ", ".join(f"{column} = VALUES({column})" for column in updated_columns)
+            return f"INSERT INTO {self.table_name} ({columns}) VALUES ({placeholders}) ON DUPLICATE KEY UPDATE {updates}"
+        placeholders = ", ".join(["?"] * len(self.columns))
+        updates = ", ".join(f"{column} = excluded.{column}" for column in updated_columns)
+        return f"INSERT INTO {self.table_name} ({columns}) VALUES ({placeholders}) ON CONFLICT (product_id) DO UPDATE SET {updates}"
+
+    def put(self, product: dict[str, Any]) -> None:
+        """
+        Queue a product, blocking while the queue is full.
+
+        Parameters:
+        - product (dict): The product to write.
+        """
+
+        self._queue.put(product)
+
+    async def put_async(self, product: dict[str, Any]) -> None:
+        """
+        Queue a product from the event loop, waiting in a thread only while the queue is full.
+
+        Parameters:
+        - product (dict): The product to write.
+        """
+
+        try:
+            self._queue.put_nowait(product)
+        except queue.Full:
+            await asyncio.to_thread(self._queue.put, product)
+
+    def _run(self) -> None:
+        query = self._get_upsert_query()
+        stopping = False
+        while not stopping:
+            batch = []
+            deadline = time.monotonic() + self.flush_interval
+            while len(batch) < self.batch_size:
+                try:
+                    item = self._queue.get(timeout=max(deadline - time.monotonic(), 0.01))
+                except queue.Empty:
+                    break
+                if item is self._stop:
+                    stopping = True
+                    break
+                batch.append(item)
+                if time.monotonic() >= deadline:
+                    break
+            if batch:
+                self._write(query, batch)
+
+    def _write(self, query: str, batch: list[dict[str, Any]]) -> None:
+        rows = [tuple(product.get(column) for column in self.columns) for product in batch]
+        for attempt in range(3):
+            connection = None
+            try:
+                with metrics.timer("sink_write_seconds", sink=self.dialect):
+                    connection = self.connect()
+                    cursor = connection.cursor()
+                    cursor.executemany(query, rows)
+                    connection.commit()
+                    cursor.close()
+                self.written += len(rows)
+                metrics.inc("sink_rows_total", len(rows), sink=self.dialect)
+                return
+            except Exception as e:
+                metrics.inc("sink_errors_total", sink=self.dialect)
+                print(f"Error while writing {len(rows)} products in the database (attempt {attempt + 1}) : {e}")
+                time.sleep(2 ** attempt)
+            finally:
+                if connection is not None:
+                    connection.close()  # Returns the connection to the pool
+        self.failed += len(rows)
+
+    def close(self) -> None:
+        """
+        Write the queued products and stop the writer thread.
+        """
+
+        self._queue.put(self._stop)
+        self._thread.join()
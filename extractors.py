@@ -0,0 +1,249 @@
+import hashlib
+import re
+
+from html_parser import parse_html
+
+
+# Regions of the pages read by the extractors, only these are materialised by the partial parser
+PRODUCT_REGIONS = ["h1.product-name", ".product-price", ".product-price-calculator", ".thumbnail-image", "#details", "#main-image"]
+LISTING_REGIONS = [".box-product"]
+STORE_REGIONS = [".box-inner"]
+PAGINATION_REGIONS = ["ul.pagination"]
+
+
+def extract_product_tiles(response: bytes) -> list[dict[str, str]]:
+    """
+    Extract the product tiles of a listing page.
+
+    Parameters:
+    - response (bytes): The content of the listing page.
+
+    Returns:
+    - list: For every product link, its url, the fingerprint of its tile and the name, price,
+      currency and image shown on the tile (empty when the tile doesn't show them).
+    """
+
+    soup = parse_html(response, only=LISTING_REGIONS)
+    return _get_product_tiles(soup)
+
+
+def _get_product_tiles(soup) -> list[dict[str, str]]:
+    tiles = []
+    for tile in soup.select(".box-product"):
+        # The fingerprint of the tile changes whenever the name, price or image shown on the listing changes
+        fingerprint_data = tile.get_text(" ", strip=True) + " ".join(image.get("src", "") for image in tile.select("img"))
+        fingerprint = hashlib.sha256(fingerprint_data.encode()).hexdigest()
+        name_element = tile.select_one(".product-name, .product-title, h3, h4, h5")
+        price_element = tile.select_one(".product-price, .price")
+        image_element = tile.select_one("img")
+        price = price_element.get_text(strip=True).replace("~", "").replace("/", "").strip().split() if price_element else []
+        details = {
+            "fingerprint": fingerprint,
+            "name": name_element.get_text(strip=True) if name_element else "",
+            "price": price[0] if len(price) == 2 else "",
+            "currency": price[1] if len(price) == 2 else "",
+            "image": image_element.get("src", "") if image_element else ""
+        }
+        for element in tile.select("a"):
+            tiles.append({"url": element.get("href"), **details})
+    return tiles
+
+
+def extract_product(response: bytes) -> dict[str, str]:
+    """
+    Extract the details of a product page.
+
+    Parameters:
+    - response (bytes): The content of the product page.
+
+    Returns:
+    - dict: The name, price, currency, brand, description, number, image and images of the product.
+    """
+
+    soup = parse_html(response, only=PRODUCT_REGIONS)
+    product_name = soup.select_one("h1.product-name").get_text(strip=True)
+    calculator = soup.select_one("div.product-price-calculator")
+    product_price= ""
+    product_currency= ""
+
+    if calculator:
+        price_element = soup.select_one("div.product-price-calculator p:first-child")
+        product_price, product_currency = price_element.get_text(strip=True).replace("~", "").replace("/", "").strip().split()
+    else: product_price, product_currency = soup.select_one(".product-price").get_text(strip=True).replace("~", "").replace("/", "").strip().split()
+    product_brand = ""
+    product_number = ""
+    product_description = ""
+
+    images_elements = soup.select(".thumbnail-image img")
+    product_images = [element.get("src") for element in images_elements]
+
+    details_elements = soup.select("#details p")
+    if len(details_elements) == 0:
+        description_element = soup.select_one("#details")
+        product_description = description_element.get_text(separator="\n", strip=True) if description_element else ""
+    else :
+        for element in details_elements:
+            content = element.get_text(strip=True)
+            if "Numéro du produit" in content:
+                product_number = content.split(":").pop().strip()
+            elif "Marque" in content:
+                product_brand = content.split(":").pop().strip()
+            else:
+                product_description += element.get_text(separator="\n", strip=True)
+    product_image = soup.select_one("#main-image").get("src")
+    return {
+        "name": product_name,
+        "price": product_price,
+        "currency": product_currency,
+        "brand": product_brand,
+        "description": product_description,
+        "number": product_number,
+        "image": product_image,
+        "images": ",".join(product_images)
+    }
+
+
+def extract_stores(response: bytes) -> list[dict[str, str]]:
+    """
+    Extract the stores of a market page.
+
+    Parameters:
+    - response (bytes): The content of the market page.
+
+    Returns:
+    - list: The url, image and name of every store.
+    """
+
+    soup = parse_html(response, only=STORE_REGIONS)
+    stores = []
+    for store_element in soup.select(".box-inner"):
+        stores.append({
+            "store_url": store_element.get("href"),
+            "store_image": store_element.select_one("img").get("src"),
+            "store_name": store_element.select_one("h4").get_text(strip=True)
+        })
+    return stores
+
+
+def _get_pagination(soup) -> tuple[int, bool]:
+    page_count = 1
+    for link in soup.select('ul.pagination a.page-link'):
+        label = link.get_text(strip=True)
+        if label.isdigit():
+            page_count = max(page_count, int(label))
+        page = re.search(r"[?&]page=(\d+)", link.get("href") or "")  # "Last" links only show the number in their URL
+        if page:
+            page_count = max(page_count, int(page.group(1)))
+    # A paginator showing a window of the pages ends with an ellipsis instead of the last page
+    labels = [item.get_text(strip=True) for item in soup.select('ul.pagination li')]
+    numbers = [index for index, label in enumerate(labels) if label.isdigit()]
+    truncated = bool(numbers) and any(label in ("…", "...") for label in labels[numbers[-1] + 1:])
+    return page_count, truncated
+
+
+def extract_listing(response: bytes) -> dict:
+    """
+    Extract the product tiles and the pagination of a listing page with a single parse.
+
+    Parameters:
+    - response (bytes): The content of the listing page.
+
+    Returns:
+    - dict: The product tiles, as returned by `extract_product_tiles` ("tiles"), the number of pages
+      ("page_count") and whether the paginator only shows a window of the pages ("truncated").
+    """
+
+    soup = parse_html(response, only=LISTING_REGIONS + PAGINATION_REGIONS)
+    page_count, truncated = _get_pagination(soup)
+    return {"tiles": _get_product_tiles(soup), "page_count": page_count, "truncated": truncated}
+
+
+def extract_markets(response: bytes | str) -> list[dict]:
+    """
+    Extract the markets of the stores list shown once an address is selected.
+
+    Parameters:
+    - response (bytes | str): HTML containing the `.box-store` elements.
+
+    Returns:
+    - list: The url, image, title, close program and open programs of every market.
+    """
+
+    soup = parse_html(response, only=[".box-store"])
+    markets = []
+    for market_element in soup.select(".box-store"):
+        market_url = market_element.select_one("a").get("href")
+        market_title = market_element.select_one(".store-title").get_text(strip=True)
+        market_image = market_element.select_one(".store-image-thumbnail img").get("src")
+        market_close_program_element = market_element.select_one(".store-close-program")
+        market_close_program = ""
+        if market_close_program_element:
+            market_close_program = market_close_program_element.get_text(strip=True)
+        market_open_programs = []
+        for market_open_program_element in market_element.select(".store-program-day"):
+            market_open_program_week_day = market_open_program_element.select_one(".store-program-week-day").get_text(strip=True)
+            market_open_program_time = market_open_program_element.get_text(strip=True).replace(market_open_program_week_day, "").strip()
+            market_open_programs.append({
+                "week_day": market_open_program_week_day,
+                "time": market_open_program_time
+            })
+        markets.append({
+            "market_url": market_url,
+            "market_image": market_image,
+            "market_title": market_title,
+            "market_close_program": market_close_program,
+            "market_open_programs": market_open_programs
+        })
+    return markets
+
+
+def extract_address_form(response: bytes | str) -> dict | None:
+    """
+    Extract the address selection form of the home page.
+
+    Parameters:
+    - response (bytes | str): The content of the home page.
+
+    Returns:
+    - dict: The action, method and fields (name -> default value) of the form, with the
+      names of its address and street number fields. None if the page has no address form.
+    """
+
+    soup = parse_html(response, backend="html.parser")  # The form is walked with BeautifulSoup only helpers (find_parent, has_attr)
+    address_input = soup.select_one("#address")
+    if address_input is None:
+        return None
+    form = address_input.find_parent("form")
+    container = form or soup
+    fields = {}
+    for element in container.select("input[name], select[name], textarea[name]"):
+        if element.name == "input" and element.get("type") in ("checkbox", "radio") and not element.has_attr("checked"):
+            continue
+        if element.name == "select":
+            option = element.select_one("option[selected]") or element.select_one("option")
+            fields[element.get("name")] = option.get("value", option.get_text(strip=True)) if option else ""
+        else:
+            fields[element.get("name")] = element.get("value", "")
+    street_number_input = container.select_one("#street_number")
+    return {
+        "action": form.get("action") if form else None,
+        "method": (form.get("method") or "get").lower() if form else "post",
+        "fields": fields,
+        "address_field": address_input.get("name", "address"),
+        "street_number_field": street_number_input.get("name", "street_number") if street_number_input else None
+    }
+
+
+def is_address_page(response: bytes) -> bool:
+    """
+    Tell whether a page is the address selection page, served instead of the requested page once the session expired.
+
+    Parameters:
+    - response (bytes): The content of the page.
+
+    Returns:
+    - bool: True if the page contains the address form.
+    """
+
+    soup = parse_html(response, only=["#address"])
+    return soup.select_one("#address") is not None
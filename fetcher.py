@@ -0,0 +1,158 @@
+import asyncio
+import time
+from typing import Any
+
+from connection_pool import ConnectionPool
+from http_cache import HttpCache
+from proxy_scheduler import ProxyScheduler
+from concurrency import ConcurrencyController
+from metrics import metrics
+from urllib.parse import urlparse
+
+
+class AsyncFetcher:
+    """
+    Asyncio based HTTP fetch engine shared by every scraping stage.
+
+    A single global semaphore bounds the number of requests in flight, so hundreds of
+    requests can run concurrently on one event loop instead of one OS thread per request.
+    Under that hard cap, an AIMD controller adapts the concurrency of every host and proxy
+    to the pushback of the server.
+    """
+
+    def __init__(self, main_url: str, max_concurrency: int = 200, timeout: int = 20, pool_size: int = 20, cache: HttpCache = None, proxy_scheduler: ProxyScheduler = None, controller: ConcurrencyController = None):
+        """
+        Initialize the fetcher.
+
+        Parameters:
+        - main_url (str): The url of main site, prepended to relative urls.
+        - max_concurrency (int): Maximum number of requests in flight at the same time.
+        - timeout (int): Total timeout of a single request (in seconds).
+        - pool_size (int): Maximum number of open connections per proxy.
+        - cache (HttpCache): Persistent response cache used for get requests, or None.
+        - proxy_scheduler (ProxyScheduler): Scheduler told about the outcome of every request sent through a proxy, or None.
+        - controller (ConcurrencyController): Adaptive concurrency limits per host and proxy, a default one when None.
+        """
+
+        self.main_url = main_url
+        self.max_concurrency = max_concurrency
+        headers = {'User-Agent': 'Mozilla/5.0'}  # Define user-agent headers
+        self.pool = ConnectionPool(headers, timeout=timeout, pool_size=pool_size)
+        self.cache = cache
+        self.proxy_scheduler = proxy_scheduler
+        self.controller = controller or ConcurrencyController(maximum=max_concurrency)
+        self._semaphore = None
+
+    def _get_semaphore(self) -> asyncio.Semaphore:
+        # The semaphore must be created inside the running event loop
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+        return self._semaphore
+
+    def get_fresh(self, url: str) -> bytes | None:
+        """
+        Get the cached response of a get request if it is still fresh, so no proxy is taken for it.
+
+        Parameters:
+        - url (str): The URL to fetch.
+
+        Returns:
+        - bytes: The cached content, or None if the page must be requested.
+        """
+
+        if self.cache is None:
+            return None
+        if not url.startswith("http"):
+            url = f"{self.main_url}{url}"
+        _, content = self.cache.get_conditional_headers(url)
+        if content is not None:
+            metrics.inc("http_cache_responses_total", result="fresh")
+        return content
+
+    async def fetch(self, url: str, method: str = "get", data: dict[str, Any] = None, cookies: dict[str, str] = None, proxy: str = None) -> tuple[bytes, int]:
+        """
+        Send a single request and return its content.
+
+        Get requests go through the response cache when there is one: cached responses are
+        revalidated with a conditional request, and a response served from the cache is
+        reported with the 304 status code so callers can reuse the values they extracted from it.
+
+        Parameters:
+        - url (str): The URL to fetch.
+        - method (str): "get" or "post".
+        - data (dict): Form data of post requests.
+        - cookies (dict): Cookies sent with the request.
+        - proxy (str): The proxy url to route the request through, or None.
+
+        Returns:
+        - tuple: A tuple containing the response content (byte string) and the HTTP status code.
+        """
+
+        if not url.startswith("http"):
+            url = f"{self.main_url}{url}"  # Append base URL if needed
+
+        cache = self.cache if method == "get" else None
+        headers = {}
+        if cache is not None:
+            headers, content = cache.get_conditional_headers(url)
+            if content is not None:
+                metrics.inc("http_cache_responses_total", result="fresh")
+                if self.proxy_scheduler is not None:
+                    self.proxy_scheduler.release(proxy)  # Not sent through the proxy
+                return (content, 304)  # Fresh response served from disk
+
+        session = self.pool.get_session(proxy)
+        host = urlparse(url).netloc
+        acquired = False
+        status_code = None
+        response_headers = {}
+        start_time = time.monotonic()
+        try:
+            await self.controller.acquire(host, proxy)
+            acquired = True
+            async with self._get_semaphore():
+                start_time = time.monotonic()
+                async with session.request(method.upper(), url, data=data, cookies=cookies, proxy=proxy, headers=headers) as response:
+                    content = await response.read()
+                    self.pool.record_response(proxy, response.headers.get("Content-Encoding"), len(content))
+                    metrics.inc("http_response_bytes_total", len(content))
+                    status_code = response.status
+                    response_headers = response.headers
+        finally:
+            if acquired:
+                latency = time.monotonic() - start_time
+                await self.controller.release(host, proxy, latency, status_code, response_headers.get("Retry-After"))
+                success = status_code is not None and status_code < 500 and status_code != 429
+                if self.proxy_scheduler is not None:
+                    self.proxy_scheduler.report(proxy, latency, success, banned=status_code == 403)
+                self._record(proxy, latency, status_code, success)
+            elif self.proxy_scheduler is not None:
+                self.proxy_scheduler.release(proxy)  # Cancelled before the request was sent
+
+        if cache is not None:
+            if status_code == 304:
+                content = cache.get_revalidated(url, response_headers)
+                if content is None:
+                    return await self.fetch(url, method, data, cookies, proxy)  # Evicted in the meantime, download the page again
+            elif status_code == 200:
+                cache.store(url, response_headers, content)
+        return (content, status_code)
+
+    @staticmethod
+    def _record(proxy: str | None, latency: float, status_code: int | None, success: bool) -> None:
+        status = str(status_code) if status_code is not None else "error"
+        metrics.observe("http_request_seconds", latency, status=status)
+        metrics.inc("http_requests_total", status=status)
+        if status_code == 304:
+            metrics.inc("http_cache_responses_total", result="revalidated")
+        proxy_name = f"{urlparse(proxy).hostname}:{urlparse(proxy).port}" if proxy else "direct"  # Without the credentials
+        outcome = "banned" if status_code == 403 else "success" if success else "failure"
+        metrics.inc("proxy_requests_total", proxy=proxy_name, outcome=outcome)
+
+    async def close(self) -> None:
+        """
+        Close the pooled HTTP sessions and release their connections.
+        """
+
+        await self.pool.close()
+        self._semaphore = None
@@ -0,0 +1,290 @@
+import asyncio
+import hashlib
+import json
+import time
+import uuid
+from typing import Any, Awaitable, Callable
+
+from sqlite_store import SqliteStore
+from type_classes import StoreTable, Store, ProductLink, Product
+
+
+# Fields of the market and store shared by every item of a store, checkpointed once per store
+STORE_FIELDS = ("market_name", "market_image", "market_open_programs", "market_close_program", "addresses", "store_name", "store_image")
+
+
+class Frontier(SqliteStore):
+    """
+    Durable crawl frontier checkpointing the work items of the pipeline stages.
+
+    Every item (market, store, page, product link, product) is recorded with its stage and
+    state, under a key made of its stage, store and URL. The market and store fields shared by
+    the items of a store are recorded once per store: an item row only holds its own fields, and
+    is rebuilt with its store on resume. Once a stage finishes an item, the item is marked done
+    and the items it produced are recorded as pending, in the same transaction. A run interrupted
+    by a crash is resumed from its pending items only. Checkpoints are buffered and committed in
+    batches, so a crash replays at most the last batch of items (the outputs are at-least-once).
+    The pipeline commits them with `flush_async` once `is_flush_due`, so the stages keep running
+    while the outputs are flushed and the batch is committed.
+    """
+
+    schema = """
+        CREATE TABLE IF NOT EXISTS runs (
+            run_id TEXT PRIMARY KEY,
+            file_path TEXT NOT NULL,
+            started_at REAL NOT NULL,
+            finished_at REAL
+        );
+        CREATE TABLE IF NOT EXISTS stores (
+            run_id TEXT NOT NULL,
+            store_key INTEGER NOT NULL,
+            payload TEXT NOT NULL,  -- The market and store fields
+            PRIMARY KEY (run_id, store_key)
+        );
+        CREATE TABLE IF NOT EXISTS work_items (
+            run_id TEXT NOT NULL,
+            item_key TEXT NOT NULL,  -- Stage, store and URL of the item
+            stage TEXT NOT NULL,
+            kind TEXT NOT NULL,  -- "item" (dict), "link" (ProductLink) or "product" (Product)
+            store_key INTEGER,
+            payload TEXT NOT NULL,  -- The fields of the item besides its store
+            done INTEGER NOT NULL DEFAULT 0,  -- 0 pending, 1 done, 2 failed
+            PRIMARY KEY (run_id, item_key)
+        );
+        CREATE INDEX IF NOT EXISTS work_items_pending ON work_items (run_id, done, stage);
+        DROP TABLE IF EXISTS items;  -- Checkpoints of the previous format, with the whole item in every row
+    """
+
+    def __init__(self, file_path: str, flush_size: int = 500, flush_interval: float = 2.0, on_flush: Callable[[], None] = None, on_flush_async: Callable[[], Awaitable[None]] = None):
+        """
+        Open the frontier.
+
+        Parameters:
+        - file_path (str): Path to the SQLite database.
+        - flush_size (int): Number of buffered checkpoints committed at once.
+        - flush_interval (float): Maximum time (in seconds) a checkpoint stays buffered.
+        - on_flush (Callable): Called before each commit, to flush the outputs the checkpoints vouch for (csv files).
+        - on_flush_async (Callable): Coroutine function called instead of `on_flush` by `flush_async`.
+        """
+
+        super().__init__(file_path)
+        self.flush_size = flush_size
+        self.flush_interval = flush_interval
+        self.on_flush = on_flush
+        self.on_flush_async = on_flush_async
+        self.run_id = None
+        self.resumed = False
+        self._store_keys = {}  # Keys of the stores recorded in the run, by market and store fields
+        self._buffered_keys = set()  # Keys of the items added since the last commit
+        self._flushing_keys = set()  # Keys of the items of the commit in progress
+        self._buffer = []  # Ordered ("store", row), ("add", row) and ("done", key) operations not committed yet
+        self._flush_lock = asyncio.Lock()  # One commit at a time, in the order of the checkpoints
+        self._last_flush = time.monotonic()
+
+    def _get_store_key(self, fields: tuple, get_payload: Callable[[], dict[str, Any]]) -> int:
+        key = self._store_keys.get(fields)
+        if key is None:
+            digest = hashlib.blake2b("\x1f".join(str(field) for field in fields).encode(), digest_size=8).digest()
+            key = self._store_keys[fields] = int.from_bytes(digest, "little", signed=True)  # SQLite integers are signed 64 bit
+            self._buffer.append(("store", (self.run_id, key, json.dumps(get_payload(), ensure_ascii=False))))
+        return key
+
+    def _get_record_store_key(self, store: Store) -> int:
+        fields = (store.market.name, store.market.image, store.name, store.image, store.addresses)
+        return self._get_store_key(fields, store.to_dict)
+
+    def _describe(self, stage: str, item: Any) -> tuple[str, str, int | None, Callable[[], dict[str, Any]]]:
+        """
+        Get the key, kind and store key of an item, and a function returning the fields it checkpoints.
+        """
+
+        if isinstance(item, ProductLink):
+            store_key = self._get_record_store_key(item.store)
+            return (f"{stage}\x1f{store_key}\x1f{item.product_url}", "link", store_key, item.to_checkpoint)
+        if isinstance(item, Product):
+            store_key = self._get_record_store_key(item.store)
+            return (f"{stage}\x1f{store_key}\x1f{item.url}", "product", store_key, item.to_checkpoint)
+        if "store_name" in item:  # A store or a listing page
+            fields = (item["market_name"], item["market_image"], item["store_name"], item["store_image"], tuple(item.get("addresses", [])))
+            store_key = self._get_store_key(fields, lambda: {field: item[field] for field in STORE_FIELDS if field in item})
+            return (f"{stage}\x1f{store_key}\x1f{item['store_url']}", "item", store_key, lambda: {field: value for field, value in item.items() if field not in STORE_FIELDS})
+        url = item.get("market_url") or json.dumps(item, sort_keys=True, ensure_ascii=False)
+        return (f"{stage}\x1f\x1f{url}", "item", None, lambda: item)
+
+    def start_run(self, file_path: str) -> str:
+        """
+        Resume the unfinished run, or start a new one.
+
+        Parameters:
+        - file_path (str): Output file name of a new run.
+
+        Returns:
+        - str: The output file name of the run, the one of the resumed run if any.
+        """
+
+        self._store_keys = {}
+        self._buffered_keys = set()
+        row = self._query_one("SELECT run_id, file_path FROM runs WHERE finished_at IS NULL ORDER BY started_at DESC LIMIT 1")
+        if row is not None:
+            self.run_id, file_path = row
+            self.resumed = True
+            count = self._query_one("SELECT COUNT(*) FROM work_items WHERE run_id = ?", (self.run_id,))[0]
+            print(f"---> resuming run {self.run_id} : {count} items known")
+            return file_path
+        self.run_id = uuid.uuid4().hex
+        self.resumed = False
+        self._execute("INSERT INTO runs (run_id, file_path, started_at) VALUES (?, ?, ?)", (self.run_id, file_path, time.time()))
+        return file_path
+
+    def get_pending(self, stores: StoreTable) -> dict[str, list[Any]]:
+        """
+        Get the items of the run not finished yet, rebuilt with their stores.
+
+        Parameters:
+        - stores (StoreTable): The intern table the stores of the product links and products are taken from.
+
+        Returns:
+        - dict: The pending items by stage name.
+        """
+
+        store_payloads = {key: json.loads(payload) for key, payload in self._query("SELECT store_key, payload FROM stores WHERE run_id = ?", (self.run_id,))}
+        self._store_keys = {}  # Recorded again the first time they are seen, INSERT OR IGNORE keeps the rows as they are
+        pending = {}
+        for stage, kind, store_key, payload in self._query("SELECT stage, kind, store_key, payload FROM work_items WHERE run_id = ? AND done = 0", (self.run_id,)):
+            fields = json.loads(payload)
+            store = store_payloads.get(store_key)
+            if kind == "link":
+                item = ProductLink.from_checkpoint(fields, stores.intern(store))
+            elif kind == "product":
+                item = Product.from_checkpoint(fields, stores.intern(store))
+            else:
+                item = {**store, **fields} if store is not None else fields
+            pending.setdefault(stage, []).append(item)
+        return pending
+
+    def _is_known(self, keys: list[str]) -> set[str]:
+        known = {key for key in keys if key in self._buffered_keys or key in self._flushing_keys}
+        missing = [key for key in keys if key not in known]
+        for start in range(0, len(missing), 500):
+            chunk = missing[start:start + 500]
+            placeholders = ", ".join(["?"] * len(chunk))
+            known.update(key for (key,) in self._query(f"SELECT item_key FROM work_items WHERE run_id = ? AND item_key IN ({placeholders})", (self.run_id, *chunk)))
+        return known
+
+    def add(self, stage: str, items: list[Any]) -> list[Any]:
+        """
+        Record new items of a stage as pending.
+
+        Parameters:
+        - stage (str): Name of the stage the items are fed to.
+        - items (list): The items.
+
+        Returns:
+        - list: The items not known yet, the others were already produced before a restart.
+        """
+
+        described = [(item, self._describe(stage, item)) for item in items]
+        known = self._is_known([key for _, (key, _, _, _) in described])
+        new_items = []
+        for item, (key, kind, store_key, get_payload) in described:
+            if key in known:
+                continue
+            known.add(key)  # The same item twice in the list
+            self._buffered_keys.add(key)
+            self._buffer.append(("add", (self.run_id, key, stage, kind, store_key, json.dumps(get_payload(), ensure_ascii=False))))
+            new_items.append(item)
+        return new_items
+
+    def complete(self, stage: str, item: Any, next_stage: str | None, outputs: list[Any], failed: bool = False) -> list[Any]:
+        """
+        Mark an item done and record the items it produced.
+
+        Parameters:
+        - stage (str): Name of the stage that processed the item.
+        - item (Any): The processed item.
+        - next_stage (str): Name of the stage the outputs are fed to, None for the last stage.
+        - outputs (list): The items produced.
+        - failed (bool): True if the stage raised on the item, it is not retried on resume either.
+
+        Returns:
+        - list: The outputs to feed to the next stage.
+        """
+
+        if next_stage is not None and outputs:
+            outputs = self.add(next_stage, outputs)
+        self._buffer.append(("done", (2 if failed else 1, self.run_id, self._describe(stage, item)[0])))
+        return outputs
+
+    def is_flush_due(self) -> bool:
+        """
+        Tell whether the buffered checkpoints are due for a commit (no commit is in progress, and
+        `flush_size` checkpoints are buffered or the oldest one is `flush_interval` seconds old).
+        """
+
+        if self._flush_lock.locked() or not self._buffer:
+            return False
+        return len(self._buffer) >= self.flush_size or time.monotonic() - self._last_flush >= self.flush_interval
+
+    def _take_buffer(self) -> list[tuple[str, tuple]]:
+        # The outputs of the checkpoints taken were written before, the ones buffered next wait for the next commit
+        self._last_flush = time.monotonic()
+        buffer, self._buffer = self._buffer, []
+        self._flushing_keys, self._buffered_keys = self._buffered_keys, set()
+        return buffer
+
+    def flush(self) -> None:
+        """
+        Commit the buffered checkpoints.
+        """
+
+        if not self._buffer:
+            return
+        buffer = self._take_buffer()
+        if self.on_flush is not None:
+            self.on_flush()
+        self._commit(buffer)
+
+    async def flush_async(self) -> None:
+        """
+        Commit the buffered checkpoints from the event loop, waiting for the outputs and the commit without blocking it.
+        """
+
+        async with self._flush_lock:
+            if not self._buffer:
+                return
+            buffer = self._take_buffer()
+            if self.on_flush_async is not None:
+                await self.on_flush_async()
+            elif self.on_flush is not None:
+                self.on_flush()
+            await asyncio.to_thread(self._commit, buffer)
+
+    def _commit(self, buffer: list[tuple[str, tuple]]) -> None:
+        with self._lock:
+            for operation, parameters in buffer:
+                if operation == "store":
+                    self._connection.execute("INSERT OR IGNORE INTO stores (run_id, store_key, payload) VALUES (?, ?, ?)", parameters)
+                elif operation == "add":
+                    self._connection.execute("INSERT OR IGNORE INTO work_items (run_id, item_key, stage, kind, store_key, payload) VALUES (?, ?, ?, ?, ?, ?)", parameters)
+                else:
+                    self._connection.execute("UPDATE work_items SET done = ? WHERE run_id = ? AND item_key = ?", parameters)
+            self._connection.commit()
+        self._flushing_keys = set()
+
+    def finish_run(self) -> bool:
+        """
+        Mark the run finished once no item is pending, and drop its items.
+
+        Returns:
+        - bool: True if the run is finished, False if items are left for the next run.
+        """
+
+        self.flush()
+        pending = self._query_one("SELECT COUNT(*) FROM work_items WHERE run_id = ? AND done = 0", (self.run_id,))[0]
+        if pending:
+            print(f"---> {pending} items left for the next run")
+            return False
+        self._execute("UPDATE runs SET finished_at = ? WHERE run_id = ?", (time.time(), self.run_id))
+        self._execute("DELETE FROM work_items WHERE run_id = ?", (self.run_id,))
+        self._execute("DELETE FROM stores WHERE run_id = ?", (self.run_id,))
+        return True
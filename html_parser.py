@@ -0,0 +1,168 @@
+import os
+import re
+
+from bs4 import BeautifulSoup
+from bs4.filter import ElementFilter
+
+try:
+    from lxml import html as lxml_html
+    from lxml.cssselect import CSSSelector
+except ImportError:
+    lxml_html = None
+
+try:
+    from selectolax.lexbor import LexborHTMLParser
+except ImportError:
+    LexborHTMLParser = None
+
+
+# Default parser backend: "html.parser" (BeautifulSoup), "lxml" or "selectolax". lxml and selectolax are faster
+# but repair malformed markup differently (a <div> inside a <p> closes the <p>), so they are opt-in
+DEFAULT_BACKEND = os.getenv("HTML_PARSER", "html.parser")
+
+# Text inside these tags is skipped by get_text() when it is called on one of their ancestors, as BeautifulSoup does
+_HIDDEN_TEXT_TAGS = {"script", "style", "template"}
+
+
+class _RegionFilter(ElementFilter):
+    """
+    Parse-time filter materialising only the elements matching simple selectors (`.class`, `#id`, `tag.class`) and their descendants.
+    """
+
+    def __init__(self, selectors: list[str]):
+        super().__init__()
+        self.rules = []
+        for selector in selectors:
+            match = re.fullmatch(r"([\w-]+)?([.#])([\w-]+)", selector.strip())
+            if match is None:
+                raise ValueError(f"Unsupported partial parsing selector: {selector}")
+            self.rules.append((match.group(1), "class" if match.group(2) == "." else "id", match.group(3)))
+
+    def allow_tag_creation(self, nsprefix, name, attrs) -> bool:
+        attrs = attrs or {}
+        for tag_name, attribute, value in self.rules:
+            if tag_name is not None and tag_name != name:
+                continue
+            attribute_value = attrs.get(attribute)
+            if attribute_value is None:
+                continue
+            values = attribute_value.split() if isinstance(attribute_value, str) else attribute_value
+            if value in values:
+                return True
+        return False
+
+    def allow_string_creation(self, string: str) -> bool:
+        return False  # Strings outside of the matched elements are never used
+
+
+class LxmlNode:
+    """
+    Wrapper exposing the subset of the BeautifulSoup Tag API used by the scrapers on top of an lxml element.
+    """
+
+    __slots__ = ("_element",)
+
+    _selectors = {}  # Compiled CSS selectors by expression
+
+    def __init__(self, element):
+        self._element = element
+
+    def select(self, css: str) -> list["LxmlNode"]:
+        selector = self._selectors.get(css)
+        if selector is None:
+            selector = self._selectors[css] = CSSSelector(css)
+        return [LxmlNode(element) for element in selector(self._element)]
+
+    def select_one(self, css: str) -> "LxmlNode | None":
+        elements = self.select(css)
+        return elements[0] if elements else None
+
+    def get(self, attribute: str, default: str = None) -> str | None:
+        return self._element.get(attribute, default)
+
+    def get_text(self, separator: str = "", strip: bool = False) -> str:
+        strings = self._iter_strings(self._element, True)
+        if strip:
+            strings = (string.strip() for string in strings)
+            strings = (string for string in strings if string)
+        return separator.join(strings)
+
+    @classmethod
+    def _iter_strings(cls, element, is_root: bool):
+        if element.text and (is_root or element.tag not in _HIDDEN_TEXT_TAGS):
+            yield element.text
+        for child in element:
+            if isinstance(child.tag, str):  # Comments and processing instructions have no text of their own
+                yield from cls._iter_strings(child, False)
+            if child.tail:
+                yield child.tail
+
+
+class SelectolaxNode:
+    """
+    Wrapper exposing the subset of the BeautifulSoup Tag API used by the scrapers on top of a selectolax node.
+    """
+
+    __slots__ = ("_node",)
+
+    def __init__(self, node):
+        self._node = node
+
+    def select(self, css: str) -> list["SelectolaxNode"]:
+        return [SelectolaxNode(node) for node in self._node.css(css)]
+
+    def select_one(self, css: str) -> "SelectolaxNode | None":
+        node = self._node.css_first(css)
+        return SelectolaxNode(node) if node is not None else None
+
+    def get(self, attribute: str, default: str = None) -> str | None:
+        return self._node.attributes.get(attribute, default)
+
+    def get_text(self, separator: str = "", strip: bool = False) -> str:
+        strings = (
+            node.text_content for node in self._node.traverse(include_text=True)
+            if node.tag == "-text" and (node.parent.tag not in _HIDDEN_TEXT_TAGS or node.parent == self._node)
+        )
+        if strip:
+            strings = (string.strip() for string in strings)
+        strings = (string for string in strings if string)
+        return separator.join(strings)
+
+
+def _decode(markup: bytes | str) -> str:
+    if isinstance(markup, str):
+        return markup
+    try:
+        return markup.decode("utf-8")
+    except UnicodeDecodeError:
+        return BeautifulSoup(markup, "html.parser").decode()  # Let BeautifulSoup detect the encoding
+
+
+def parse_html(markup: bytes | str, backend: str = None, only: list[str] = None):
+    """
+    Parse an HTML document with the selected backend.
+
+    Every backend returns an object supporting `select`, `select_one`, `get` and `get_text`
+    with the same results as BeautifulSoup, so extraction code doesn't depend on the backend.
+
+    Parameters:
+    - markup (bytes | str): The HTML document.
+    - backend (str): "html.parser", "lxml" or "selectolax" (HTML_PARSER environment variable by default).
+    - only (list[str]): Simple selectors (`.class`, `#id`, `tag.class`) of the regions the caller reads.
+      The BeautifulSoup backend then only materialises those regions, the other backends parse
+      the whole document, which is already cheaper than a partial BeautifulSoup tree.
+
+    Returns:
+    - The parsed document.
+    """
+
+    backend = backend or DEFAULT_BACKEND
+    if backend == "lxml" and lxml_html is not None:
+        markup = _decode(markup)
+        if markup.strip():  # lxml refuses empty documents
+            return LxmlNode(lxml_html.document_fromstring(markup))
+    elif backend == "selectolax" and LexborHTMLParser is not None:
+        return SelectolaxNode(LexborHTMLParser(_decode(markup)).root)
+    elif backend not in ("html.parser", "lxml", "selectolax"):
+        raise ValueError(f"Unknown HTML parser backend: {backend}")
+    return BeautifulSoup(markup, "html.parser", parse_only=_RegionFilter(only) if only else None)
@@ -0,0 +1,193 @@
+import json
+import re
+import time
+import zlib
+from typing import Any
+
+from sqlite_store import SqliteStore
+
+
+class HttpCache(SqliteStore):
+    """
+    Persistent HTTP response cache keyed by URL.
+
+    Responses are stored compressed on disk with their ETag/Last-Modified validators,
+    so later runs send conditional requests and unchanged pages are served from disk.
+    The values extracted from a page can be stored next to it, so unchanged pages are
+    never parsed again. The cache is bounded in size and evicts the least recently used entries.
+    """
+
+    schema = """
+        CREATE TABLE IF NOT EXISTS responses (
+            url TEXT PRIMARY KEY,
+            etag TEXT,
+            last_modified TEXT,
+            expires_at REAL,
+            body BLOB,
+            size INTEGER,
+            parsed TEXT,
+            accessed_at REAL
+        );
+        CREATE INDEX IF NOT EXISTS responses_accessed_at ON responses (accessed_at);
+    """
+
+    def __init__(self, file_path: str, max_size: int = 2 * 1024 ** 3):
+        """
+        Initialize the cache.
+
+        Parameters:
+        - file_path (str): Path to the SQLite database file.
+        - max_size (int): Maximum total size of the cached bodies (in bytes).
+        """
+
+        super().__init__(file_path)
+        self.max_size = max_size
+        self.total_size = self._query_one("SELECT COALESCE(SUM(size), 0) FROM responses")[0]
+        self.stats = {"hits": 0, "misses": 0, "revalidated": 0}
+
+    def get_conditional_headers(self, url: str) -> tuple[dict[str, str], bytes | None]:
+        """
+        Get the validators of a cached response.
+
+        Parameters:
+        - url (str): The URL of the request.
+
+        Returns:
+        - tuple: The conditional request headers and the cached body if it is still fresh (None otherwise).
+        """
+
+        row = self._query_one("SELECT etag, last_modified, expires_at, body FROM responses WHERE url = ?", (url,))
+        if row is None:
+            return ({}, None)
+        etag, last_modified, expires_at, body = row
+        if expires_at is not None and expires_at > time.time():
+            self.stats["hits"] += 1
+            self._touch(url)
+            return ({}, zlib.decompress(body))  # Fresh response, no request needed
+        headers = {}
+        if etag: headers["If-None-Match"] = etag
+        if last_modified: headers["If-Modified-Since"] = last_modified
+        return (headers, None)
+
+    def get_revalidated(self, url: str, response_headers: dict[str, str]) -> bytes | None:
+        """
+        Get the cached body of a response the server reported as not modified (304).
+
+        Parameters:
+        - url (str): The URL of the request.
+        - response_headers (dict): Headers of the 304 response.
+
+        Returns:
+        - bytes: The cached body, or None if it was evicted in the meantime.
+        """
+
+        row = self._query_one("SELECT body FROM responses WHERE url = ?", (url,))
+        if row is None:
+            return None
+        self.stats["revalidated"] += 1
+        self._execute("UPDATE responses SET expires_at = ?, accessed_at = ? WHERE url = ?", (self._get_expires_at(response_headers), time.time(), url))
+        return zlib.decompress(row[0])
+
+    def store(self, url: str, response_headers: dict[str, str], body: bytes) -> None:
+        """
+        Store a downloaded response, replacing the previous one of the URL.
+
+        Parameters:
+        - url (str): The URL of the request.
+        - response_headers (dict): Headers of the response.
+        - body (bytes): The decoded body of the response.
+        """
+
+        self.stats["misses"] += 1
+        etag = response_headers.get("ETag")
+        last_modified = response_headers.get("Last-Modified")
+        expires_at = self._get_expires_at(response_headers)
+        with self._lock:
+            previous = self._query_one("SELECT size FROM responses WHERE url = ?", (url,))
+            if etag is None and last_modified is None and expires_at is None:
+                # The response can't be revalidated, don't waste space on it
+                if previous:
+                    self._execute("DELETE FROM responses WHERE url = ?", (url,))
+                    self.total_size -= previous[0]
+                return
+            compressed = zlib.compress(body)
+            self._execute(
+                "INSERT OR REPLACE INTO responses (url, etag, last_modified, expires_at, body, size, parsed, accessed_at) VALUES (?, ?, ?, ?, ?, ?, NULL, ?)",
+                (url, etag, last_modified, expires_at, compressed, len(compressed), time.time())
+            )
+            self.total_size += len(compressed) - (previous[0] if previous else 0)
+            if self.total_size > self.max_size:
+                self._evict()
+
+    def get_parsed(self, url: str, name: str) -> Any:
+        """
+        Get the values previously extracted from the cached response of a URL.
+
+        Parameters:
+        - url (str): The URL of the request.
+        - name (str): Name of the extraction, a page can be parsed for different values.
+
+        Returns:
+        - Any: The stored values, or None if the page was never parsed for them.
+        """
+
+        row = self._query_one("SELECT parsed FROM responses WHERE url = ?", (url,))
+        if row is None or row[0] is None:
+            return None
+        return json.loads(row[0]).get(name)
+
+    def set_parsed(self, url: str, name: str, values: Any) -> None:
+        """
+        Store the values extracted from the cached response of a URL.
+
+        Parameters:
+        - url (str): The URL of the request.
+        - name (str): Name of the extraction, a page can be parsed for different values.
+        - values (Any): JSON serializable values extracted from the page.
+        """
+
+        with self._lock:
+            row = self._query_one("SELECT parsed FROM responses WHERE url = ?", (url,))
+            if row is None:
+                return  # The response itself isn't cached
+            parsed = json.loads(row[0]) if row[0] is not None else {}
+            parsed[name] = values
+            self._execute("UPDATE responses SET parsed = ? WHERE url = ?", (json.dumps(parsed), url))
+
+    def delete(self, url: str) -> None:
+        """
+        Remove the cached response of a URL.
+
+        Parameters:
+        - url (str): The URL of the request.
+        """
+
+        with self._lock:
+            previous = self._query_one("SELECT size FROM responses WHERE url = ?", (url,))
+            if previous:
+                self._execute("DELETE FROM responses WHERE url = ?", (url,))
+                self.total_size -= previous[0]
+
+    def _touch(self, url: str) -> None:
+        self._execute("UPDATE responses SET accessed_at = ? WHERE url = ?", (time.time(), url))
+
+    def _evict(self) -> None:
+        # Delete the least recently used entries until the cache fits in 90% of its maximum size
+        target_size = self.max_size * 0.9
+        urls = []
+        for url, size in self._query("SELECT url, size FROM responses ORDER BY accessed_at"):
+            if self.total_size <= target_size:
+                break
+            urls.append((url,))
+            self.total_size -= size
+        self._executemany("DELETE FROM responses WHERE url = ?", urls)
+
+    @staticmethod
+    def _get_expires_at(response_headers: dict[str, str]) -> float | None:
+        cache_control = response_headers.get("Cache-Control", "")
+        if "no-cache" in cache_control or "no-store" in cache_control:
+            return None
+        max_age = re.search(r"max-age=(\d+)", cache_control)
+        if max_age is None or int(max_age.group(1)) == 0:
+            return None
+        return time.time() + int(max_age.group(1))
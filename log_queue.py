@@ -0,0 +1,33 @@
+import atexit
+import logging
+import logging.handlers
+import queue
+import sys
+
+
+def _create_logger() -> logging.Logger:
+    """
+    Create the logger of the scraper, whose records are written to stdout by a background thread.
+
+    The workers only put their records in a queue, so logging never blocks the event loop or
+    the threads on the output stream, and lines of concurrent workers never interleave.
+
+    Returns:
+    - logging.Logger: The logger.
+    """
+
+    records = queue.SimpleQueue()
+    handler = logging.StreamHandler(sys.stdout)
+    handler.setFormatter(logging.Formatter("%(message)s"))
+    listener = logging.handlers.QueueListener(records, handler)
+    listener.start()
+    atexit.register(listener.stop)  # Writes the records left in the queue
+
+    logger = logging.getLogger("bringo")
+    logger.setLevel(logging.INFO)
+    logger.addHandler(logging.handlers.QueueHandler(records))
+    logger.propagate = False
+    return logger
+
+
+logger = _create_logger()
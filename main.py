@@ -1,4 +1,5 @@
 from bringo import BringoScraper
 
-bot = BringoScraper()
-bot.run()
\ No newline at end of file
+if __name__ == "__main__":
+    bot = BringoScraper()
+    bot.run()
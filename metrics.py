@@ -0,0 +1,250 @@
+import json
+import threading
+import time
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Iterator
+
+
+# Upper bounds (in seconds) of the latency histogram buckets
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+
+class Histogram:
+    """
+    Cumulative histogram of observed values with fixed buckets, as exposed by Prometheus.
+    """
+
+    __slots__ = ("buckets", "counts", "count", "sum")
+
+    def __init__(self, buckets: tuple[float, ...] = DEFAULT_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)  # The last one counts the values above every bucket
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value: float) -> None:
+        index = 0
+        while index < len(self.buckets) and value > self.buckets[index]:
+            index += 1
+        self.counts[index] += 1
+        self.count += 1
+        self.sum += value
+
+    def get_quantile(self, quantile: float) -> float | None:
+        """
+        Estimate a quantile from the buckets (the upper bound of the bucket it falls in, capped at the last bucket).
+        """
+
+        if self.count == 0:
+            return None
+        rank = quantile * self.count
+        total = 0
+        for bound, count in zip(self.buckets, self.counts):
+            total += count
+            if total >= rank:
+                return bound
+        return self.buckets[-1]
+
+
+class Metrics:
+    """
+    Thread-safe registry of the counters, gauges and histograms of a run.
+
+    Every metric is identified by its name and labels. Recording a value only takes a lock
+    and a dict lookup, so it can be called from the hot path of every stage.
+    """
+
+    def __init__(self):
+        self.started_at = time.time()
+        self.counters = {}
+        self.gauges = {}
+        self.histograms = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _get_key(name: str, labels: dict[str, str]) -> tuple:
+        return (name, tuple(sorted((label, str(value)) for label, value in labels.items())))
+
+    def inc(self, name: str, value: float = 1, **labels: str) -> None:
+        """
+        Increase a counter.
+
+        Parameters:
+        - name (str): Name of the counter.
+        - value (float): Amount added.
+        - labels: Labels of the counter.
+        """
+
+        key = self._get_key(name, labels)
+        with self._lock:
+            self.counters[key] = self.counters.get(key, 0) + value
+
+    def set_gauge(self, name: str, value: float, **labels: str) -> None:
+        """
+        Set the current value of a gauge (a queue depth for example).
+        """
+
+        key = self._get_key(name, labels)
+        with self._lock:
+            self.gauges[key] = value
+
+    def observe(self, name: str, value: float, **labels: str) -> None:
+        """
+        Record a value in a histogram.
+
+        Parameters:
+        - name (str): Name of the histogram.
+        - value (float): The observed value (a duration in seconds).
+        - labels: Labels of the histogram.
+        """
+
+        key = self._get_key(name, labels)
+        with self._lock:
+            histogram = self.histograms.get(key)
+            if histogram is None:
+                histogram = self.histograms[key] = Histogram()
+            histogram.observe(value)
+
+    def get_counter(self, name: str, **labels: str) -> float:
+        """
+        Get the total of a counter over every label set including the given labels.
+
+        Parameters:
+        - name (str): Name of the counter.
+        - labels: Labels the counted samples must have, every sample of the counter when empty.
+
+        Returns:
+        - float: The total.
+        """
+
+        wanted = set(self._get_key(name, labels)[1])
+        with self._lock:
+            return sum(value for (metric_name, sample_labels), value in self.counters.items() if metric_name == name and wanted <= set(sample_labels))
+
+    @contextmanager
+    def timer(self, name: str, **labels: str) -> Iterator[None]:
+        """
+        Record the duration of a block in a histogram.
+        """
+
+        start_time = time.monotonic()
+        try:
+            yield
+        finally:
+            self.observe(name, time.monotonic() - start_time, **labels)
+
+    @staticmethod
+    def _format_labels(labels: tuple, extra: str = "") -> str:
+        parts = [f'{label}="{value}"' for label, value in labels]
+        if extra:
+            parts.append(extra)
+        return "{" + ",".join(parts) + "}" if parts else ""
+
+    def render_prometheus(self) -> str:
+        """
+        Render every metric in the Prometheus text exposition format.
+
+        Returns:
+        - str: The metrics, one sample per line.
+        """
+
+        lines = []
+        with self._lock:
+            for kind, values in (("counter", self.counters), ("gauge", self.gauges)):
+                for name in sorted({name for name, _ in values}):
+                    lines.append(f"# TYPE {name} {kind}")
+                    for (metric_name, labels), value in values.items():
+                        if metric_name == name:
+                            lines.append(f"{name}{self._format_labels(labels)} {value}")
+            for name in sorted({name for name, _ in self.histograms}):
+                lines.append(f"# TYPE {name} histogram")
+                for (metric_name, labels), histogram in self.histograms.items():
+                    if metric_name != name:
+                        continue
+                    total = 0
+                    for bound, count in zip(histogram.buckets + ("+Inf",), histogram.counts):
+                        total += count
+                        bucket_label = 'le="%s"' % bound
+                        lines.append(f"{name}_bucket{self._format_labels(labels, bucket_label)} {total}")
+                    lines.append(f"{name}_sum{self._format_labels(labels)} {histogram.sum}")
+                    lines.append(f"{name}_count{self._format_labels(labels)} {histogram.count}")
+        return "\n".join(lines) + "\n"
+
+    def get_summary(self) -> dict:
+        """
+        Get a JSON serializable summary of the run.
+
+        Returns:
+        - dict: The duration of the run, the counters, the gauges, and the count, mean and
+          estimated median and 95th percentile of every histogram.
+        """
+
+        def get_name(name: str, labels: tuple) -> str:
+            return name + self._format_labels(labels)
+
+        with self._lock:
+            return {
+                "duration": round(time.time() - self.started_at, 3),
+                "counters": {get_name(*key): value for key, value in sorted(self.counters.items())},
+                "gauges": {get_name(*key): value for key, value in sorted(self.gauges.items())},
+                "histograms": {
+                    get_name(*key): {
+                        "count": histogram.count,
+                        "mean": round(histogram.sum / histogram.count, 4) if histogram.count else None,
+                        "p50": histogram.get_quantile(0.5),
+                        "p95": histogram.get_quantile(0.95)
+                    }
+                    for key, histogram in sorted(self.histograms.items())
+                }
+            }
+
+    def save_summary(self, file_path: str) -> None:
+        """
+        Write the summary of the run to a JSON file.
+
+        Parameters:
+        - file_path (str): Path to the JSON file.
+        """
+
+        with open(file_path, 'w', encoding='utf-8') as file:
+            json.dump(self.get_summary(), file, indent=2, default=str)
+
+    def serve(self, port: int) -> ThreadingHTTPServer:
+        """
+        Expose the metrics on http://<host>:<port>/metrics from a background thread.
+
+        Parameters:
+        - port (int): The port to listen on.
+
+        Returns:
+        - ThreadingHTTPServer: The server, stopped with `shutdown()`.
+        """
+
+        metrics = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.split("?")[0] not in ("/metrics", "/summary"):
+                    self.send_error(404)
+                    return
+                if self.path.startswith("/summary"):
+                    body, content_type = json.dumps(metrics.get_summary(), default=str).encode(), "application/json"
+                else:
+                    body, content_type = metrics.render_prometheus().encode(), "text/plain; version=0.0.4"
+                self.send_response(200)
+                self.send_header("Content-Type", content_type)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass  # Scrapes of the endpoint are not worth a log line
+
+        server = ThreadingHTTPServer(("0.0.0.0", port), Handler)
+        threading.Thread(target=server.serve_forever, name="metrics-server", daemon=True).start()
+        return server
+
+
+# Registry shared by every module of the scraper
+metrics = Metrics()
@@ -0,0 +1,318 @@
+import asyncio
+import csv
+import datetime
+import gzip
+import importlib.util
+import io
+import os
+import queue
+import re
+import threading
+import time
+import uuid
+from typing import Any
+
+from metrics import metrics
+
+
+# Explicit schema of the product files: column name and type. The market and store columns are
+# not stored in the files, they are the values of the partition folders of the files.
+SCHEMA = [
+    ("product_id", "string"),
+    ("market_image", "dictionary"),
+    ("store_image", "dictionary"),
+    ("name", "string"),
+    ("price", "float64"),
+    ("currency", "dictionary"),
+    ("brand", "dictionary"),
+    ("description", "string"),
+    ("number", "string"),
+    ("image", "string"),
+    ("images", "string"),
+    ("url", "string"),
+    ("date", "timestamp"),
+    ("addresses", "dictionary")
+]
+
+# Extension of the files of every format and compression
+EXTENSIONS = {"csv": "csv", "parquet": "parquet", "arrow": "arrows"}
+CSV_COMPRESSION_EXTENSIONS = {"gzip": ".gz", "zstd": ".zst", "none": ""}
+
+
+def get_arrow_schema():
+    """
+    Get the schema of the product files as an Arrow schema (dictionary columns hold the values repeated by many products).
+    """
+
+    import pyarrow
+
+    types = {
+        "string": pyarrow.string(),
+        "dictionary": pyarrow.dictionary(pyarrow.int32(), pyarrow.string()),
+        "float64": pyarrow.float64(),
+        "timestamp": pyarrow.timestamp("s", tz="UTC")
+    }
+    return pyarrow.schema([(name, types[type_name]) for name, type_name in SCHEMA])
+
+
+def _get_partition_value(value: str) -> str:
+    # Escape the characters not allowed in a folder name as in URLs, which Hive partitioning readers decode
+    return re.sub(r'[\x00-\x1f/\\=%:*?"<>|]', lambda match: f"%{ord(match.group()):02X}", value) or "__HIVE_DEFAULT_PARTITION__"
+
+
+def _get_price(value: Any) -> float | None:
+    try:
+        return float(str(value).replace(",", "."))
+    except ValueError:
+        return None
+
+
+def _get_date(value: Any) -> datetime.datetime | None:
+    try:
+        date = datetime.datetime.fromisoformat(str(value).replace("Z", ""))
+    except ValueError:
+        return None
+    return date.replace(tzinfo=datetime.timezone.utc, microsecond=0)
+
+
+class _PartitionFile:
+    """
+    Output file of a partition, written a row group at a time.
+    """
+
+    def __init__(self, file_path: str, file_format: str, compression: str):
+        self.file_path = file_path
+        self.file_format = file_format
+        self.compression = compression
+        self.rows = 0
+        self._writer = None
+
+    def write(self, products: list[Any]) -> None:
+        if self.file_format == "csv":
+            self._write_csv(products)
+            return
+        import pyarrow
+
+        schema = get_arrow_schema()
+        columns = []
+        for name, type_name in SCHEMA:
+            values = [product.get(name) for product in products]
+            if type_name == "float64":
+                values = [_get_price(value) for value in values]
+            elif type_name == "timestamp":
+                values = [_get_date(value) for value in values]
+            columns.append(pyarrow.array(values, type=schema.field(name).type))
+        table = pyarrow.Table.from_arrays(columns, schema=schema)
+        if self._writer is None:
+            self._writer = self._open_arrow_writer(schema)
+        if self.file_format == "parquet":
+            self._writer.write_table(table, row_group_size=len(products))
+        else:
+            self._writer.write_table(table)
+        self.rows += len(products)
+
+    def _open_arrow_writer(self, schema):
+        if self.file_format == "parquet":
+            import pyarrow.parquet
+
+            return pyarrow.parquet.ParquetWriter(self.file_path, schema, compression=self.compression)
+        import pyarrow.ipc
+
+        # The stream format stays readable up to the last complete batch when the file is not closed
+        options = pyarrow.ipc.IpcWriteOptions(compression=None if self.compression == "none" else self.compression)
+        return pyarrow.ipc.new_stream(self.file_path, schema, options=options)
+
+    def _write_csv(self, products: list[Any]) -> None:
+        # Every row group is a complete gzip member or zstd frame appended to the file, so the
+        # file stays readable up to the last row group and concatenated members read as one file
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        if self.rows == 0:
+            writer.writerow([name for name, _ in SCHEMA])
+        for product in products:
+            writer.writerow([product.get(name) for name, _ in SCHEMA])
+        data = buffer.getvalue().encode("utf-8")
+        if self.compression == "gzip":
+            data = gzip.compress(data)
+        elif self.compression == "zstd":
+            import zstandard
+
+            data = zstandard.ZstdCompressor().compress(data)
+        with open(self.file_path, "ab") as file:
+            file.write(data)
+        self.rows += len(products)
+
+    def close(self) -> None:
+        if self._writer is not None:
+            self._writer.close()
+            self._writer = None
+
+
+class ProductFileSink:
+    """
+    Partitioned file sink of the scraped products, in compressed csv, Parquet or Arrow files.
+
+    Products are received over a bounded queue and written by a dedicated thread, a row group
+    at a time, under `<folder>/run_date=<date>/market=<market>/store=<store>/`. Every process
+    writes its own part files, so a resumed run adds files next to the ones of the interrupted run.
+    A Parquet file is only readable once closed: every flush closes the Parquet files, and the next
+    products of their partitions go to new part files (one file per partition and checkpoint).
+    """
+
+    def __init__(self, folder_path: str, file_format: str = "parquet", compression: str = "zstd", row_group_size: int = 10000):
+        """
+        Initialize the sink and start its thread.
+
+        Parameters:
+        - folder_path (str): Root folder of the partitions.
+        - file_format (str): "csv", "parquet" or "arrow".
+        - compression (str): "zstd", "gzip" (csv and Parquet), "snappy" (Parquet), "lz4" (Arrow) or "none".
+        - row_group_size (int): Number of products of a partition written at once.
+        """
+
+        if file_format not in EXTENSIONS:
+            raise ValueError(f"Unknown output format: {file_format}")
+        if file_format == "csv" and compression not in CSV_COMPRESSION_EXTENSIONS:
+            raise ValueError(f"Unsupported csv compression: {compression}")
+        # Fail now rather than in the writer thread
+        if file_format != "csv" and importlib.util.find_spec("pyarrow") is None:
+            raise ImportError(f"The {file_format} output format needs pyarrow (pip install pyarrow)")
+        if file_format == "csv" and compression == "zstd" and importlib.util.find_spec("zstandard") is None:
+            raise ImportError("The zstd compression of csv files needs zstandard (pip install zstandard)")
+
+        self.folder_path = folder_path
+        self.file_format = file_format
+        self.compression = compression
+        self.row_group_size = row_group_size
+        self.written = 0
+        self.failed = 0
+        self.file_paths = set()
+        self._part = uuid.uuid4().hex[:8]
+        self._files = {}  # Open partition files by partition key
+        self._buffers = {}  # Products waiting for their row group by partition key
+        self._queue = queue.Queue(maxsize=row_group_size * 4)
+        self._stop = object()
+        self._thread = threading.Thread(target=self._run, name="file-sink", daemon=True)
+        self._thread.start()
+
+    def put(self, product: Any, run_name: str) -> None:
+        """
+        Queue a product, blocking while the queue is full.
+
+        Parameters:
+        - product (Product | dict): The product to write.
+        - run_name (str): Name of the run (the name of its csv file), starting with its date.
+        """
+
+        self._put((product, run_name))
+
+    async def put_async(self, product: Any, run_name: str) -> None:
+        """
+        Queue a product from the event loop, waiting in a thread only while the queue is full.
+        """
+
+        try:
+            self._queue.put_nowait((product, run_name))
+        except queue.Full:
+            await asyncio.to_thread(self._put, (product, run_name))
+
+    def _put(self, item: Any) -> None:
+        while True:
+            self._check_thread()
+            try:
+                self._queue.put(item, timeout=1)
+                return
+            except queue.Full:
+                pass
+
+    def _check_thread(self) -> None:
+        if not self._thread.is_alive():
+            raise RuntimeError("The file sink thread stopped, the queued products are not written")
+
+    def flush(self) -> None:
+        """
+        Write every queued product and finish the Parquet files, so they are complete on disk (called before a checkpoint).
+
+        Raises a RuntimeError instead of waiting forever if the writer thread stopped.
+        """
+
+        done = threading.Event()
+        self._put(done)
+        while not done.wait(1):
+            self._check_thread()
+
+    async def flush_async(self) -> None:
+        """
+        Flush the sink from the event loop, waiting for the writer thread in a thread.
+        """
+
+        await asyncio.to_thread(self.flush)
+
+    def _run(self) -> None:
+        while True:
+            item = self._queue.get()
+            if item is self._stop:
+                self._write_all(close=True)
+                return
+            if isinstance(item, threading.Event):
+                self._write_all(close=self.file_format == "parquet")  # A Parquet file is only readable once closed
+                item.set()
+                continue
+            product, run_name = item
+            key = (run_name, product.get("market") or "", product.get("store") or "")
+            buffer = self._buffers.setdefault(key, [])
+            buffer.append(product)
+            if len(buffer) >= self.row_group_size:
+                self._write(key)
+
+    def _get_file_path(self, key: tuple[str, str, str]) -> str:
+        run_name, market, store = key
+        match = re.search(r"(\d{4})_(\d{2})_(\d{2})", run_name)
+        run_date = "-".join(match.groups()) if match else datetime.date.today().isoformat()
+        folder_path = os.path.join(self.folder_path, f"run_date={run_date}", f"market={_get_partition_value(market)}", f"store={_get_partition_value(store)}")
+        os.makedirs(folder_path, exist_ok=True)
+        extension = EXTENSIONS[self.file_format] + (CSV_COMPRESSION_EXTENSIONS[self.compression] if self.file_format == "csv" else "")
+        return os.path.join(folder_path, f"{run_name}_{self._part}_{len(self.file_paths)}.{extension}")
+
+    def _write(self, key: tuple[str, str, str]) -> None:
+        products = self._buffers.pop(key, [])
+        if not products:
+            return
+        start_time = time.monotonic()
+        try:
+            file = self._files.get(key)
+            if file is None:
+                file = self._files[key] = _PartitionFile(self._get_file_path(key), self.file_format, self.compression)
+                self.file_paths.add(file.file_path)
+            file.write(products)
+            self.written += len(products)
+            metrics.inc("sink_rows_total", len(products), sink=self.file_format)
+        except Exception as e:
+            self.failed += len(products)
+            metrics.inc("sink_errors_total", sink=self.file_format)
+            print(f"Error while writing {len(products)} products in {self.file_format} files : {e}")
+        metrics.observe("sink_write_seconds", time.monotonic() - start_time, sink=self.file_format)
+
+    def _write_all(self, close: bool) -> None:
+        for key in list(self._buffers):
+            self._write(key)
+        if close:
+            for file in self._files.values():
+                file.close()
+            self._files = {}
+
+    def get_size(self) -> int:
+        """
+        Get the size (in bytes) of the files written by the sink.
+        """
+
+        return sum(os.path.getsize(file_path) for file_path in self.file_paths if os.path.exists(file_path))
+
+    def close(self) -> None:
+        """
+        Write the remaining products, close the files and stop the thread.
+        """
+
+        if self._thread.is_alive():
+            self._put(self._stop)
+        self._thread.join()
@@ -0,0 +1,117 @@
+import asyncio
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Callable
+
+from metrics import metrics
+
+
+def _run_batch(extract: Callable, payloads: list[bytes]) -> list[tuple[bool, Any]]:
+    # Runs in a parser process: one pickling round trip for the whole batch
+    results = []
+    for payload in payloads:
+        try:
+            results.append((True, extract(payload)))
+        except Exception as exc:
+            results.append((False, exc))
+    return results
+
+
+class ParsePool:
+    """
+    Pool of parser processes, separate from the network I/O running on the event loop.
+
+    Fetch workers hand the raw pages over to `parse` and keep fetching while the
+    CPU-bound parsing runs on every core. Pages are sent to the processes in batches
+    to amortise the pickling cost.
+    """
+
+    def __init__(self, workers: int = None, batch_size: int = 16, batch_delay: float = 0.02):
+        """
+        Initialize the parse pool.
+
+        Parameters:
+        - workers (int): Number of parser processes, the number of cores by default. 0 parses on the event loop.
+        - batch_size (int): Number of pages sent to a parser process at once.
+        - batch_delay (float): Maximum time (in seconds) a page waits for its batch to fill up.
+        """
+
+        self.workers = os.cpu_count() if workers is None else workers
+        self.batch_size = batch_size
+        self.batch_delay = batch_delay
+        self._executor = None
+        self._batches = {}  # Pending pages and their futures by extract function
+        self._flush_handles = {}
+
+    def _get_executor(self) -> ProcessPoolExecutor:
+        if self._executor is None:
+            # forkserver doesn't inherit the threads of the event loop like fork does
+            self._executor = ProcessPoolExecutor(max_workers=self.workers, mp_context=multiprocessing.get_context("forkserver"))
+        return self._executor
+
+    async def parse(self, extract: Callable, payload: bytes) -> Any:
+        """
+        Extract values from a page in a parser process.
+
+        Parameters:
+        - extract (Callable): Module level function extracting values from the page.
+        - payload (bytes): The content of the page.
+
+        Returns:
+        - Any: The value returned by the extract function, its exception is raised again here.
+        """
+
+        with metrics.timer("parse_seconds", extractor=extract.__name__):  # Includes the wait for a parser process
+            return await self._parse(extract, payload)
+
+    async def _parse(self, extract: Callable, payload: bytes) -> Any:
+        if self.workers == 0:
+            return extract(payload)
+
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        batch = self._batches.setdefault(extract, [])
+        batch.append((payload, future))
+        if len(batch) >= self.batch_size:
+            self._flush(extract)
+        elif extract not in self._flush_handles:
+            self._flush_handles[extract] = loop.call_later(self.batch_delay, self._flush, extract)
+        return await future
+
+    def _flush(self, extract: Callable) -> None:
+        handle = self._flush_handles.pop(extract, None)
+        if handle is not None:
+            handle.cancel()
+        batch = self._batches.pop(extract, [])
+        if not batch:
+            return
+
+        loop = asyncio.get_running_loop()
+        payloads = [payload for payload, _ in batch]
+        futures = [future for _, future in batch]
+        task = loop.run_in_executor(self._get_executor(), _run_batch, extract, payloads)
+
+        def resolve(task: asyncio.Future) -> None:
+            if task.cancelled():
+                results = [(False, asyncio.CancelledError())] * len(futures)
+            elif task.exception() is not None:
+                results = [(False, task.exception())] * len(futures)
+            else:
+                results = task.result()
+            for future, (success, value) in zip(futures, results):
+                if future.done():
+                    continue
+                if success: future.set_result(value)
+                else: future.set_exception(value)
+
+        task.add_done_callback(resolve)
+
+    def close(self) -> None:
+        """
+        Stop the parser processes.
+        """
+
+        if self._executor is not None:
+            self._executor.shutdown(wait=True, cancel_futures=True)
+            self._executor = None
@@ -0,0 +1,162 @@
+import asyncio
+import time
+from typing import Any, Callable
+
+from metrics import metrics
+from log_queue import logger
+
+
+class _Done:
+    """
+    Marker put in a queue once every item of the previous stage was produced.
+    """
+
+
+DONE = _Done()
+
+
+class Stage:
+    """
+    One step of a pipeline: a pool of async workers reading items from a bounded input queue.
+    """
+
+    def __init__(self, name: str, callback: Callable, workers: int, queue_size: int, fan_out: bool = False):
+        """
+        Initialize the stage.
+
+        Parameters:
+        - name (str): Name of the stage, used in logs.
+        - callback (Callable): Coroutine function called with each item of the stage.
+        - workers (int): Number of items processed at the same time.
+        - queue_size (int): Maximum number of items waiting in the input queue of the stage.
+        - fan_out (bool): If True the callback returns a list of items, each one passed to the next stage.
+        """
+
+        self.name = name
+        self.callback = callback
+        self.workers = workers
+        self.queue = asyncio.Queue(maxsize=queue_size)
+        self.fan_out = fan_out
+        self.processed = 0
+
+
+class Pipeline:
+    """
+    Streaming producer/consumer pipeline made of bounded stages.
+
+    Items flow from one stage to the next as soon as they are produced, so every stage
+    works at the same time and the bounded queues keep the memory use flat: a full
+    queue blocks the stage feeding it until the next stage catches up.
+    """
+
+    def __init__(self, checkpoint: Any = None):
+        """
+        Initialize an empty pipeline.
+
+        Parameters:
+        - checkpoint (Frontier): Durable frontier recording the progress of every item, None keeps it in memory only.
+        """
+
+        self.stages = []
+        self.checkpoint = checkpoint
+
+    def add_stage(self, name: str, callback: Callable, workers: int, queue_size: int = None, fan_out: bool = False) -> "Pipeline":
+        """
+        Append a stage at the end of the pipeline.
+
+        Parameters:
+        - name (str): Name of the stage, used in logs.
+        - callback (Callable): Coroutine function called with each item of the stage.
+        - workers (int): Number of items processed at the same time.
+        - queue_size (int): Maximum number of items waiting in the input queue of the stage (twice the workers by default).
+        - fan_out (bool): If True the callback returns a list of items, each one passed to the next stage.
+
+        Returns:
+        - Pipeline: The pipeline itself, so calls can be chained.
+        """
+
+        self.stages.append(Stage(name, callback, workers, queue_size or workers * 2, fan_out))
+        return self
+
+    def get_queue_sizes(self) -> dict[str, int]:
+        """
+        Get the number of items waiting in front of each stage.
+
+        Returns:
+        - dict: The queue size of each stage by name.
+        """
+
+        return {stage.name: stage.queue.qsize() for stage in self.stages}
+
+    async def run(self, inputs: list[Any], pending: dict[str, list[Any]] = None) -> None:
+        """
+        Feed the inputs to the first stage and wait until every stage is drained.
+
+        Parameters:
+        - inputs (list): The items of the first stage.
+        - pending (dict): Items left by an interrupted run, by name of the stage they are fed to.
+        """
+
+        pending = pending or {}
+        if self.checkpoint is not None:
+            inputs = self.checkpoint.add(self.stages[0].name, inputs)
+            await self._flush_checkpoint()
+
+        async def produce(stage, items):
+            for item in items:
+                await stage.queue.put(item)
+            if stage is self.stages[0]:
+                await stage.queue.put(DONE)
+
+        # The pending items of a stage are fed before the stage above it can signal the end
+        producers = [asyncio.ensure_future(produce(stage, pending.get(stage.name, []) + (inputs if index == 0 else []))) for index, stage in enumerate(self.stages)]
+        next_stages = self.stages[1:] + [None]
+        next_producers = producers[1:] + [None]
+        try:
+            await asyncio.gather(*producers, *[self._run_stage(stage, next_stage, next_producer) for stage, next_stage, next_producer in zip(self.stages, next_stages, next_producers)])
+        finally:
+            if self.checkpoint is not None:
+                await self.checkpoint.flush_async()
+
+    async def _flush_checkpoint(self) -> None:
+        # The worker waits for the commit, the other workers keep buffering checkpoints meanwhile
+        if self.checkpoint.is_flush_due():
+            await self.checkpoint.flush_async()
+
+    async def _run_stage(self, stage: Stage, next_stage: Stage | None, next_producer: asyncio.Future | None) -> None:
+        next_queue = next_stage.queue if next_stage is not None else None
+
+        async def work():
+            while True:
+                item = await stage.queue.get()
+                metrics.set_gauge("pipeline_queue_depth", stage.queue.qsize(), stage=stage.name)
+                if item is DONE:
+                    await stage.queue.put(DONE)  # Let the other workers of the stage stop too
+                    return
+                start_time = time.monotonic()
+                try:
+                    result = await stage.callback(item)
+                except Exception as exc:
+                    metrics.inc("pipeline_items_total", stage=stage.name, outcome="error")
+                    logger.info(f'Input {item} generated an exception in stage {stage.name}: {exc!r}')
+                    if self.checkpoint is not None:
+                        self.checkpoint.complete(stage.name, item, None, [], failed=True)
+                        await self._flush_checkpoint()
+                    continue
+                stage.processed += 1
+                metrics.observe("pipeline_stage_seconds", time.monotonic() - start_time, stage=stage.name)
+                metrics.inc("pipeline_items_total", stage=stage.name, outcome="success")
+                outputs = [] if result is None else (result if stage.fan_out else [result])
+                if self.checkpoint is not None:
+                    outputs = self.checkpoint.complete(stage.name, item, next_stage.name if next_stage else None, outputs)
+                    await self._flush_checkpoint()
+                if next_queue is None:
+                    continue
+                for output in outputs:
+                    await next_queue.put(output)  # Blocks while the next stage is behind
+
+        await asyncio.gather(*[work() for _ in range(stage.workers)])
+        if next_queue is not None:
+            await next_producer
+            await next_queue.put(DONE)
+        print(f'---> stage {stage.name} finished : {stage.processed} items')
@@ -0,0 +1,77 @@
+import json
+import time
+
+from sqlite_store import SqliteStore
+
+
+class ProductIndex(SqliteStore):
+    """
+    Persistent index of the scraped products, keyed by product URL.
+
+    For every product it remembers the last product_id, when the product page was last
+    fetched, the fingerprint of its listing tile and the details extracted from its page,
+    so incremental runs can skip the products that didn't change since the last run.
+    """
+
+    schema = """
+        CREATE TABLE IF NOT EXISTS products (
+            product_url TEXT PRIMARY KEY,
+            product_id TEXT,
+            fingerprint TEXT,
+            fetched_at REAL,
+            details TEXT
+        );
+        CREATE INDEX IF NOT EXISTS products_product_id ON products (product_id);
+    """
+
+    def get_unchanged_details(self, product_url: str, fingerprint: str, max_age: float) -> dict[str, str] | None:
+        """
+        Get the known details of a product if it was fetched recently and its listing tile didn't change.
+
+        Parameters:
+        - product_url (str): The full URL of the product page.
+        - fingerprint (str): The fingerprint of the product tile on the listing page.
+        - max_age (float): Maximum age of the last fetch (in seconds) before the product is fetched again anyway.
+
+        Returns:
+        - dict: The details extracted from the product page on the last fetch, or None if the product must be fetched.
+        """
+
+        row = self._query_one("SELECT fingerprint, fetched_at, details FROM products WHERE product_url = ?", (product_url,))
+        if row is None:
+            return None
+        known_fingerprint, fetched_at, details = row
+        if known_fingerprint != fingerprint or fetched_at < time.time() - max_age:
+            return None
+        return json.loads(details)
+
+    def get_details(self, product_url: str, since: float) -> dict[str, str] | None:
+        """
+        Get the details of a product fetched since a given time, by the current run for example.
+
+        Parameters:
+        - product_url (str): The full URL of the product page.
+        - since (float): Timestamp the last fetch must not be older than.
+
+        Returns:
+        - dict: The details extracted from the product page, or None if it wasn't fetched since then.
+        """
+
+        row = self._query_one("SELECT details FROM products WHERE product_url = ? AND fetched_at >= ?", (product_url, since))
+        return json.loads(row[0]) if row is not None else None
+
+    def update(self, product_url: str, product_id: str, fingerprint: str, details: dict[str, str]) -> None:
+        """
+        Record a fetched product.
+
+        Parameters:
+        - product_url (str): The full URL of the product page.
+        - product_id (str): The hash identifying the product.
+        - fingerprint (str): The fingerprint of the product tile on the listing page.
+        - details (dict): The details extracted from the product page.
+        """
+
+        self._execute(
+            "INSERT OR REPLACE INTO products (product_url, product_id, fingerprint, fetched_at, details) VALUES (?, ?, ?, ?, ?)",
+            (product_url, product_id, fingerprint, time.time(), json.dumps(details))
+        )
@@ -0,0 +1,172 @@
+import random
+import threading
+import time
+from typing import Callable
+
+
+class ProxyHealth:
+    """
+    Health statistics of a single proxy.
+    """
+
+    __slots__ = ("proxy", "latency", "error_rate", "requests", "failures", "bans", "consecutive_failures", "state", "opened_at", "open_seconds", "probing", "probe_started_at")
+
+    def __init__(self, proxy: str, open_seconds: float):
+        self.proxy = proxy
+        self.latency = None  # EWMA of the response time (in seconds)
+        self.error_rate = 0.0  # EWMA of the failures, between 0 and 1
+        self.requests = 0
+        self.failures = 0
+        self.bans = 0
+        self.consecutive_failures = 0
+        self.state = "closed"  # Circuit breaker state: "closed", "open" or "half_open"
+        self.opened_at = 0.0
+        self.open_seconds = open_seconds
+        self.probing = False
+        self.probe_started_at = 0.0
+
+    def to_dict(self) -> dict:
+        return {
+            "latency": round(self.latency, 3) if self.latency is not None else None,
+            "error_rate": round(self.error_rate, 3),
+            "requests": self.requests,
+            "failures": self.failures,
+            "bans": self.bans,
+            "state": self.state
+        }
+
+
+class ProxyScheduler:
+    """
+    Thread-safe proxy scheduler weighting the selection toward healthy proxies.
+
+    Every proxy tracks an EWMA of its latency and error rate. Proxies are picked at random
+    with a weight favouring fast and reliable ones. A proxy failing repeatedly (or banned)
+    trips its circuit breaker: it gets no traffic until a timed half-open probe succeeds. A probe
+    that is neither reported nor released is given up after the open time of the proxy.
+    """
+
+    def __init__(self, proxies: list[str], alpha: float = 0.2, failure_threshold: int = 5, error_rate_threshold: float = 0.5, open_seconds: float = 30, max_open_seconds: float = 600, clock: Callable[[], float] = time.monotonic):
+        """
+        Initialize the scheduler.
+
+        Parameters:
+        - proxies (list[str]): The proxy urls.
+        - alpha (float): Weight of the latest sample in the moving averages.
+        - failure_threshold (int): Consecutive failures tripping the circuit breaker.
+        - error_rate_threshold (float): Error rate tripping the circuit breaker.
+        - open_seconds (float): Time a tripped proxy waits before its first half-open probe.
+        - max_open_seconds (float): Maximum wait, the wait doubles every time a probe fails.
+        - clock (Callable): Monotonic time source (in seconds) of the circuit breakers.
+        """
+
+        self.alpha = alpha
+        self.failure_threshold = failure_threshold
+        self.error_rate_threshold = error_rate_threshold
+        self.open_seconds = open_seconds
+        self.max_open_seconds = max_open_seconds
+        self.clock = clock
+        self.proxies = {proxy: ProxyHealth(proxy, open_seconds) for proxy in proxies}
+        self._lock = threading.Lock()
+
+    def acquire(self) -> str | None:
+        """
+        Pick the proxy of the next request.
+
+        Returns:
+        - str: The proxy url, or None if there are no proxies.
+        """
+
+        if not self.proxies:
+            return None
+
+        now = self.clock()
+        with self._lock:
+            candidates = []
+            for health in self.proxies.values():
+                if health.state == "open" and now - health.opened_at >= health.open_seconds:
+                    health.state = "half_open"
+                if health.state == "half_open" and (not health.probing or now - health.probe_started_at >= health.open_seconds):
+                    health.probing = True
+                    health.probe_started_at = now
+                    return health.proxy  # Let a single request probe the proxy
+                if health.state == "closed":
+                    candidates.append(health)
+
+            if not candidates:
+                # Every proxy is tripped, use the one recovering first rather than stalling
+                return min(self.proxies.values(), key=lambda health: health.opened_at + health.open_seconds).proxy
+
+            known_latencies = [health.latency for health in candidates if health.latency is not None]
+            default_latency = sum(known_latencies) / len(known_latencies) if known_latencies else 1.0
+            weights = [(1 - health.error_rate) ** 2 / max(health.latency or default_latency, 0.05) for health in candidates]
+            return random.choices(candidates, weights=weights)[0].proxy
+
+    def report(self, proxy: str | None, latency: float, success: bool, banned: bool = False) -> None:
+        """
+        Record the outcome of a request sent through a proxy.
+
+        Parameters:
+        - proxy (str): The proxy url, or None for direct connections.
+        - latency (float): Response time of the request (in seconds).
+        - success (bool): False if the request failed (timeout, connection error, bad status).
+        - banned (bool): True if the response looks like the proxy is blocked (403/429).
+        """
+
+        health = self.proxies.get(proxy)
+        if health is None:
+            return
+
+        with self._lock:
+            health.requests += 1
+            health.latency = latency if health.latency is None else self.alpha * latency + (1 - self.alpha) * health.latency
+            failed = not success or banned
+            health.error_rate = self.alpha * failed + (1 - self.alpha) * health.error_rate
+            if banned:
+                health.bans += 1
+            if not failed:
+                health.consecutive_failures = 0
+                if health.state != "closed":
+                    health.state = "closed"  # The probe succeeded
+                    health.open_seconds = self.open_seconds
+                health.probing = False
+                return
+
+            health.failures += 1
+            health.consecutive_failures += 1
+            if health.state == "half_open":
+                self._trip(health, min(health.open_seconds * 2, self.max_open_seconds))  # The probe failed, wait longer
+            elif health.state == "closed" and (banned or health.consecutive_failures >= self.failure_threshold or health.error_rate >= self.error_rate_threshold):
+                self._trip(health, self.open_seconds)
+
+    def release(self, proxy: str | None) -> None:
+        """
+        Give back a proxy acquired for a request that wasn't sent through it or whose outcome says nothing of
+        the proxy (response served from the cache, browser session), so a half-open proxy can be probed again.
+
+        Parameters:
+        - proxy (str): The proxy url, or None for direct connections.
+        """
+
+        health = self.proxies.get(proxy)
+        if health is None:
+            return
+        with self._lock:
+            health.probing = False
+
+    def _trip(self, health: ProxyHealth, open_seconds: float) -> None:
+        health.state = "open"
+        health.opened_at = self.clock()
+        health.open_seconds = open_seconds
+        health.probing = False
+
+    def get_stats(self) -> dict[str, dict]:
+        """
+        Get the health statistics of every proxy.
+
+        Returns:
+        - dict: Latency, error rate, request, failure and ban counts and circuit state by proxy.
+        """
+
+        with self._lock:
+            return {proxy: health.to_dict() for proxy, health in self.proxies.items()}
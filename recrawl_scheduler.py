@@ -0,0 +1,260 @@
+import datetime
+import hashlib
+import json
+import re
+import time
+from typing import Any
+
+from sqlite_store import SqliteStore
+
+
+WEEK_DAYS = {"lundi": 0, "mardi": 1, "mercredi": 2, "jeudi": 3, "vendredi": 4, "samedi": 5, "dimanche": 6}
+
+
+def get_timezone(name: str) -> datetime.tzinfo:
+    """
+    Get a timezone by name, UTC when the timezone database doesn't know it.
+    """
+
+    try:
+        from zoneinfo import ZoneInfo
+
+        return ZoneInfo(name)
+    except Exception:
+        print(f"Unknown timezone {name}, the opening hours are read in UTC")
+        return datetime.timezone.utc
+
+
+def parse_open_programs(open_programs: list[dict[str, str]]) -> dict[int, list[tuple[int, int]]]:
+    """
+    Parse the opening hours of a market, as shown on the stores list.
+
+    Parameters:
+    - open_programs (list): The "week_day" ("Lundi - Vendredi", "Samedi", "Tous les jours") and "time" ("09:00 - 22:00") of every program.
+
+    Returns:
+    - dict: The opening intervals (in minutes since midnight) by week day, empty if no program could be read.
+    """
+
+    programs = {}
+    for program in open_programs or []:
+        week_day = program.get("week_day", "").lower()
+        if "tous" in week_day:
+            days = list(range(7))
+        else:
+            found = [WEEK_DAYS[name] for name in re.findall(r"[a-zé]+", week_day) if name in WEEK_DAYS]
+            if "-" in week_day and len(found) == 2:
+                days = [(found[0] + offset) % 7 for offset in range((found[1] - found[0]) % 7 + 1)]
+            else:
+                days = found
+        match = re.search(r"(\d{1,2})\s*[:h]\s*(\d{2})?\s*-\s*(\d{1,2})\s*[:h]\s*(\d{2})?", program.get("time", ""))
+        if not days or match is None:
+            continue
+        start = int(match.group(1)) * 60 + int(match.group(2) or 0)
+        end = int(match.group(3)) * 60 + int(match.group(4) or 0)
+        for day in days:
+            if end > start:
+                programs.setdefault(day, []).append((start, end))
+            else:  # Closes after midnight
+                programs.setdefault(day, []).append((start, 24 * 60))
+                programs.setdefault((day + 1) % 7, []).append((0, end))
+    return programs
+
+
+def get_next_open_time(timestamp: float, open_programs: list[dict[str, str]], timezone: datetime.tzinfo) -> float:
+    """
+    Get the first moment a market is open, from a given time.
+
+    Parameters:
+    - timestamp (float): The time to start from.
+    - open_programs (list): The opening hours of the market.
+    - timezone (tzinfo): Timezone of the opening hours.
+
+    Returns:
+    - float: The timestamp itself if the market is open then (or its opening hours are unknown), else its next opening.
+    """
+
+    programs = parse_open_programs(open_programs)
+    if not programs:
+        return timestamp
+    moment = datetime.datetime.fromtimestamp(timestamp, timezone)
+    midnight = moment.replace(hour=0, minute=0, second=0, microsecond=0)
+    minutes = moment.hour * 60 + moment.minute
+    for offset in range(8):
+        day = midnight + datetime.timedelta(days=offset)
+        for start, end in sorted(programs.get(day.weekday(), [])):
+            if offset == 0 and start <= minutes < end:
+                return timestamp
+            if offset > 0 or start > minutes:
+                return (day + datetime.timedelta(minutes=start)).timestamp()
+    return timestamp
+
+
+class RecrawlScheduler(SqliteStore):
+    """
+    Persistent recrawl schedule of the markets, stores and listing pages of a resident scraper.
+
+    Every target has its own recrawl interval, halved when a recrawl finds it changed and grown when it
+    didn't, between `min_interval` and `max_interval`: pages that change often are refreshed often, static
+    ones fade to a few recrawls a week. A recrawl falling while the market is closed is pushed to its next
+    opening, nothing changes on a closed market. The table indexed on the due time is the priority queue,
+    so the schedule survives a restart; the due targets are served by decreasing change rate.
+    """
+
+    schema = """
+        CREATE TABLE IF NOT EXISTS targets (
+            target_key TEXT PRIMARY KEY,
+            kind TEXT NOT NULL,  -- "market", "store" or "page"
+            parent_key TEXT,
+            payload TEXT NOT NULL,
+            signature TEXT,
+            interval REAL NOT NULL,
+            next_at REAL NOT NULL,
+            checks INTEGER NOT NULL DEFAULT 0,
+            changes INTEGER NOT NULL DEFAULT 0,
+            checked_at REAL
+        );
+        CREATE INDEX IF NOT EXISTS targets_next_at ON targets (next_at);
+        CREATE INDEX IF NOT EXISTS targets_parent_key ON targets (parent_key);
+    """
+
+    def __init__(self, file_path: str, min_interval: float, max_interval: float, timezone: str = "Africa/Casablanca", growth: float = 1.5):
+        """
+        Open the schedule.
+
+        Parameters:
+        - file_path (str): Path to the SQLite database of the schedule.
+        - min_interval (float): Shortest time (in seconds) between two recrawls of a target, the interval of new targets.
+        - max_interval (float): Longest time (in seconds) between two recrawls of a target.
+        - timezone (str): Timezone of the opening hours of the markets.
+        - growth (float): Factor applied to the interval of a target found unchanged.
+        """
+
+        super().__init__(file_path)
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.timezone = get_timezone(timezone)
+        self.growth = growth
+
+    @staticmethod
+    def get_signature(values: list[Any]) -> str:
+        """
+        Get the signature of what a recrawl found (store URLs, page URLs or tile fingerprints), compared between recrawls.
+        """
+
+        return hashlib.sha256("\n".join(str(value) for value in values).encode()).hexdigest()
+
+    def add(self, kind: str, target_key: str, payload: dict[str, Any], parent_key: str = None) -> bool:
+        """
+        Add a target, due now, or update the payload of a known target.
+
+        Parameters:
+        - kind (str): "market", "store" or "page".
+        - target_key (str): URL of the target.
+        - payload (dict): The item recrawled (market, store or page).
+        - parent_key (str): Key of the target it was found on.
+
+        Returns:
+        - bool: True if the target is new.
+        """
+
+        data = json.dumps(payload, ensure_ascii=False)
+        with self._lock:
+            cursor = self._connection.execute(
+                "INSERT OR IGNORE INTO targets (target_key, kind, parent_key, payload, interval, next_at) VALUES (?, ?, ?, ?, ?, ?)",
+                (target_key, kind, parent_key, data, self.min_interval, time.time())
+            )
+            if cursor.rowcount == 0:
+                self._connection.execute("UPDATE targets SET payload = ?, parent_key = ? WHERE target_key = ?", (data, parent_key, target_key))
+            self._connection.commit()
+        return cursor.rowcount > 0
+
+    def retire(self, parent_key: str, kept_keys: list[str]) -> int:
+        """
+        Remove the targets found on a target that aren't on it anymore (a store gone, a page past the last one), with their own targets.
+
+        Parameters:
+        - parent_key (str): Key of the target.
+        - kept_keys (list): Keys of the targets still found on it.
+
+        Returns:
+        - int: The number of targets removed.
+        """
+
+        kept = set(kept_keys)
+        keys = [key for (key,) in self._query("SELECT target_key FROM targets WHERE parent_key = ?", (parent_key,)) if key not in kept]
+        removed = 0
+        for key in keys:
+            removed += self.retire(key, [])
+        self._executemany("DELETE FROM targets WHERE target_key = ?", [(key,) for key in keys])
+        return removed + len(keys)
+
+    def claim_due(self, limit: int) -> list[tuple[str, str, dict[str, Any]]]:
+        """
+        Take the targets due now, the ones changing the most often first.
+
+        A claimed target is due again after `min_interval`, unless its recrawl is observed before:
+        a target whose recrawl failed is retried later instead of right away.
+
+        Parameters:
+        - limit (int): Maximum number of targets.
+
+        Returns:
+        - list: The kind, key and payload of every target.
+        """
+
+        now = time.time()
+        with self._lock:
+            rows = self._connection.execute(
+                "SELECT kind, target_key, payload FROM targets WHERE next_at <= ? ORDER BY (changes + 1.0) / (checks + 2) DESC, next_at LIMIT ?",
+                (now, limit)
+            ).fetchall()
+            self._connection.executemany("UPDATE targets SET next_at = ? WHERE target_key = ?", [(now + self.min_interval, key) for _, key, _ in rows])
+            self._connection.commit()
+        return [(kind, key, json.loads(payload)) for kind, key, payload in rows]
+
+    def observe(self, target_key: str, signature: str, open_programs: list[dict[str, str]] = None, closed: bool = False) -> bool:
+        """
+        Record a recrawl of a target and schedule the next one.
+
+        Parameters:
+        - target_key (str): Key of the target.
+        - signature (str): Signature of what the recrawl found.
+        - open_programs (list): The opening hours of the market of the target.
+        - closed (bool): True if the market showed itself closed, its interval is then kept as is.
+
+        Returns:
+        - bool: True if the target changed since its previous recrawl.
+        """
+
+        row = self._query_one("SELECT signature, interval FROM targets WHERE target_key = ?", (target_key,))
+        if row is None:
+            return False
+        previous, interval = row
+        changed = previous is not None and previous != signature
+        if changed:
+            interval = max(self.min_interval, interval / 2)
+        elif previous is not None and not closed:
+            interval = min(self.max_interval, interval * self.growth)
+        now = time.time()
+        next_at = get_next_open_time(now + interval, open_programs, self.timezone)
+        self._execute(
+            "UPDATE targets SET signature = ?, interval = ?, next_at = ?, checks = checks + 1, changes = changes + ?, checked_at = ? WHERE target_key = ?",
+            (signature, interval, next_at, int(changed), now, target_key)
+        )
+        return changed
+
+    def get_next_due(self) -> float | None:
+        """
+        Get the time the next target is due, None if the schedule is empty.
+        """
+
+        return self._query_one("SELECT MIN(next_at) FROM targets")[0]
+
+    def get_stats(self) -> dict[str, Any]:
+        """
+        Get the number of targets and due targets and the mean interval (in minutes) of every kind.
+        """
+
+        rows = self._query("SELECT kind, COUNT(*), SUM(next_at <= ?), AVG(interval) FROM targets GROUP BY kind", (time.time(),))
+        return {kind: {"targets": count, "due": due, "interval_minutes": round(interval / 60, 1)} for kind, count, due, interval in rows}
@@ -1,4 +1,5 @@
 import time
+import asyncio
 from seleniumwire import webdriver
 from selenium.webdriver.common.by import By
 from selenium.webdriver.support.ui import WebDriverWait
@@ -7,22 +8,26 @@ from selenium.common.exceptions import StaleElementReferenceException, NoSuchEle
 import datetime
 import csv
 import os
-import requests
 import hashlib
-from typing import Any, Callable
-from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Any
 from selenium.webdriver.remote.webdriver import WebDriver
 from selenium.webdriver.support.wait import WebDriverWait
 from selenium.webdriver.chrome.service import Service
 from requests import Response
+from fetcher import AsyncFetcher
+from metrics import metrics
+from log_queue import logger
+from http_cache import HttpCache
+from parse_pool import ParsePool
+from proxy_scheduler import ProxyScheduler
+from concurrency import ConcurrencyController
+import random
 # from conf.models import Scraper as ScraperModel
 
 class Scraper:
        
     name = "Scraper"
 
-    proxy_index = 0
-
     proxies_file_path = "proxies.txt"
     # proxies_file_path = "../proxies.txt"
     proxies = []
@@ -32,9 +37,27 @@ class Scraper:
     proxies = [proxy.strip().replace("\n", "").replace(",", "") for proxy in proxies if len(proxy.strip().replace("\n", "").replace(",", "")) > 0]
 
     print("================== proxies >>>>>>>>>>>", proxies)
+
+    # Shared by every request of every thread and coroutine
+    proxy_scheduler = ProxyScheduler(proxies)
     
     folder_name = "default_results"
 
+    # Maximum number of requests in flight at the same time in the async fetch engine
+    max_concurrency = int(os.getenv("MAX_CONCURRENCY", 200))
+    # Starting concurrency of the site and of each proxy, adapted during the run up to MAX_CONCURRENCY
+    initial_host_concurrency = int(os.getenv("INITIAL_HOST_CONCURRENCY", 30))
+    initial_proxy_concurrency = int(os.getenv("INITIAL_PROXY_CONCURRENCY", 10))
+    # Maximum number of keep-alive connections per proxy
+    pool_size = int(os.getenv("POOL_SIZE", 20))
+
+    # Persistent response cache, disabled when the path is empty
+    http_cache_path = os.getenv("HTTP_CACHE_PATH", "cache/http_cache.sqlite3")
+    http_cache_max_size = int(os.getenv("HTTP_CACHE_MAX_MB", 2048)) * 1024 ** 2
+
+    # Number of parser processes (the number of cores by default, 0 parses on the event loop)
+    parse_workers = int(os.getenv("PARSE_WORKERS")) if os.getenv("PARSE_WORKERS") else None
+
     model=None
 
     def __init__(self, main_url: str, folder_name: str):
@@ -65,68 +88,84 @@ class Scraper:
 
         print("========= proxies >>>>>>", self.proxies)
 
+        self._csv_files = {}  # Open CSV files and their writers by file path
+
+        self.http_cache = HttpCache(self.http_cache_path, self.http_cache_max_size) if self.http_cache_path else None
+        controller = ConcurrencyController(self.initial_host_concurrency, self.initial_proxy_concurrency, maximum=self.max_concurrency)
+        self.fetcher = AsyncFetcher(main_url, max_concurrency=self.max_concurrency, pool_size=self.pool_size, cache=self.http_cache, proxy_scheduler=self.proxy_scheduler, controller=controller)  # Shared by every scraping stage
+        self.parse_pool = ParsePool(self.parse_workers)  # Parsing runs next to the fetch engine, on every core
+
     @staticmethod
     def _get_proxy():
         """
         Get a proxy configuration from the list of proxies.
     
-        This method retrieves a proxy configuration based on the current index in the proxy list.
+        This method asks the proxy scheduler for the next proxy, healthy proxies being picked more often
+        and proxies with a tripped circuit breaker being skipped.
         The proxy configuration includes both HTTP and HTTPS proxies.
-        If the index exceeds the number of proxies in the list, it resets to 0 for rotation.
         
         Returns:
         - proxy (dict): A dictionary containing HTTP and HTTPS proxy configurations. Returns None if no proxies are available.
         """
     
-        if len(Scraper.proxies) == 0:
+        proxy_url = Scraper.proxy_scheduler.acquire()
+        if proxy_url is None:
             return None  # Return None if there are no proxies in the list
     
         proxy = {
-            "http": Scraper.proxies[Scraper.proxy_index],  # Define the HTTP proxy configuration
-            "https": Scraper.proxies[Scraper.proxy_index]  # Define the HTTPS proxy configuration
+            "http": proxy_url,  # Define the HTTP proxy configuration
+            "https": proxy_url  # Define the HTTPS proxy configuration
         }
         
-        Scraper.proxy_index += 1  # Move to the next proxy in the list
-        
-        if Scraper.proxy_index >= len(Scraper.proxies): 
-            Scraper.proxy_index = 0  # Reset the index if it exceeds the number of proxies
-        
         return proxy  # Return the proxy configuration
     
     def _get_file_path(self, file_name: str):
         return f"results/{self.folder_name}/{file_name}"
 
-    def _save_products_in_csv(self, products: list[dict[str, str]], file_path: str) -> None:
+    def _write_product_in_csv(self, product: dict[str, str], file_path: str) -> None:
         """
-        Save a list of products to a CSV file.
-    
-        This method takes a list of product dictionaries and saves them to a CSV file specified by the file path.
-        If the file does not exist, it creates a new file with the product data.
-    
+        Append a single product to a CSV file as soon as it is scraped.
+
+        The file is opened once and kept open until `_close_csv_files` is called,
+        the header is written when the file is created.
+
         Parameters:
-        - products (list[dict[str, str]]): List of product dictionaries to be saved.
-        - file_path (str): Path to the CSV file where the products will be saved.
+        - product (dict[str, str]): The product to be saved.
+        - file_path (str): Path to the CSV file where the product will be saved.
         """
-    
-        if len(products) == 0:
-            return  # Return if there are no products to save
-    
-        if not os.path.exists(file_path):
-            # Create the CSV file if it doesn't exist
-            with open(file_path, mode='w', newline='', encoding='utf-8') as file:
-                writer = csv.DictWriter(file, fieldnames=products[0].keys())
-                writer.writeheader()
-    
+
         try:
-            with open(file_path, mode='a', newline='', encoding='utf-8') as file:
-                writer = csv.DictWriter(file, fieldnames=products[0].keys())
-                for product in products:
-                    writer.writerow(product)  # Write each product to the CSV file
+            if file_path not in self._csv_files:
+                file_exists = os.path.exists(file_path)
+                file = open(file_path, mode='a', newline='', encoding='utf-8')
+                writer = csv.DictWriter(file, fieldnames=product.keys())
+                if not file_exists:
+                    writer.writeheader()
+                self._csv_files[file_path] = (file, writer)
+            _, writer = self._csv_files[file_path]
+            writer.writerow(product)
         except IOError as e:
             print(f"An I/O error occurred: {e.strerror}")  # Handle I/O errors
         except Exception as e:
             print(f"Error while saving in CSV: {e}")  # Handle other exceptions
 
+    def _flush_csv_files(self) -> None:
+        """
+        Write the buffered rows of the CSV files opened by `_write_product_in_csv` to disk.
+        """
+
+        for file, _ in self._csv_files.values():
+            file.flush()
+
+    def _close_csv_files(self) -> None:
+        """
+        Close the CSV files opened by `_write_product_in_csv`.
+        """
+
+        for file, _ in self._csv_files.values():
+            file.close()
+        self._csv_files = {}
+
     def _get_response_until_success(self, url: str, method: str = "get", data: dict[str, Any] = {}, cookies={}) -> tuple[bytes | str, int]:
         """
         Retrieve response content from the specified URL with retries until a successful response is obtained.
@@ -147,27 +186,71 @@ class Scraper:
 
 
         while True:
+            proxy_url = None
+            start_time = time.monotonic()
             try:
                 proxy = Scraper._get_proxy()  # Get a proxy configuration for the request
+                proxy_url = proxy["http"] if proxy else None
+                session = self.fetcher.pool.get_requests_session(proxy_url)  # Keep-alive session of this proxy
                 response = None
-                if proxy is not None:
-                    if method == "get": response = requests.get(url, headers=headers, proxies=proxy, timeout=20, cookies=cookies)
-                    else: response = requests.post(url, headers=headers, proxies=proxy, timeout=20, data=data, cookies=cookies)
-                else:
-                    if method == "get": response = requests.get(url, headers=headers, timeout=20, cookies=cookies)
-                    else: response = requests.post(url, headers=headers, timeout=20, data=data, cookies=cookies)
+                if method == "get": response = session.get(url, headers=headers, timeout=20, cookies=cookies)
+                else: response = session.post(url, headers=headers, timeout=20, data=data, cookies=cookies)
+                Scraper.proxy_scheduler.report(proxy_url, time.monotonic() - start_time, response.status_code < 500 and response.status_code != 429, banned=response.status_code == 403)
+                metrics.observe("http_request_seconds", time.monotonic() - start_time, status=str(response.status_code))
+                metrics.inc("http_response_bytes_total", len(response.content))
                 if response.status_code == 404 or response.status_code == 301:   
                     return ("", response.status_code)  # Return empty content and status code for specific response codes
                 elif response.status_code < 300:
                     return (response.content, response.status_code)  # Return response content and status code for successful requests
 
-                print(f'Waiting: {url}')  # Print a message indicating waiting
+                metrics.inc("http_retries_total", reason=str(response.status_code))
+                logger.info(f'Waiting: {url}')  # Print a message indicating waiting
                 time.sleep(10)  # Adjust sleep time as needed (in seconds)
 
             except Exception as e:
-                print(e)  # Log any exceptions that occur during the request
+                Scraper.proxy_scheduler.report(proxy_url, time.monotonic() - start_time, False)
+                metrics.inc("http_retries_total", reason=type(e).__name__)
+                logger.info(e)  # Log any exceptions that occur during the request
                 time.sleep(20)  # Wait before retrying in case of exceptions
 
+    async def _fetch_until_success(self, url: str, method: str = "get", data: dict[str, Any] = {}, cookies={}) -> tuple[bytes | str, int]:
+        """
+        Asynchronous counterpart of `_get_response_until_success` running on the shared fetch engine.
+
+        Parameters:
+        - url (str): The URL to fetch the response from.
+
+        Returns:
+        - tuple: A tuple containing the response content (byte string) and the HTTP status code.
+          The 304 status code means the content was served unchanged from the response cache.
+        """
+
+        if method == "get":
+            content = self.fetcher.get_fresh(url)
+            if content is not None:
+                return (content, 304)  # Served from the response cache, before taking a proxy
+        attempt = 0
+        while True:
+            attempt += 1
+            # Exponential backoff with jitter, the pace itself is set by the concurrency controller
+            backoff = random.uniform(0.5, 1.0) * min(2 ** attempt, 60)
+            try:
+                proxy = Scraper._get_proxy()  # Get a proxy configuration for the request
+                response, status_code = await self.fetcher.fetch(url, method=method, data=data or None, cookies=cookies, proxy=proxy["http"] if proxy else None)
+                if status_code == 404 or status_code == 301:
+                    return ("", status_code)  # Return empty content and status code for specific response codes
+                elif status_code < 300 or status_code == 304:
+                    return (response, status_code)  # Return response content and status code for successful requests
+
+                metrics.inc("http_retries_total", reason=str(status_code))
+                logger.info(f'Waiting: {url}')  # Print a message indicating waiting
+                await asyncio.sleep(backoff)  # Only this request waits, without holding a slot
+
+            except Exception as e:
+                metrics.inc("http_retries_total", reason=type(e).__name__)
+                logger.info(f"{url} : {e!r}")  # Log any exceptions that occur during the request
+                await asyncio.sleep(backoff)  # Wait before retrying in case of exceptions
+
     def _create_driver(self) -> tuple[WebDriver, WebDriverWait]:
         """
         Create a WebDriver instance for web scraping.
@@ -188,6 +271,8 @@ class Scraper:
         options.add_argument("--enable-features=SameSiteByDefaultCookies,CookiesWithoutSameSiteMustBeSecure")
     
         proxies = Scraper._get_proxy()  # Retrieve proxy configuration
+        if proxies is not None:
+            Scraper.proxy_scheduler.release(proxies["http"])  # The browser traffic isn't reported to the scheduler
 
         print("========== A proxy >>>>>>>>>>", proxies)
         driver = None
@@ -254,23 +339,3 @@ class Scraper:
     @staticmethod
     def _adjust_special_characters(values:list[str]):
         return [value.replace("'", "\'").replace('"', "\"") for value in values]
-    
-    @staticmethod
-    def _apply_multi_threading(inputs: list[Any], callback: Callable, max_threads: int = 30):
-        results = []
-        with ThreadPoolExecutor(max_workers=max_threads) as executor:
-            # Map each collection to the future object executing it
-            future_to_post = {executor.submit(callback, input): input for input in inputs}
-            
-            # Iterate over the futures as they complete (in the order they complete)
-            for future in as_completed(future_to_post):
-                try:
-                    input = future_to_post[future]
-                    # Get the result from the future
-                    result = future.result()
-                    results.append(result)
-                except Exception as exc:
-                    results.append(None)
-                    # Handle any exceptions that were raised during processing
-                    print(f'Input {input} generated an exception while multi threading: {exc}')
-        return results
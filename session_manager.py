@@ -0,0 +1,186 @@
+import json
+import os
+import threading
+import time
+from typing import Callable
+
+
+class SessionManager:
+    """
+    Pool of site sessions persisted to disk with a TTL.
+
+    A session is whatever the bootstrap callback returns (its cookies and the data read while
+    creating it). Requests are spread over the valid sessions of the pool. A session detected as
+    expired is dropped and replaced in a background thread, so the fetch workers never wait for
+    a browser or an address selection unless the whole pool is gone. A bootstrap failing
+    `bootstrap_attempts` times in a row wakes the waiting callers up with no session.
+    """
+
+    def __init__(self, file_path: str, bootstrap: Callable[[], dict | None], pool_size: int = 2, ttl: float = 6 * 3600, bootstrap_attempts: int = 3, retry_delay: float = 5):
+        """
+        Initialize the session manager and load the sessions saved by the previous runs.
+
+        Parameters:
+        - file_path (str): Path to the JSON file the sessions are saved in.
+        - bootstrap (Callable): Function creating a new session, a dict with at least a "cookies" key, or None on failure.
+        - pool_size (int): Number of valid sessions kept in the pool.
+        - ttl (float): Lifetime of a session (in seconds), sessions are renewed in the background before it ends.
+        - bootstrap_attempts (int): Bootstrap calls before a refresh gives up.
+        - retry_delay (float): Wait (in seconds) between two failed bootstrap calls.
+        """
+
+        self.file_path = file_path
+        self.bootstrap = bootstrap
+        self.pool_size = pool_size
+        self.ttl = ttl
+        self.sessions = []
+        self.refreshes = 0
+        self.bootstrap_attempts = bootstrap_attempts
+        self.retry_delay = retry_delay
+        self.failed = False  # The last refresh couldn't create any session
+        self._index = 0
+        self._lock = threading.Lock()
+        self._refreshing = False
+        self._available = threading.Event()
+        self._load()
+
+    def _load(self) -> None:
+        if not self.file_path or not os.path.exists(self.file_path):
+            return
+        try:
+            with open(self.file_path, 'r', encoding='utf-8') as file:
+                sessions = json.load(file)
+        except (IOError, ValueError) as e:
+            print(f"Can't load the saved sessions : {e}")
+            return
+        now = time.time()
+        self.sessions = [session for session in sessions if session["created_at"] + self.ttl > now]
+        if self.sessions:
+            self._available.set()
+            print(f"---> {len(self.sessions)} saved sessions loaded")
+
+    def _save(self) -> None:
+        if not self.file_path:
+            return
+        folder_path = os.path.dirname(self.file_path)
+        if folder_path and not os.path.exists(folder_path):
+            os.makedirs(folder_path, exist_ok=True)
+        temporary_path = f"{self.file_path}.tmp"
+        with open(temporary_path, 'w', encoding='utf-8') as file:
+            json.dump(self.sessions, file)
+        os.replace(temporary_path, self.file_path)  # Never leave a half written file behind
+
+    def _create_session(self) -> bool:
+        session = self.bootstrap()
+        if not session or not session.get("cookies"):
+            return False
+        session["created_at"] = time.time()
+        with self._lock:
+            self.sessions.append(session)
+            self.refreshes += 1
+            self.failed = False
+            self._save()
+            self._available.set()
+        return True
+
+    def _is_young(self, session: dict, now: float) -> bool:
+        return session["created_at"] + self.ttl * 0.8 > now
+
+    def _create_session_with_retries(self) -> bool:
+        for attempt in range(self.bootstrap_attempts):
+            if attempt:
+                time.sleep(self.retry_delay)
+            try:
+                if self._create_session():
+                    return True
+            except Exception as e:
+                print(f"Error while creating a session : {e!r}")
+        return False
+
+    def _refresh(self) -> None:
+        try:
+            while True:
+                with self._lock:
+                    now = time.time()
+                    missing = self.pool_size - len([session for session in self.sessions if self._is_young(session, now)])
+                if missing <= 0:
+                    break
+                if not self._create_session_with_retries():
+                    with self._lock:
+                        if not self.sessions:
+                            print(f"---> no session could be created in {self.bootstrap_attempts} attempts")
+                            self.failed = True
+                            self._available.set()  # Wake the waiting callers up, they get no session
+                    break
+                with self._lock:
+                    # Drop the ageing sessions now replaced by young ones
+                    while len(self.sessions) > self.pool_size and not self._is_young(self.sessions[0], time.time()):
+                        self.sessions.pop(0)
+                    self._save()
+        finally:
+            with self._lock:
+                self._refreshing = False
+
+    def refresh_in_background(self) -> None:
+        """
+        Fill the pool up again in a background thread, unless a refresh is already running.
+        """
+
+        with self._lock:
+            if self._refreshing:
+                return
+            self._refreshing = True
+        threading.Thread(target=self._refresh, name="session-refresh", daemon=True).start()
+
+    def get_session(self, timeout: float = None) -> dict | None:
+        """
+        Get the next session of the pool, creating the first one if the pool is empty.
+
+        Blocks only when there is no valid session at all, until one is created or the bootstrap failed.
+
+        Parameters:
+        - timeout (float): Maximum time to wait for a session (in seconds), None waits forever.
+
+        Returns:
+        - dict: The session, or None if none could be created in time.
+        """
+
+        now = time.time()
+        with self._lock:
+            sessions = [session for session in self.sessions if session["created_at"] + self.ttl > now]
+            if len(sessions) != len(self.sessions):
+                self.sessions = sessions
+                self._save()
+            if not self.sessions and not self._refreshing:
+                self._available.clear()  # Set again by the refresh started below, with a session or on failure
+            # Renew the sessions before the end of their TTL so requests never hit an expired one
+            needs_refresh = len([session for session in self.sessions if self._is_young(session, now)]) < self.pool_size
+        if needs_refresh:
+            self.refresh_in_background()
+
+        if not self._available.wait(timeout):
+            return None
+        with self._lock:
+            if not self.sessions:
+                return None
+            self._index = (self._index + 1) % len(self.sessions)
+            return self.sessions[self._index]
+
+    def invalidate(self, cookies: dict[str, str]) -> None:
+        """
+        Drop a session the site reported as expired and replace it in the background.
+
+        Parameters:
+        - cookies (dict): The cookies of the expired session.
+        """
+
+        with self._lock:
+            sessions = [session for session in self.sessions if session["cookies"] != cookies]
+            if len(sessions) == len(self.sessions):
+                return  # Already dropped by another worker
+            self.sessions = sessions
+            self._save()
+            if not self.sessions:
+                self._available.clear()
+        print(f"---> session expired, {len(self.sessions)} valid sessions left")
+        self.refresh_in_background()
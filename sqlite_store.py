@@ -0,0 +1,62 @@
+import os
+import sqlite3
+import threading
+from typing import Any
+
+
+class SqliteStore:
+    """
+    Base class of the local SQLite backed stores (cache, indexes, queues).
+
+    The connection runs in WAL mode by default so readers never block the writer, and is shared
+    between the event loop and worker threads behind a lock.
+    """
+
+    # SQL statements creating the tables of the store
+    schema = ""
+    # WAL needs memory shared between the processes, so it only works for processes of the same host
+    journal_mode = "WAL"
+
+    def __init__(self, file_path: str):
+        """
+        Open (and create if needed) the SQLite database.
+
+        Parameters:
+        - file_path (str): Path to the database file.
+        """
+
+        folder_path = os.path.dirname(file_path)
+        if folder_path and not os.path.exists(folder_path):
+            os.makedirs(folder_path, exist_ok=True)
+            print(f"Folder '{folder_path}' created successfully.")
+
+        self.file_path = file_path
+        self._lock = threading.RLock()
+        self._connection = sqlite3.connect(file_path, check_same_thread=False, timeout=30)
+        self._connection.execute(f"PRAGMA journal_mode={self.journal_mode}")
+        if self.journal_mode == "WAL":
+            self._connection.execute("PRAGMA synchronous=NORMAL")  # Durable with WAL, without an fsync per commit
+        self._connection.executescript(self.schema)
+
+    def _execute(self, query: str, parameters: tuple | dict = ()) -> int:
+        with self._lock:
+            cursor = self._connection.execute(query, parameters)
+            self._connection.commit()
+            return cursor.rowcount
+
+    def _executemany(self, query: str, rows: list[tuple]) -> None:
+        with self._lock:
+            self._connection.executemany(query, rows)
+            self._connection.commit()
+
+    def _query(self, query: str, parameters: tuple | dict = ()) -> list[tuple[Any, ...]]:
+        with self._lock:
+            return self._connection.execute(query, parameters).fetchall()
+
+    def _query_one(self, query: str, parameters: tuple | dict = ()) -> tuple[Any, ...] | None:
+        with self._lock:
+            return self._connection.execute(query, parameters).fetchone()
+
+    def close(self) -> None:
+        with self._lock:
+            self._connection.close()
@@ -0,0 +1,129 @@
+import asyncio
+import threading
+
+import pytest
+from aiohttp import web
+
+
+class LocalSite:
+    """
+    Local HTTP server with the routes the fetch tests need, run in its own thread and event loop.
+    """
+
+    def __init__(self):
+        self.requests = {}  # Number of requests by path
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self.url = None
+        self._loop = asyncio.new_event_loop()
+        self._started = threading.Event()
+        self._thread = threading.Thread(target=self._serve, daemon=True)
+
+    def _count(self, request: web.Request) -> None:
+        self.requests[request.path] = self.requests.get(request.path, 0) + 1
+
+    async def _page(self, request: web.Request) -> web.Response:
+        self._count(request)
+        return web.Response(text=f"page {request.query.get('id', '')}")
+
+    async def _form(self, request: web.Request) -> web.Response:
+        self._count(request)
+        data = await request.post()
+        return web.Response(text=f"{data.get('name')} {request.cookies.get('session')}")
+
+    async def _slow(self, request: web.Request) -> web.Response:
+        self._count(request)
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        await asyncio.sleep(0.05)
+        self.in_flight -= 1
+        return web.Response(text="slow")
+
+    async def _status(self, request: web.Request) -> web.Response:
+        self._count(request)
+        return web.Response(status=int(request.match_info["code"]), text="status")
+
+    async def _validated(self, request: web.Request) -> web.Response:
+        self._count(request)
+        if request.headers.get("If-None-Match") == '"v1"':
+            return web.Response(status=304, headers={"ETag": '"v1"'})
+        return web.Response(text="validated body", headers={"ETag": '"v1"', "Cache-Control": "no-cache"})
+
+    async def _fresh(self, request: web.Request) -> web.Response:
+        self._count(request)
+        return web.Response(text="fresh body", headers={"Cache-Control": "max-age=3600"})
+
+    async def _compressed(self, request: web.Request) -> web.Response:
+        self._count(request)
+        response = web.Response(text="compressed " * 500)
+        response.enable_compression()
+        return response
+
+    def _serve(self) -> None:
+        asyncio.set_event_loop(self._loop)
+        app = web.Application()
+        app.router.add_get("/page", self._page)
+        app.router.add_post("/form", self._form)
+        app.router.add_get("/slow", self._slow)
+        app.router.add_get("/status/{code}", self._status)
+        app.router.add_get("/validated", self._validated)
+        app.router.add_get("/fresh", self._fresh)
+        app.router.add_get("/compressed", self._compressed)
+        runner = web.AppRunner(app)
+        self._loop.run_until_complete(runner.setup())
+        site = web.TCPSite(runner, "127.0.0.1", 0)
+        self._loop.run_until_complete(site.start())
+        port = site._server.sockets[0].getsockname()[1]
+        self.url = f"http://127.0.0.1:{port}"
+        self._started.set()
+        self._loop.run_forever()
+        self._loop.run_until_complete(runner.cleanup())
+
+    def start(self) -> "LocalSite":
+        self._thread.start()
+        self._started.wait(10)
+        return self
+
+    def stop(self) -> None:
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join(10)
+
+
+@pytest.fixture
+def site():
+    local_site = LocalSite().start()
+    yield local_site
+    local_site.stop()
+
+
+@pytest.fixture
+def stand_in():
+    from benchmarks.stand_in_server import StandInServer
+
+    with StandInServer() as server:
+        yield server
+
+
+@pytest.fixture
+def make_scraper(monkeypatch, tmp_path):
+    """
+    Create BringoScrapers working in a temporary folder, with settings given as class attributes.
+    """
+
+    work_folder = tmp_path / "work"
+    (work_folder / "results" / "bringo_products").mkdir(parents=True)
+    monkeypatch.chdir(work_folder)  # The cache and results folders, and "../results"
+    import bringo
+
+    scrapers = []
+
+    def make(**settings):
+        for name, value in settings.items():
+            monkeypatch.setattr(bringo.BringoScraper, name, value)
+        scraper = bringo.BringoScraper()
+        scrapers.append(scraper)
+        return scraper
+
+    yield make
+    for scraper in scrapers:
+        scraper.parse_pool.close()
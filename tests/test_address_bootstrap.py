@@ -0,0 +1,53 @@
+import json
+import urllib.request
+
+import extractors
+from benchmarks import corpus
+
+
+ADDRESS = {"address": "Boulevard Mohamed V, Casablanca", "street_number": None, "latitude": "33.59", "longitude": "-7.61"}
+
+
+def start_browser(address):
+    raise AssertionError("The selenium fallback was started")
+
+
+def get_served(server):
+    with urllib.request.urlopen(f"{server.url}/_stats") as response:
+        return json.loads(response.read())
+
+
+def test_address_form_is_read_with_its_hidden_fields():
+    form = extractors.extract_address_form(corpus.render_home())
+    assert form == {
+        "action": "/fr/address",
+        "method": "post",
+        "fields": {"_token": "b3f1c0de9a7e4d21", "lat": "", "lng": "", "street_number": "", "address": ""},
+        "address_field": "address",
+        "street_number_field": "street_number"
+    }
+    assert extractors.extract_address_form(corpus.render_product(1)) is None
+    assert extractors.is_address_page(corpus.render_home().encode())
+
+
+def test_markets_are_read_with_their_programs():
+    markets = extractors.extract_markets(corpus.render_stores_list("Casablanca", [0, 3]))
+    assert [market["market_url"] for market in markets] == ["/fr/market/0", "/fr/market/3"]
+    assert [market["market_close_program"] for market in markets] == ["", "Fermé"]
+    assert markets[0]["market_open_programs"][0] == {"week_day": "Lundi - Vendredi", "time": "09:00 - 22:00"}
+
+
+def test_address_is_selected_over_http_with_a_single_home_page_fetch(stand_in, make_scraper, monkeypatch):
+    scraper = make_scraper(main_url=stand_in.url, frontier_path="", product_index_path="")
+    monkeypatch.setattr(scraper, "_BringoScraper__get_markets_with_selenium", start_browser)
+    markets, cookies = scraper._BringoScraper__get_markets(ADDRESS)
+    assert [market["market_title"] for market in markets] == ["Market 0", "Market 1"]
+    assert cookies["PHPSESSID"].startswith("benchmark")
+    assert get_served(stand_in) == {"home 200": 1, "address 200": 1}
+
+
+def test_site_down_stops_without_starting_a_browser(site, make_scraper, monkeypatch):
+    scraper = make_scraper(main_url=f"{site.url}/status/500", frontier_path="", product_index_path="")
+    monkeypatch.setattr(scraper, "_BringoScraper__get_markets_with_selenium", start_browser)
+    assert scraper._BringoScraper__get_markets(ADDRESS) == ([], None)
+    assert site.requests["/status/500"] == 1
@@ -0,0 +1,77 @@
+import json
+
+from change_capture import ChangeCapture
+
+
+def make_product(number, price="10", store="Fruits"):
+    return {
+        "product_id": str(number), "market": "Market A", "store": store, "url": f"https://site/fr/product/{number}", "date": "2026-10-17T10:00:00Z",
+        "name": f"Product {number}", "price": price, "currency": "MAD", "brand": "Brand", "description": "", "number": "1",
+        "image": "p.png", "images": "p.png", "addresses": "home"
+    }
+
+
+def read_events(capture):
+    with open(capture.changes_path, encoding="utf-8") as file:
+        return [json.loads(line) for line in file]
+
+
+def run(capture, run_name, products, listed=(), incomplete=()):
+    capture.start_run(run_name)
+    for market, store, url in listed:
+        capture.mark_listed(market, store, url)
+    for market, store in incomplete:
+        capture.mark_incomplete(market, store)
+    for product in products:
+        capture.capture(product)
+    capture.finish_run()
+    return read_events(capture)
+
+
+def test_inserts_updates_and_deletes_between_runs(tmp_path):
+    capture = ChangeCapture(str(tmp_path / "changes.sqlite3"), str(tmp_path / "results"))
+    events = run(capture, "first", [make_product(1), make_product(2)])
+    assert [(event["op"], event["product_id"]) for event in events] == [("insert", "1"), ("insert", "2")]
+
+    # Served behind another host, the product keeps its key
+    moved = {**make_product(1, price="12"), "url": "https://other/fr/product/1"}
+    events = run(capture, "second", [moved, make_product(3)])
+    assert [(event["op"], event["product_id"]) for event in events] == [("update", "1"), ("insert", "3"), ("delete", "2")]
+    assert events[0]["changes"] == {"price": ["10", "12"]}
+    assert events[2]["product"]["name"] == "Product 2"
+
+    events = run(capture, "third", [moved, make_product(3)])
+    assert events == []
+    assert capture.counts["unchanged"] == 2
+    capture.close()
+
+
+def test_stores_with_an_unreadable_page_or_not_listed_keep_their_products(tmp_path):
+    capture = ChangeCapture(str(tmp_path / "changes.sqlite3"), str(tmp_path / "results"))
+    run(capture, "first", [make_product(1), make_product(2), make_product(3, store="Drinks")])
+    events = run(capture, "second", [make_product(1)], incomplete=[("Market A", "Fruits")])
+    assert events == []  # Product 2 may be on the page that failed, Drinks wasn't listed at all
+
+    # Listed without being scraped again (its details were reused), the product is kept
+    events = run(capture, "third", [], listed=[("Market A", "Fruits", "https://site/fr/product/2")])
+    assert [(event["op"], event["product_id"]) for event in events] == [("delete", "1")]
+    capture.close()
+
+
+def test_uncommitted_events_are_replayed_by_a_resumed_run(tmp_path):
+    file_path = str(tmp_path / "changes.sqlite3")
+    capture = ChangeCapture(file_path, str(tmp_path / "results"))
+    capture.start_run("run")
+    capture.capture(make_product(1))
+    capture.flush()
+    capture.capture(make_product(2))
+    capture.close_file()
+    capture.close()  # Crash before the product 2 is committed
+
+    capture = ChangeCapture(file_path, str(tmp_path / "results"))
+    capture.start_run("run")
+    assert capture.capture(make_product(1)) is None
+    assert capture.capture(make_product(2))["op"] == "insert"
+    capture.finish_run()
+    assert [(event["op"], event["product_id"]) for event in read_events(capture)] == [("insert", "1"), ("insert", "2"), ("insert", "2")]
+    capture.close()
@@ -0,0 +1,127 @@
+import asyncio
+import time
+
+from concurrency import AimdLimiter, ConcurrencyController
+
+
+def test_limit_grows_while_responses_are_fast_and_halves_on_pushback():
+    async def main():
+        limiter = AimdLimiter(4, maximum=10)
+        for _ in range(8):
+            await limiter.acquire()
+            await limiter.release(0.1, success=True, pushback=False)
+        assert 5 < limiter.limit < 7  # About +1 per window of 4 requests
+        grown = limiter.limit
+        await limiter.acquire()
+        await limiter.release(0.1, success=False, pushback=True)
+        assert limiter.limit == grown / 2
+        await limiter.acquire()
+        await limiter.release(0.1, success=False, pushback=True)  # Same window, a single cut
+        assert limiter.limit == grown / 2
+        assert limiter.in_flight == 0
+
+    asyncio.run(main())
+
+
+def test_slow_responses_stop_the_increase():
+    async def main():
+        limiter = AimdLimiter(4)
+        await limiter.acquire()
+        await limiter.release(0.1, success=True, pushback=False)
+        limit = limiter.limit
+        for _ in range(5):
+            await limiter.acquire()
+            await limiter.release(5.0, success=True, pushback=False)
+        assert limiter.limit < limit + 0.5
+
+    asyncio.run(main())
+
+
+def test_requests_wait_for_a_slot_under_the_limit():
+    async def main():
+        limiter = AimdLimiter(2)
+        await limiter.acquire()
+        await limiter.acquire()
+        waiter = asyncio.ensure_future(limiter.acquire())
+        await asyncio.sleep(0.01)
+        assert not waiter.done()
+        assert not limiter.try_acquire()
+        await limiter.release(0.1, success=True, pushback=False)
+        await asyncio.wait_for(waiter, 1)
+        assert limiter.in_flight == 2
+
+    asyncio.run(main())
+
+
+def test_retry_after_blocks_new_requests():
+    async def main():
+        limiter = AimdLimiter(5)
+        await limiter.acquire()
+        await limiter.release(0.01, success=False, pushback=True, retry_after=0.2)
+        start = time.monotonic()
+        await limiter.acquire()
+        return time.monotonic() - start
+
+    assert asyncio.run(main()) >= 0.15
+
+
+def test_full_proxy_doesnt_hold_a_slot_of_the_host():
+    async def main():
+        controller = ConcurrencyController(host_initial=2, proxy_initial=1)
+        await controller.acquire("site", "http://a")
+        blocked = asyncio.ensure_future(controller.acquire("site", "http://a"))
+        await asyncio.sleep(0.01)
+        assert not blocked.done()
+        assert controller.hosts["site"].in_flight == 1  # Only the slot of the first request
+        await asyncio.wait_for(controller.acquire("site", "http://b"), 1)  # Another proxy still gets the host
+
+        await controller.release("site", "http://b", 0.1, 200)
+        await controller.release("site", "http://a", 0.1, 200)
+        await asyncio.wait_for(blocked, 1)
+        assert controller.get_stats()["hosts"]["site"]["in_flight"] == 1
+        assert controller.get_stats()["proxies"]["http://a"]["in_flight"] == 1
+
+    asyncio.run(main())
+
+
+def test_cancelled_request_holds_no_slot():
+    async def main():
+        controller = ConcurrencyController(host_initial=2, proxy_initial=1)
+        await controller.acquire("site", "http://a")
+        waiter = asyncio.ensure_future(controller.acquire("site", "http://a"))
+        await asyncio.sleep(0.01)
+        waiter.cancel()
+        await asyncio.gather(waiter, return_exceptions=True)
+        assert controller.hosts["site"].in_flight == 1
+        assert controller.proxies["http://a"].in_flight == 1
+
+    asyncio.run(main())
+
+
+def test_retry_after_header_is_read_in_seconds_or_as_a_date():
+    assert ConcurrencyController.parse_retry_after("30") == 30
+    assert ConcurrencyController.parse_retry_after("Wed, 21 Oct 2015 07:28:00 GMT") == 0
+    assert ConcurrencyController.parse_retry_after("soon") is None
+    assert ConcurrencyController.parse_retry_after(None) is None
+
+
+def test_fetch_cancelled_while_waiting_for_a_slot_releases_nothing_it_didnt_take(site):
+    from fetcher import AsyncFetcher
+
+    async def main():
+        fetcher = AsyncFetcher(site.url, controller=ConcurrencyController(host_initial=1))
+        try:
+            first = asyncio.ensure_future(fetcher.fetch("/slow"))
+            await asyncio.sleep(0.01)
+            waiting = asyncio.ensure_future(fetcher.fetch("/slow"))
+            await asyncio.sleep(0.01)
+            waiting.cancel()
+            await asyncio.gather(waiting, return_exceptions=True)
+            assert await first == (b"slow", 200)
+            host = fetcher.controller.get_stats()["hosts"]
+            return list(host.values())[0]["in_flight"]
+        finally:
+            await fetcher.close()
+
+    assert asyncio.run(main()) == 0
+    assert site.requests["/slow"] == 1
@@ -0,0 +1,40 @@
+import asyncio
+
+from fetcher import AsyncFetcher
+
+
+def test_connections_are_kept_alive_and_compression_negotiated(site):
+    fetcher = AsyncFetcher(site.url)
+
+    async def fetch_twice():
+        try:
+            first = await fetcher.fetch("/compressed")
+            second = await fetcher.fetch("/compressed")
+            return first, second
+        finally:
+            await fetcher.close()
+
+    first, second = asyncio.run(fetch_twice())
+    assert first == second == (b"compressed " * 500, 200)
+    stats = fetcher.pool.get_stats()["direct"]
+    assert stats["connections_opened"] == 1
+    assert stats["connections_reused"] == 1
+    assert stats["requests"] == 2
+    assert sum(stats["encodings"].values()) == 2
+    assert "identity" not in stats["encodings"]  # Served compressed
+
+
+def test_every_proxy_gets_its_own_session():
+    fetcher = AsyncFetcher("http://localhost")
+
+    async def get_sessions():
+        try:
+            return fetcher.pool.get_session(None), fetcher.pool.get_session(None), fetcher.pool.get_session("http://proxy:8080")
+        finally:
+            await fetcher.close()
+
+    direct, direct_again, proxied = asyncio.run(get_sessions())
+    assert direct is direct_again
+    assert proxied is not direct
+    assert "br" in direct.headers["Accept-Encoding"]
+    assert fetcher.pool.get_requests_session("http://proxy:8080").proxies == {"http": "http://proxy:8080", "https": "http://proxy:8080"}
@@ -0,0 +1,63 @@
+import sqlite3
+
+from db_writer import ProductDbWriter
+
+
+def make_product(product_id, **fields):
+    product = {column: f"{column} {product_id}" for column in ProductDbWriter.columns}
+    product["product_id"] = product_id
+    product.update(fields)
+    return product
+
+
+def read_rows(file_path, query):
+    connection = sqlite3.connect(file_path)
+    try:
+        return connection.execute(query).fetchall()
+    finally:
+        connection.close()
+
+
+def test_upsert_keeps_one_row_per_product(tmp_path):
+    file_path = str(tmp_path / "products.sqlite3")
+    writer = ProductDbWriter.for_sqlite(file_path, "products", batch_size=10, flush_interval=0.1)
+    writer.put(make_product("a", price="10"))
+    writer.put(make_product("b", price="20"))
+    writer.put(make_product("a", price="12"))
+    writer.close()
+
+    assert writer.written == 3
+    assert writer.failed == 0
+    assert read_rows(file_path, "SELECT product_id, price FROM products ORDER BY product_id") == [("a", "12"), ("b", "20")]
+
+
+def test_products_are_written_in_batches(tmp_path, monkeypatch):
+    file_path = str(tmp_path / "products.sqlite3")
+    writer = ProductDbWriter.for_sqlite(file_path, "products", batch_size=4, flush_interval=60)
+    batches = []
+    write = writer._write
+    monkeypatch.setattr(writer, "_write", lambda query, batch: (batches.append(len(batch)), write(query, batch)))
+    for index in range(10):
+        writer.put(make_product(str(index)))
+    writer.close()
+
+    assert batches == [4, 4, 2]
+    assert read_rows(file_path, "SELECT COUNT(*) FROM products") == [(10,)]
+
+
+def test_missing_columns_are_added_to_an_existing_table(tmp_path):
+    file_path = str(tmp_path / "products.sqlite3")
+    connection = sqlite3.connect(file_path)
+    old_columns = [column for column in ProductDbWriter.columns if column != "addresses"]
+    connection.execute(f"CREATE TABLE products ({', '.join(f'{column} TEXT' for column in old_columns)}, PRIMARY KEY (product_id))")
+    connection.execute("INSERT INTO products (product_id, name) VALUES ('a', 'old')")
+    connection.commit()
+    connection.close()
+
+    writer = ProductDbWriter.for_sqlite(file_path, "products", flush_interval=0.1)
+    writer.put(make_product("b", addresses="Casablanca"))
+    writer.close()
+
+    assert writer.failed == 0
+    assert [row[1] for row in read_rows(file_path, "PRAGMA table_info(products)")] == ProductDbWriter.columns
+    assert read_rows(file_path, "SELECT product_id, name, addresses FROM products ORDER BY product_id") == [("a", "old", None), ("b", "name b", "Casablanca")]
@@ -0,0 +1,41 @@
+import asyncio
+
+from fetcher import AsyncFetcher
+
+
+def run_with_fetcher(fetcher, coroutine_function):
+    async def main():
+        try:
+            return await coroutine_function()
+        finally:
+            await fetcher.close()
+
+    return asyncio.run(main())
+
+
+def test_relative_urls_are_fetched_from_the_main_site(site):
+    fetcher = AsyncFetcher(site.url)
+    content, status_code = run_with_fetcher(fetcher, lambda: fetcher.fetch("/page?id=7"))
+    assert (content, status_code) == (b"page 7", 200)
+
+
+def test_post_sends_the_form_and_the_cookies(site):
+    fetcher = AsyncFetcher(site.url)
+    content, status_code = run_with_fetcher(fetcher, lambda: fetcher.fetch(f"{site.url}/form", "post", data={"name": "casa"}, cookies={"session": "abc"}))
+    assert (content, status_code) == (b"casa abc", 200)
+
+
+def test_error_status_is_returned_to_the_caller(site):
+    fetcher = AsyncFetcher(site.url)
+    assert run_with_fetcher(fetcher, lambda: fetcher.fetch("/status/404")) == (b"status", 404)
+
+
+def test_requests_in_flight_never_exceed_the_global_cap(site):
+    fetcher = AsyncFetcher(site.url, max_concurrency=4)
+
+    async def fetch_all():
+        return await asyncio.gather(*(fetcher.fetch("/slow") for _ in range(20)))
+
+    results = run_with_fetcher(fetcher, fetch_all)
+    assert results == [(b"slow", 200)] * 20
+    assert 1 < site.max_in_flight <= 4
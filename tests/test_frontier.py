@@ -0,0 +1,110 @@
+import asyncio
+import json
+import sqlite3
+
+from frontier import Frontier
+from pipeline import Pipeline
+from type_classes import StoreTable, ProductLink, Product
+
+
+MARKET = {"market_url": "/market/a", "market_title": "A", "market_image": "a.png", "market_open_programs": [{"day": "Mon"}], "market_close_program": "", "addresses": ["home"]}
+STORE = {"market_name": "A", "market_image": "a.png", "market_open_programs": [{"day": "Mon"}], "market_close_program": "", "addresses": ["home"], "store_url": "/store/1", "store_image": "1.png", "store_name": "Fruits"}
+DETAILS = {"name": "Apple", "price": "1.50", "currency": "MAD", "brand": "Farm", "description": "Red", "number": "12", "image": "apple.png", "images": "apple.png"}
+
+
+def test_resume_from_pending_items(tmp_path):
+    file_path = str(tmp_path / "frontier.sqlite3")
+    frontier = Frontier(file_path)
+    assert frontier.start_run("first.csv") == "first.csv"
+    other_market = {**MARKET, "market_url": "/market/b"}
+    assert frontier.add("stores", [MARKET, other_market]) == [MARKET, other_market]
+    pages = [STORE, {**STORE, "store_url": "/store/1?page=2"}]
+    frontier.complete("stores", MARKET, "pages", pages)
+    frontier.complete("pages", STORE, None, [])
+    frontier.flush()
+    frontier.close()  # Crash
+
+    frontier = Frontier(file_path)
+    assert frontier.start_run("second.csv") == "first.csv"
+    assert frontier.resumed
+    assert frontier.get_pending(StoreTable()) == {"stores": [other_market], "pages": [pages[1]]}
+    third_page = {**STORE, "store_url": "/store/1?page=3"}
+    assert frontier.add("pages", [pages[1], third_page]) == [third_page]  # Already produced before the crash
+    assert not frontier.finish_run()
+
+    frontier.complete("stores", other_market, None, [])
+    frontier.complete("pages", pages[1], None, [])
+    frontier.complete("pages", third_page, None, [])
+    assert frontier.finish_run()
+    assert frontier.start_run("third.csv") == "third.csv"
+    assert not frontier.resumed
+    frontier.close()
+
+
+def test_uncommitted_completion_is_replayed(tmp_path):
+    file_path = str(tmp_path / "frontier.sqlite3")
+    frontier = Frontier(file_path)
+    frontier.start_run("run.csv")
+    frontier.add("stores", [MARKET])
+    frontier.flush()
+    frontier.complete("stores", MARKET, None, [])
+    frontier.close()  # The completion was never committed
+
+    frontier = Frontier(file_path)
+    frontier.start_run("run.csv")
+    assert frontier.get_pending(StoreTable()) == {"stores": [MARKET]}
+    frontier.close()
+
+
+def test_records_are_checkpointed_without_their_store(tmp_path):
+    file_path = str(tmp_path / "frontier.sqlite3")
+    frontier = Frontier(file_path)
+    frontier.start_run("run.csv")
+    store = StoreTable().intern(STORE)
+    links = [ProductLink(store, f"/product/{number}", f"fp{number}", "Apple", "1.50", "MAD", "unit-1") for number in range(3)]
+    product = Product("42", store, DETAILS, "https://site/product/42", "2026-10-17")
+    frontier.complete("pages", STORE, "products", links)
+    frontier.complete("products", links[0], "csv", [product])
+    frontier.flush()
+    frontier.close()  # Crash
+
+    connection = sqlite3.connect(file_path)
+    assert connection.execute("SELECT COUNT(*) FROM stores").fetchone()[0] == 1  # Recorded once for every item of the store
+    for (payload,) in connection.execute("SELECT payload FROM work_items"):
+        assert "market_open_programs" not in json.loads(payload)
+    connection.close()
+
+    frontier = Frontier(file_path)
+    frontier.start_run("run.csv")
+    stores = StoreTable()
+    pending = frontier.get_pending(stores)
+    assert [link.product_url for link in pending["products"]] == ["/product/1", "/product/2"]
+    assert pending["products"][0].fingerprint == "fp1" and pending["products"][0].unit_id == "unit-1"
+    assert pending["products"][0].tile_currency == "MAD"
+    resumed_product = pending["csv"][0]
+    assert resumed_product.to_dict() == product.to_dict()
+    assert resumed_product.store is pending["products"][0].store is stores.intern(STORE)  # Shared by the items of the store
+    assert frontier.add("products", links) == []  # Known by their store and URL
+    frontier.close()
+
+
+def test_stages_keep_running_while_the_checkpoints_are_committed(tmp_path):
+    processed = []
+    during_flushes = []
+
+    async def save(item):
+        processed.append(item)
+
+    async def flush_outputs():
+        before = len(processed)
+        await asyncio.sleep(0.02)  # Waiting for the writer thread of a file sink
+        during_flushes.append(len(processed) - before)
+
+    frontier = Frontier(str(tmp_path / "frontier.sqlite3"), flush_size=10, on_flush_async=flush_outputs)
+    frontier.start_run("run.csv")
+    pipeline = Pipeline(frontier).add_stage("markets", save, workers=4)
+    asyncio.run(pipeline.run([{"market_url": f"/market/{number}"} for number in range(100)]))
+    assert len(processed) == 100
+    assert any(during_flushes)  # Items were processed while a commit was waited for
+    assert frontier.finish_run()  # Every item was committed done
+    frontier.close()
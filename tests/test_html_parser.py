@@ -0,0 +1,60 @@
+import pytest
+from bs4 import BeautifulSoup
+
+import extractors
+import html_parser
+from benchmarks import corpus
+
+
+BACKENDS = ["html.parser"] + (["lxml"] if html_parser.lxml_html is not None else []) + (["selectolax"] if html_parser.LexborHTMLParser is not None else [])
+
+LISTINGS = [
+    corpus.render_listing("Épicerie salée", list(range(24)), 1, 1),
+    corpus.render_listing("Épicerie salée", list(range(24)), 3, 30, 5),
+    corpus.render_listing("Épicerie salée", list(range(24)), 8, 8),
+    corpus.render_listing("Épicerie salée", [], 9, 8)
+]
+CASES = (
+    [(extractors.extract_product, corpus.render_product(product_id)) for product_id in range(10)]
+    + [(extractor, listing) for listing in LISTINGS for extractor in (extractors.extract_listing, extractors.extract_product_tiles)]
+    + [(extractors.extract_stores, corpus.render_market(market_id, 12)) for market_id in range(3)]
+    + [(extractors.extract_markets, corpus.render_stores_list("Casablanca", list(range(6))))]
+    + [(extractors.is_address_page, page) for page in (corpus.render_home(), corpus.render_product(1))]
+)
+
+
+def extract_with_full_soup(monkeypatch, extractor, page):
+    # The reference: the whole document parsed by BeautifulSoup with html.parser, as before the backends existed
+    with monkeypatch.context() as patch:
+        patch.setattr(extractors, "parse_html", lambda markup, backend=None, only=None: BeautifulSoup(markup, "html.parser"))
+        return extractor(page.encode())
+
+
+@pytest.mark.parametrize("backend", BACKENDS)
+@pytest.mark.parametrize("extractor, page", CASES, ids=[f"{extractor.__name__}-{index}" for index, (extractor, _) in enumerate(CASES)])
+def test_backends_extract_the_same_values_as_a_full_parse(monkeypatch, backend, extractor, page):
+    expected = extract_with_full_soup(monkeypatch, extractor, page)
+    monkeypatch.setattr(html_parser, "DEFAULT_BACKEND", backend)
+    assert extractor(page.encode()) == expected
+
+
+def test_default_backend_matches_a_full_parse_of_malformed_markup(monkeypatch):
+    page = corpus.render_product(3).replace('<div id="details" class="product-details">', '<div id="details" class="product-details"><p>Desc<br>line2<div>inner</div></p>', 1)
+    assert '<p>Desc<br>line2<div>inner</div></p>' in page
+    monkeypatch.setattr(html_parser, "DEFAULT_BACKEND", "html.parser")
+    details = extractors.extract_product(page.encode())
+    assert details == extract_with_full_soup(monkeypatch, extractors.extract_product, page)
+    assert "inner" in details["description"]
+
+
+def test_partial_parse_only_materialises_the_requested_regions():
+    soup = html_parser.parse_html(corpus.render_product(3).encode(), backend="html.parser", only=extractors.PRODUCT_REGIONS)
+    assert soup.select_one("h1.product-name") is not None
+    assert soup.select(".menu-item") == []
+    with pytest.raises(ValueError):
+        html_parser.parse_html(b"<p></p>", backend="html.parser", only=["div > p"])
+
+
+def test_unknown_backend_is_refused():
+    with pytest.raises(ValueError):
+        html_parser.parse_html(b"<p></p>", backend="html5lib")
@@ -0,0 +1,65 @@
+import asyncio
+import os
+
+from fetcher import AsyncFetcher
+from http_cache import HttpCache
+
+
+def fetch_all(fetcher, urls):
+    async def main():
+        try:
+            return [await fetcher.fetch(url) for url in urls]
+        finally:
+            await fetcher.close()
+
+    return asyncio.run(main())
+
+
+def test_fresh_response_is_served_from_disk(site, tmp_path):
+    cache = HttpCache(str(tmp_path / "cache.sqlite3"))
+    results = fetch_all(AsyncFetcher(site.url, cache=cache), ["/fresh", "/fresh"])
+    assert results == [(b"fresh body", 200), (b"fresh body", 304)]
+    assert site.requests["/fresh"] == 1
+
+    fetcher = AsyncFetcher(site.url, cache=HttpCache(str(tmp_path / "cache.sqlite3")))  # Next run
+    assert fetcher.get_fresh("/fresh") == b"fresh body"
+    assert fetch_all(fetcher, ["/fresh"]) == [(b"fresh body", 304)]
+    assert site.requests["/fresh"] == 1
+
+
+def test_stale_response_is_revalidated_with_its_etag(site, tmp_path):
+    cache = HttpCache(str(tmp_path / "cache.sqlite3"))
+    results = fetch_all(AsyncFetcher(site.url, cache=cache), ["/validated", "/validated"])
+    assert results == [(b"validated body", 200), (b"validated body", 304)]
+    assert site.requests["/validated"] == 2  # The second one got an empty 304
+    assert cache.stats == {"hits": 0, "misses": 1, "revalidated": 1}
+
+
+def test_response_without_validators_is_not_cached(site, tmp_path):
+    cache = HttpCache(str(tmp_path / "cache.sqlite3"))
+    fetch_all(AsyncFetcher(site.url, cache=cache), ["/page", "/page"])
+    assert site.requests["/page"] == 2
+    assert cache.total_size == 0
+
+
+def test_parsed_values_are_stored_with_the_response(tmp_path):
+    cache = HttpCache(str(tmp_path / "cache.sqlite3"))
+    cache.set_parsed("http://site/a", "listing", [1])  # Ignored, the response isn't cached
+    assert cache.get_parsed("http://site/a", "listing") is None
+    cache.store("http://site/a", {"ETag": '"a"'}, b"body")
+    cache.set_parsed("http://site/a", "listing", {"pages": 3})
+    cache.set_parsed("http://site/a", "product", {"name": "tea"})
+    assert cache.get_parsed("http://site/a", "listing") == {"pages": 3}
+    cache.store("http://site/a", {"ETag": '"b"'}, b"new body")  # A new response drops the old values
+    assert cache.get_parsed("http://site/a", "product") is None
+
+
+def test_least_recently_used_responses_are_evicted(tmp_path, monkeypatch):
+    clock = iter(range(1000))
+    monkeypatch.setattr("http_cache.time.time", lambda: next(clock))
+    cache = HttpCache(str(tmp_path / "cache.sqlite3"), max_size=500)
+    for index in range(10):
+        cache.store(f"http://site/{index}", {"ETag": str(index)}, os.urandom(100))
+    assert cache.total_size <= 500
+    assert cache.get_conditional_headers("http://site/9")[0] == {"If-None-Match": "9"}
+    assert cache.get_conditional_headers("http://site/1") == ({}, None)
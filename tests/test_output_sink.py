@@ -0,0 +1,67 @@
+import csv
+import datetime
+import gzip
+import importlib.util
+
+import pytest
+
+import output_sink
+from output_sink import ProductFileSink
+
+
+def make_product(number, store="Fruits"):
+    return {
+        "product_id": str(number), "market": "Market A", "market_image": "a.png", "store": store, "store_image": "s.png",
+        "name": f"Product {number}", "price": "1,50", "currency": "MAD", "brand": "Brand", "description": "", "number": "1",
+        "image": "p.png", "images": "p.png", "url": f"https://site/product/{number}", "date": "2026-10-17T10:00:00Z", "addresses": "home"
+    }
+
+
+def test_csv_files_are_partitioned_by_market_and_store(tmp_path):
+    sink = ProductFileSink(str(tmp_path), "csv", "gzip", row_group_size=2)
+    for number in range(3):
+        sink.put(make_product(number), "2026_10_17_10_00.csv")
+    sink.put(make_product(3, "Fruits/Légumes"), "2026_10_17_10_00.csv")
+    sink.close()
+
+    assert sink.written == 4 and sink.failed == 0
+    folders = sorted(path.parent.relative_to(tmp_path).as_posix() for path in tmp_path.rglob("*.csv.gz"))
+    assert folders == ["run_date=2026-10-17/market=Market A/store=Fruits", "run_date=2026-10-17/market=Market A/store=Fruits%2FLégumes"]
+    file_path, = (tmp_path / folders[0]).iterdir()
+    with gzip.open(file_path, "rt", encoding="utf-8") as file:  # Two row groups, two gzip members
+        rows = list(csv.DictReader(file))
+    assert [row["product_id"] for row in rows] == ["0", "1", "2"]
+    assert "market" not in rows[0]  # The value of the partition folder
+
+
+def test_parquet_files_are_readable_after_a_flush(tmp_path):
+    pyarrow_parquet = pytest.importorskip("pyarrow.parquet")
+    sink = ProductFileSink(str(tmp_path), "parquet", "zstd", row_group_size=100)
+    sink.put(make_product(0), "2026_10_17_10_00.csv")
+    sink.flush()
+    table = pyarrow_parquet.read_table(next(tmp_path.rglob("*.parquet")))
+    assert table.column("price").to_pylist() == [1.5]
+    assert table.column("date").to_pylist() == [datetime.datetime(2026, 10, 17, 10, tzinfo=datetime.timezone.utc)]
+
+    sink.put(make_product(1), "2026_10_17_10_00.csv")
+    sink.close()
+    assert len(list(tmp_path.rglob("*.parquet"))) == 2  # A new part file after the checkpoint
+
+
+@pytest.mark.filterwarnings("ignore::pytest.PytestUnhandledThreadExceptionWarning")
+def test_flush_raises_when_the_writer_thread_stopped(tmp_path):
+    sink = ProductFileSink(str(tmp_path), "csv", "none")
+    sink.put(None, "2026_10_17_10_00.csv")  # Kills the writer thread
+    sink._thread.join(5)
+    with pytest.raises(RuntimeError):
+        sink.flush()
+    sink.close()
+
+
+def test_missing_pyarrow_is_reported_when_the_sink_is_created(tmp_path, monkeypatch):
+    find_spec = importlib.util.find_spec
+    monkeypatch.setattr(output_sink.importlib.util, "find_spec", lambda name: None if name == "pyarrow" else find_spec(name))
+    with pytest.raises(ImportError, match="pyarrow"):
+        ProductFileSink(str(tmp_path), "parquet")
+    with pytest.raises(ValueError):
+        ProductFileSink(str(tmp_path), "xlsx")
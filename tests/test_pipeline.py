@@ -0,0 +1,80 @@
+import asyncio
+
+from pipeline import Pipeline
+
+
+def test_items_stream_through_the_stages():
+    saved = []
+
+    async def get_pages(store):
+        await asyncio.sleep(0.01 * store)
+        return [f"{store}-{page}" for page in range(3)]
+
+    async def scrape(page):
+        if page == "2-1":
+            raise ValueError("broken page")
+        return page.upper()
+
+    async def save(product):
+        saved.append(product)
+
+    pipeline = Pipeline()
+    pipeline.add_stage("pages", get_pages, workers=5, fan_out=True)
+    pipeline.add_stage("products", scrape, workers=3)
+    pipeline.add_stage("csv", save, workers=1)
+    asyncio.run(pipeline.run(list(range(5))))
+
+    assert sorted(saved) == sorted(f"{store}-{page}" for store in range(5) for page in range(3) if (store, page) != (2, 1))
+    assert [stage.processed for stage in pipeline.stages] == [5, 14, 14]
+
+
+def test_products_are_saved_before_every_store_is_listed():
+    order = []
+
+    async def get_pages(store):
+        await asyncio.sleep(0.2 if store == "slow" else 0)
+        order.append(f"listed {store}")
+        return [store]
+
+    async def save(page):
+        order.append(f"saved {page}")
+
+    pipeline = Pipeline()
+    pipeline.add_stage("pages", get_pages, workers=2, fan_out=True)
+    pipeline.add_stage("csv", save, workers=1)
+    asyncio.run(pipeline.run(["slow", "fast"]))
+    assert order == ["listed fast", "saved fast", "listed slow", "saved slow"]
+
+
+def test_full_queue_holds_the_producing_stage_back():
+    in_queue = []
+
+    async def produce(item):
+        return list(range(20))
+
+    async def consume(item):
+        in_queue.append(pipeline.stages[1].queue.qsize())
+        await asyncio.sleep(0.001)
+
+    pipeline = Pipeline()
+    pipeline.add_stage("produce", produce, workers=1, fan_out=True)
+    pipeline.add_stage("consume", consume, workers=1, queue_size=4)
+    asyncio.run(pipeline.run([0]))
+    assert len(in_queue) == 20
+    assert max(in_queue) <= 4
+
+
+def test_pending_items_of_an_interrupted_run_are_fed_to_their_stage():
+    saved = []
+
+    async def get_pages(store):
+        return [f"{store}-page"]
+
+    async def save(page):
+        saved.append(page)
+
+    pipeline = Pipeline()
+    pipeline.add_stage("pages", get_pages, workers=1, fan_out=True)
+    pipeline.add_stage("csv", save, workers=1)
+    asyncio.run(pipeline.run([], {"pages": ["b"], "csv": ["a-page"]}))
+    assert sorted(saved) == ["a-page", "b-page"]
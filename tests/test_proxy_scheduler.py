@@ -0,0 +1,99 @@
+from proxy_scheduler import ProxyScheduler
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+def make_scheduler(**options):
+    clock = Clock()
+    return ProxyScheduler(["http://a", "http://b"], open_seconds=10, clock=clock, **options), clock
+
+
+def trip(scheduler, proxy):
+    scheduler.report(proxy, 1.0, success=False, banned=True)
+    assert scheduler.proxies[proxy].state == "open"
+
+
+def test_tripped_proxy_gets_no_traffic_until_it_is_probed():
+    scheduler, clock = make_scheduler()
+    trip(scheduler, "http://a")
+    clock.now += 9.9
+    assert {scheduler.acquire() for _ in range(50)} == {"http://b"}
+
+    clock.now += 0.1
+    assert scheduler.acquire() == "http://a"  # The single half-open probe
+    assert scheduler.proxies["http://a"].state == "half_open"
+    assert {scheduler.acquire() for _ in range(50)} == {"http://b"}
+
+    scheduler.report("http://a", 0.5, success=True)
+    assert scheduler.proxies["http://a"].state == "closed"
+    assert scheduler.proxies["http://a"].open_seconds == 10
+
+
+def test_repeated_failures_trip_the_breaker():
+    scheduler, _ = make_scheduler(failure_threshold=3, error_rate_threshold=1.0)
+    for _ in range(2):
+        scheduler.report("http://a", 1.0, success=False)
+    assert scheduler.proxies["http://a"].state == "closed"
+    scheduler.report("http://a", 1.0, success=False)
+    assert scheduler.proxies["http://a"].state == "open"
+
+
+def test_failed_probe_doubles_the_open_time():
+    scheduler, clock = make_scheduler(max_open_seconds=15)
+    trip(scheduler, "http://a")
+    clock.now += 10
+    assert scheduler.acquire() == "http://a"
+    scheduler.report("http://a", 1.0, success=False)
+    health = scheduler.proxies["http://a"]
+    assert health.state == "open"
+    assert health.open_seconds == 15  # Doubled, up to max_open_seconds
+    assert not health.probing
+    clock.now += 14
+    assert scheduler.acquire() == "http://b"
+    clock.now += 1
+    assert scheduler.acquire() == "http://a"
+
+
+def test_released_probe_lets_the_proxy_be_probed_again():
+    scheduler, clock = make_scheduler()
+    trip(scheduler, "http://a")
+    clock.now += 10
+    assert scheduler.acquire() == "http://a"
+    scheduler.release("http://a")  # Served from the cache, the proxy wasn't used
+    assert scheduler.proxies["http://a"].state == "half_open"
+    assert scheduler.acquire() == "http://a"
+
+
+def test_unreported_probe_expires():
+    scheduler, clock = make_scheduler()
+    trip(scheduler, "http://a")
+    clock.now += 10
+    assert scheduler.acquire() == "http://a"
+    clock.now += 9
+    assert scheduler.acquire() == "http://b"  # Probe in flight
+    clock.now += 1
+    assert scheduler.acquire() == "http://a"  # The probe was never reported, probe again
+
+
+def test_every_proxy_tripped_uses_the_one_recovering_first():
+    scheduler, clock = make_scheduler()
+    trip(scheduler, "http://a")
+    clock.now += 1
+    trip(scheduler, "http://b")
+    assert scheduler.acquire() == "http://a"
+
+
+def test_healthy_fast_proxies_get_most_of_the_traffic():
+    scheduler, _ = make_scheduler(error_rate_threshold=1.0, failure_threshold=1000)
+    for _ in range(20):
+        scheduler.report("http://a", 0.1, success=True)
+        scheduler.report("http://b", 2.0, success=False)
+    picks = [scheduler.acquire() for _ in range(1000)]
+    assert picks.count("http://a") > 900
+    assert scheduler.get_stats()["http://b"]["failures"] == 20
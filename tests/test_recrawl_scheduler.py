@@ -0,0 +1,121 @@
+import asyncio
+import datetime
+import os
+import signal
+import time
+
+from recrawl_scheduler import RecrawlScheduler, parse_open_programs, get_next_open_time
+
+
+UTC = datetime.timezone.utc
+PROGRAMS = [{"week_day": "Lundi - Vendredi", "time": "09:00 - 22:00"}, {"week_day": "Samedi", "time": "20h00 - 02h00"}]
+STORE = {"market_name": "A", "market_image": "a.png", "market_open_programs": [], "market_close_program": "", "addresses": [], "store_url": "/store/1", "store_image": "1.png", "store_name": "Fruits"}
+
+
+def get_timestamp(day, hour, minute=0):
+    return datetime.datetime(2026, 10, day, hour, minute, tzinfo=UTC).timestamp()  # The 19th is a Monday
+
+
+def get_target(scheduler, key):
+    return scheduler._query_one("SELECT interval, next_at, checks, changes FROM targets WHERE target_key = ?", (key,))
+
+
+def test_open_programs_are_read_by_week_day():
+    programs = parse_open_programs(PROGRAMS + [{"week_day": "Dimanche", "time": "fermé"}])
+    assert programs[0] == programs[4] == [(9 * 60, 22 * 60)]
+    assert programs[5] == [(20 * 60, 24 * 60)]
+    assert programs[6] == [(0, 2 * 60)]  # Saturday night, closing after midnight
+    assert parse_open_programs([{"week_day": "Tous les jours", "time": "8:00 - 20:00"}]).keys() == set(range(7))
+
+
+def test_recrawls_are_pushed_to_the_next_opening():
+    assert get_next_open_time(get_timestamp(19, 10), PROGRAMS, UTC) == get_timestamp(19, 10)
+    assert get_next_open_time(get_timestamp(19, 8), PROGRAMS, UTC) == get_timestamp(19, 9)
+    assert get_next_open_time(get_timestamp(23, 23), PROGRAMS, UTC) == get_timestamp(24, 20)  # Friday night to Saturday evening
+    assert get_next_open_time(get_timestamp(25, 1), PROGRAMS, UTC) == get_timestamp(25, 1)
+    assert get_next_open_time(get_timestamp(25, 3), PROGRAMS, UTC) == get_timestamp(26, 9)
+    assert get_next_open_time(get_timestamp(25, 3), [], UTC) == get_timestamp(25, 3)  # Unknown opening hours
+
+
+def test_intervals_follow_the_changes_of_the_targets(tmp_path):
+    scheduler = RecrawlScheduler(str(tmp_path / "schedule.sqlite3"), min_interval=60, max_interval=600, timezone="UTC", growth=2)
+    assert scheduler.add("store", "/store/1", STORE)
+    assert not scheduler.add("store", "/store/1", {**STORE, "store_name": "Fruits frais"})  # Payload updated
+    assert scheduler.claim_due(10) == [("store", "/store/1", {**STORE, "store_name": "Fruits frais"})]
+    assert scheduler.claim_due(10) == []  # Due again after the minimum interval
+
+    assert not scheduler.observe("/store/1", "a")  # First recrawl, nothing to compare with
+    assert get_target(scheduler, "/store/1")[0] == 60
+    for interval in (120, 240, 480, 600):
+        assert not scheduler.observe("/store/1", "a")
+        assert get_target(scheduler, "/store/1")[0] == interval
+    assert scheduler.observe("/store/1", "b")
+    interval, next_at, checks, changes = get_target(scheduler, "/store/1")
+    assert (interval, checks, changes) == (300, 6, 1)
+    assert abs(next_at - (time.time() + 300)) < 5
+    assert not scheduler.observe("/store/1", "b", closed=True)  # A closed market doesn't grow the interval
+    assert get_target(scheduler, "/store/1")[0] == 300
+    scheduler.close()
+
+
+def test_retired_targets_are_removed_with_their_children(tmp_path):
+    scheduler = RecrawlScheduler(str(tmp_path / "schedule.sqlite3"), min_interval=60, max_interval=600, timezone="UTC")
+    scheduler.add("market", "/market/a", {})
+    for store in ("/store/1", "/store/2"):
+        scheduler.add("store", store, {}, "/market/a")
+        scheduler.add("page", f"{store}?page=2", {}, store)
+    assert scheduler.retire("/market/a", ["/store/1"]) == 2
+    assert [key for _, key, _ in scheduler.claim_due(10)] == ["/market/a", "/store/1", "/store/1?page=2"]
+    assert scheduler.get_stats()["page"]["targets"] == 1
+    scheduler.close()
+
+
+def test_prefetched_pages_are_scraped_with_their_store_and_not_due(make_scraper, monkeypatch):
+    scraper = make_scraper(scrape_schedule="daemon", frontier_path="", product_index_path="", recrawl_min_interval=60)
+    tiles = [{"url": "/product/1", "fingerprint": "1"}]
+    pages = [
+        {**STORE, "product_tiles": tiles},
+        {**STORE, "store_url": "/store/1?page=2"},  # In the paginator window, recrawled on its own
+        {**STORE, "store_url": "/store/1?page=3", "product_tiles": tiles}  # Prefetched past the window
+    ]
+
+    async def get_pages(store):
+        return pages
+
+    monkeypatch.setattr(scraper, "_BringoScraper__get_pages", get_pages)
+    scraper.scheduler.add("store", "/store/1", STORE)
+    target, = scraper.scheduler.claim_due(10)
+    listed = asyncio.run(scraper._BringoScraper__recrawl(target))
+    assert [page["store_url"] for page in listed] == ["/store/1", "/store/1?page=3"]
+    assert [key for _, key, _ in scraper.scheduler.claim_due(10)] == ["/store/1?page=2"]
+    assert get_target(scraper.scheduler, "/store/1?page=3")[2] == 1  # Recorded as recrawled
+    payload = scraper.scheduler._query_one("SELECT payload FROM targets WHERE target_key = '/store/1?page=3'")[0]
+    assert "product_tiles" not in payload
+    asyncio.run(scraper.fetcher.close())
+
+
+def test_stop_cancels_the_cycle_and_flushes_the_outputs(make_scraper, monkeypatch):
+    scraper = make_scraper(scrape_schedule="daemon", frontier_path="", product_index_path="")
+    events = []
+
+    async def start_day(day):
+        scraper.scheduler.add("market", "/market/a", {"market_url": "/market/a"})
+
+    async def recrawl(target):
+        events.append("recrawl")
+        os.kill(os.getpid(), signal.SIGTERM)
+        try:
+            await asyncio.sleep(3600)
+        except asyncio.CancelledError:
+            events.append("cancelled")
+            raise
+
+    monkeypatch.setattr(scraper, "_BringoScraper__start_day", start_day)
+    monkeypatch.setattr(scraper, "_BringoScraper__recrawl", recrawl)
+    monkeypatch.setattr(scraper, "_BringoScraper__flush_outputs", lambda: events.append("flush"))
+
+    async def serve():
+        await asyncio.wait_for(scraper._BringoScraper__serve(), 10)
+
+    asyncio.run(serve())
+    assert events == ["recrawl", "cancelled", "flush"]
@@ -0,0 +1,68 @@
+import json
+import threading
+import time
+
+from session_manager import SessionManager
+
+
+class Bootstrap:
+    def __init__(self, results):
+        self.results = list(results)
+        self.calls = 0
+
+    def __call__(self):
+        self.calls += 1
+        result = self.results.pop(0) if self.results else None
+        if isinstance(result, Exception):
+            raise result
+        return result
+
+
+def test_first_session_is_created_on_demand_and_saved(tmp_path):
+    file_path = tmp_path / "sessions.json"
+    manager = SessionManager(str(file_path), Bootstrap([{"cookies": {"id": "1"}}]), pool_size=1)
+    session = manager.get_session(timeout=5)
+    assert session["cookies"] == {"id": "1"}
+    assert [saved["cookies"] for saved in json.loads(file_path.read_text())] == [{"id": "1"}]
+
+    loaded = SessionManager(str(file_path), Bootstrap([]), pool_size=1)
+    assert loaded.get_session(timeout=1)["cookies"] == {"id": "1"}
+
+
+def test_expired_sessions_are_dropped(tmp_path):
+    file_path = tmp_path / "sessions.json"
+    file_path.write_text(json.dumps([{"cookies": {"id": "old"}, "created_at": time.time() - 100}]))
+    bootstrap = Bootstrap([{"cookies": {"id": "new"}}])
+    manager = SessionManager(str(file_path), bootstrap, pool_size=1, ttl=50)
+    assert manager.sessions == []
+    assert manager.get_session(timeout=5)["cookies"] == {"id": "new"}
+    assert bootstrap.calls == 1
+
+
+def test_invalidated_session_is_replaced(tmp_path):
+    bootstrap = Bootstrap([{"cookies": {"id": "1"}}, {"cookies": {"id": "2"}}])
+    manager = SessionManager(str(tmp_path / "sessions.json"), bootstrap, pool_size=1)
+    assert manager.get_session(timeout=5)["cookies"] == {"id": "1"}
+    manager.invalidate({"id": "1"})
+    manager.invalidate({"id": "1"})  # Already dropped by another worker
+    assert manager.get_session(timeout=5)["cookies"] == {"id": "2"}
+    assert bootstrap.calls == 2
+
+
+def test_failed_bootstrap_wakes_the_waiting_callers_up(tmp_path):
+    bootstrap = Bootstrap([None, RuntimeError("no browser"), {"cookies": {}}])
+    manager = SessionManager(str(tmp_path / "sessions.json"), bootstrap, pool_size=1, bootstrap_attempts=3, retry_delay=0.01)
+    results = []
+    waiters = [threading.Thread(target=lambda: results.append(manager.get_session())) for _ in range(3)]
+    for waiter in waiters:
+        waiter.start()
+    for waiter in waiters:
+        waiter.join(timeout=5)
+    assert not any(waiter.is_alive() for waiter in waiters)
+    assert results == [None, None, None]
+    assert manager.failed
+    assert bootstrap.calls % 3 == 0  # Whole refreshes, a caller arriving after a failure starts another one
+
+    bootstrap.results = [{"cookies": {"id": "1"}}]  # The site is back, the next caller starts a new refresh
+    assert manager.get_session(timeout=5)["cookies"] == {"id": "1"}
+    assert not manager.failed
@@ -0,0 +1,66 @@
+import asyncio
+
+import pytest
+
+from url_frontier import normalize_url, SeenUrls, InflightRequests
+
+
+def test_spellings_of_a_page_give_the_same_url():
+    base_url = "https://www.bringo.ma"
+    expected = "https://www.bringo.ma/fr/product/1?a=1&b=2"
+    assert normalize_url("/fr/product/1?b=2&a=1", base_url) == expected
+    assert normalize_url(" HTTPS://WWW.Bringo.ma:443/fr/product/1?a=1&utm_source=x&b=2#reviews ", base_url) == expected
+    assert normalize_url("fr/product/1?fbclid=abc&a=1&b=2", base_url) == expected
+    assert normalize_url("http://localhost:8080", base_url) == "http://localhost:8080/"
+
+
+def test_seen_urls_count_the_duplicates():
+    seen = SeenUrls()
+    assert seen.add("https://site/a")
+    assert seen.add("https://site/b")
+    assert not seen.add("https://site/a")
+    assert seen.duplicates == 1
+
+
+def test_concurrent_requests_of_a_key_are_sent_once():
+    calls = []
+
+    async def request():
+        calls.append(1)
+        await asyncio.sleep(0.01)
+        return "page"
+
+    async def failing():
+        await asyncio.sleep(0.01)
+        raise ValueError("down")
+
+    async def main():
+        inflight = InflightRequests()
+        assert await asyncio.gather(*[inflight.run("key", request) for _ in range(5)]) == ["page"] * 5
+        assert await inflight.run("key", request) == "page"  # Finished requests are not cached
+        results = await asyncio.gather(inflight.run("error", failing), inflight.run("error", failing), return_exceptions=True)
+        assert all(isinstance(result, ValueError) for result in results)
+        return inflight
+
+    inflight = asyncio.run(main())
+    assert len(calls) == 2
+    assert inflight.coalesced == 5
+
+
+def test_cancelled_caller_does_not_cancel_the_shared_request():
+    async def main():
+        inflight = InflightRequests()
+
+        async def request():
+            await asyncio.sleep(0.05)
+            return "page"
+
+        first = asyncio.ensure_future(inflight.run("key", request))
+        second = asyncio.ensure_future(inflight.run("key", request))
+        await asyncio.sleep(0.01)
+        first.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await first
+        return await second
+
+    assert asyncio.run(main()) == "page"
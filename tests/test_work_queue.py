@@ -0,0 +1,77 @@
+import asyncio
+import time
+
+from work_queue import WorkQueue
+
+
+def test_expired_lease_is_delivered_to_another_worker(tmp_path):
+    queue = WorkQueue(str(tmp_path / "queue.sqlite3"), lease_seconds=0.2, max_attempts=3)
+    queue.start_run("run")
+    queue.publish("run", [{"page": 1}, {"page": 1}, {"page": 2}])
+    queue.finish_publishing("run")
+
+    claimed = queue.claim("worker-1", 10)
+    assert sorted(payload["page"] for _, _, payload in claimed) == [1, 2]
+    assert queue.claim("worker-2", 10) == []  # Leased by worker-1
+
+    time.sleep(0.3)
+    assert queue.heartbeat("worker-1", [claimed[0][0]]) == 1  # Still leased, nobody claimed it
+    reclaimed = queue.claim("worker-2", 10)
+    assert [unit_id for unit_id, _, _ in reclaimed] == [claimed[1][0]]
+    assert queue.heartbeat("worker-1", [claimed[1][0]]) == 0  # Redelivered
+
+    queue.complete("worker-1", claimed[0][0], 5)
+    assert not queue.is_run_finished("run")
+    queue.complete("worker-2", reclaimed[0][0], 7)
+    assert queue.is_run_finished("run")
+    assert queue.get_stats("run") == {"done": 2, "products": 12}
+    queue.close()
+
+
+def test_unit_failing_every_attempt_is_marked_failed(tmp_path):
+    queue = WorkQueue(str(tmp_path / "queue.sqlite3"), lease_seconds=0.05, max_attempts=2)
+    queue.start_run("run")
+    queue.publish("run", [{"page": 1}])
+    queue.finish_publishing("run")
+
+    for attempt in range(2):
+        assert len(queue.claim(f"worker-{attempt}", 1)) == 1
+        time.sleep(0.1)
+    assert queue.claim("worker-2", 1) == []
+    assert queue.is_run_finished("run")
+    assert queue.get_stats("run") == {"failed": 1, "products": 0}
+    queue.close()
+
+
+def test_run_is_not_finished_before_it_is_published(tmp_path):
+    queue = WorkQueue(str(tmp_path / "queue.sqlite3"))
+    queue.start_run("run")
+    queue.publish("run", [{"page": 1}])
+    unit_id = queue.claim("worker", 1)[0][0]
+    queue.complete("worker", unit_id, 1)
+    assert not queue.is_run_finished("run")
+    queue.finish_publishing("run")
+    assert queue.is_run_finished("run")
+    queue.close()
+
+
+def test_redelivered_unit_lists_its_products_again(make_scraper, monkeypatch):
+    scraper = make_scraper(scrape_role="worker", frontier_path="", product_index_path="", worker_id="worker")
+    page = {
+        "market_name": "A", "market_image": "a.png", "market_open_programs": [], "market_close_program": "", "addresses": [],
+        "store_name": "Fruits", "store_image": "1.png", "store_url": "/store/1",
+        "product_tiles": [{"url": f"/product/{number}", "fingerprint": str(number), "name": "", "price": "", "currency": ""} for number in range(3)]
+    }
+
+    async def scrape_product(product):
+        scraper.unit_results[product.unit_id] += 1
+        return []
+
+    monkeypatch.setattr(scraper, "_BringoScraper__scrape_product", scrape_product)
+    scraper.work_queue.start_run("run")
+    scraper.work_queue.publish("run", [page])
+    units = scraper.work_queue.claim("worker", 1)
+    asyncio.run(scraper._BringoScraper__work_on_units("run", units))
+    asyncio.run(scraper._BringoScraper__work_on_units("run", units))  # Delivered again after its lease expired
+    assert scraper.unit_results == {units[0][0]: 3}
+    scraper.work_queue.close()
@@ -1,30 +1,206 @@
+import sys
+from typing import Any
+
 from selenium.webdriver.support import expected_conditions as EC
 
-class Product:
-    def __init__(self, name: str, price: float, currency: str, description: str, image: str, category: str, brand: str, vendor: str):
-        self.name = name
-        self.price = price
-        self.currency = currency
-        self.description = description
+
+class Market:
+    """
+    Market shared by every store and product of the market.
+    """
+
+    __slots__ = ("name", "image", "open_programs", "close_program")
+
+    def __init__(self, name: str, image: str, open_programs: list[dict[str, str]], close_program: str):
+        self.name = sys.intern(name)
         self.image = image
-        self.category = category
-        self.brand = brand
-        self.vendor = vendor
+        self.open_programs = open_programs
+        self.close_program = close_program
 
-    def keys(self):
-        return ["name", "price", "currency", "description", "image", "category", "brand", "vendor"]
 
-    def to_dict(self):
+class Store:
+    """
+    Store of a market, shared by every product listed in it instead of copying its fields in every product.
+    """
+
+    __slots__ = ("store_id", "market", "name", "image", "addresses")
+
+    def __init__(self, store_id: int, market: Market, name: str, image: str, addresses: tuple[str, ...]):
+        self.store_id = store_id
+        self.market = market
+        self.name = sys.intern(name)
+        self.image = image
+        self.addresses = addresses
+
+    def to_dict(self) -> dict[str, Any]:
         return {
-            "name": self.name,
-            "price": self.price,
-            "currency": self.currency,
-            "description": self.description,
-            "image": self.image,
-            "category": self.category,
-            "brand": self.brand,
-            "vendor": self.vendor
+            "market_name": self.market.name,
+            "market_image": self.market.image,
+            "market_open_programs": self.market.open_programs,
+            "market_close_program": self.market.close_program,
+            "addresses": list(self.addresses),
+            "store_name": self.name,
+            "store_image": self.image
+        }
+
+
+class StoreTable:
+    """
+    Intern table of the markets and stores of a run, every store is created once and referenced by its products.
+    """
+
+    def __init__(self):
+        self._markets = {}
+        self._stores = {}
+
+    def intern(self, page: dict[str, Any]) -> Store:
+        """
+        Get the store of a listing page, created the first time one of its pages is seen.
+
+        Parameters:
+        - page (dict): The listing page, with the market and store fields.
+
+        Returns:
+        - Store: The shared store.
+        """
+
+        addresses = tuple(page.get("addresses", []))
+        key = (page["market_name"], page["market_image"], page["store_name"], page["store_image"], addresses)
+        store = self._stores.get(key)
+        if store is None:
+            market_key = (page["market_name"], page["market_image"])
+            market = self._markets.get(market_key)
+            if market is None:
+                market = self._markets[market_key] = Market(page["market_name"], page["market_image"], page["market_open_programs"], page["market_close_program"])
+            store = self._stores[key] = Store(len(self._stores), market, page["store_name"], page["store_image"], addresses)
+        return store
+
+    def __len__(self) -> int:
+        return len(self._stores)
+
+
+class ProductLink:
+    """
+    Product link found on a listing page, with what its tile shows.
+    """
+
+    __slots__ = ("store", "product_url", "fingerprint", "tile_name", "tile_price", "tile_currency", "unit_id")
+
+    def __init__(self, store: Store, product_url: str, fingerprint: str, tile_name: str = "", tile_price: str = "", tile_currency: str = "", unit_id: str = None):
+        self.store = store
+        self.product_url = product_url
+        self.fingerprint = fingerprint
+        self.tile_name = tile_name
+        self.tile_price = tile_price
+        self.tile_currency = sys.intern(tile_currency)
+        self.unit_id = unit_id  # Work unit of the listing page, when scraped by a worker
+
+    def to_checkpoint(self) -> dict[str, Any]:
+        """
+        Get the fields of the link checkpointed by the frontier, its store is checkpointed once for all its links.
+        """
+
+        item = {
+            "product_url": self.product_url,
+            "fingerprint": self.fingerprint,
+            "tile": {"name": self.tile_name, "price": self.tile_price, "currency": self.tile_currency}
         }
+        if self.unit_id is not None:
+            item["unit_id"] = self.unit_id
+        return item
+
+    @classmethod
+    def from_checkpoint(cls, item: dict[str, Any], store: Store) -> "ProductLink":
+        """
+        Create a link from the fields returned by `to_checkpoint` (a checkpointed item of a resumed run).
+
+        Parameters:
+        - item (dict): The checkpointed fields.
+        - store (Store): The store of the link.
+
+        Returns:
+        - ProductLink: The link.
+        """
+
+        tile = item.get("tile") or {}
+        return cls(store, item["product_url"], item["fingerprint"], tile.get("name", ""), tile.get("price", ""), tile.get("currency", ""), item.get("unit_id"))
+
+
+class Product:
+    """
+    Scraped product, with the read-only mapping API (`keys`, `get`, `[]`) the csv and database writers use.
+    """
+
+    __slots__ = ("product_id", "store", "name", "price", "currency", "brand", "description", "number", "image", "images", "url", "date")
+
+    # Columns of the product rows, in order
+    _getters = {
+        "product_id": lambda product: product.product_id,
+        "market": lambda product: product.store.market.name,
+        "market_image": lambda product: product.store.market.image,
+        "store": lambda product: product.store.name,
+        "store_image": lambda product: product.store.image,
+        "name": lambda product: product.name,
+        "price": lambda product: product.price,
+        "currency": lambda product: product.currency,
+        "brand": lambda product: product.brand,
+        "description": lambda product: product.description,
+        "number": lambda product: product.number,
+        "image": lambda product: product.image,
+        "images": lambda product: product.images,
+        "url": lambda product: product.url,
+        "date": lambda product: product.date,
+        "addresses": lambda product: ";".join(product.store.addresses)  # Every delivery address the product is available at
+    }
+
+    def __init__(self, product_id: str, store: Store, details: dict[str, str], url: str, date: str):
+        self.product_id = product_id
+        self.store = store
+        self.name = details["name"]
+        self.price = details["price"]
+        self.currency = sys.intern(details["currency"])
+        self.brand = sys.intern(details["brand"])
+        self.description = details["description"]
+        self.number = details["number"]
+        self.image = details["image"]
+        self.images = details["images"]
+        self.url = url
+        self.date = sys.intern(date)
+
+    def keys(self):
+        return self._getters.keys()
+
+    def get(self, key: str, default: Any = None) -> Any:
+        getter = self._getters.get(key)
+        return getter(self) if getter is not None else default
+
+    def __getitem__(self, key: str) -> Any:
+        return self._getters[key](self)
+
+    def to_dict(self) -> dict[str, Any]:
+        return {key: getter(self) for key, getter in self._getters.items()}
+
+    def to_checkpoint(self) -> dict[str, Any]:
+        """
+        Get the fields of the product checkpointed by the frontier, its store is checkpointed once for all its products.
+        """
+
+        return {field: getattr(self, field) for field in self.__slots__ if field != "store"}
+
+    @classmethod
+    def from_checkpoint(cls, item: dict[str, Any], store: Store) -> "Product":
+        """
+        Create a product from the fields returned by `to_checkpoint` (a checkpointed item of a resumed run).
+
+        Parameters:
+        - item (dict): The checkpointed fields.
+        - store (Store): The store of the product.
+
+        Returns:
+        - Product: The product.
+        """
+
+        return cls(item["product_id"], store, item, item["url"], item["date"])
 
 
 class all_elements_clickable:
@@ -0,0 +1,92 @@
+import asyncio
+import hashlib
+from typing import Any, Awaitable, Callable
+from urllib.parse import parse_qsl, urlencode, urljoin, urlsplit, urlunsplit
+
+
+# Query parameters that don't change the page served
+IGNORED_QUERY_PARAMETERS = ("utm_", "fbclid", "gclid")
+
+
+def normalize_url(url: str, base_url: str) -> str:
+    """
+    Normalise a link so every spelling of the same page gives the same URL.
+
+    Parameters:
+    - url (str): The link, absolute or relative.
+    - base_url (str): The URL relative links are resolved against.
+
+    Returns:
+    - str: The absolute URL with a lowercase scheme and host, without default port, fragment and
+      tracking parameters, and with its query parameters sorted.
+    """
+
+    parts = urlsplit(urljoin(base_url + "/", url.strip()))
+    scheme = parts.scheme.lower()
+    host = (parts.hostname or "").lower()
+    if parts.port and not (scheme == "http" and parts.port == 80) and not (scheme == "https" and parts.port == 443):
+        host = f"{host}:{parts.port}"
+    query = sorted((name, value) for name, value in parse_qsl(parts.query, keep_blank_values=True) if not name.startswith(IGNORED_QUERY_PARAMETERS))
+    return urlunsplit((scheme, host, parts.path or "/", urlencode(query), ""))
+
+
+class SeenUrls:
+    """
+    Set of the URLs already seen, keeping a 64 bit hash of each URL instead of the URL itself.
+
+    Two URLs sharing a hash (about one chance in 10^8 for a hundred million URLs) are taken as the
+    same URL, the second one being reported as seen.
+    """
+
+    def __init__(self):
+        self._hashes = set()
+        self.duplicates = 0
+
+    def add(self, url: str) -> bool:
+        """
+        Add a URL.
+
+        Parameters:
+        - url (str): The normalised URL.
+
+        Returns:
+        - bool: True if the URL was not seen before.
+        """
+
+        key = int.from_bytes(hashlib.blake2b(url.encode(), digest_size=8).digest(), "little")
+        new = key not in self._hashes
+        self._hashes.add(key)
+        if not new:
+            self.duplicates += 1
+        return new
+
+
+class InflightRequests:
+    """
+    Coalesce the concurrent requests of the same key into one, whose result is shared by every caller.
+    """
+
+    def __init__(self):
+        self._futures = {}
+        self.coalesced = 0
+
+    async def run(self, key: Any, request: Callable[[], Awaitable[Any]]) -> Any:
+        """
+        Run the request, or wait for the same request already in flight.
+
+        Parameters:
+        - key (Any): Identifies the request (the URL and what is extracted from it).
+        - request (Callable): Coroutine function sending the request.
+
+        Returns:
+        - Any: The result of the request, its exception is raised to every caller.
+        """
+
+        future = self._futures.get(key)
+        if future is not None:
+            self.coalesced += 1
+            return await asyncio.shield(future)  # A cancelled caller must not cancel the shared request
+        future = asyncio.ensure_future(request())
+        self._futures[key] = future
+        future.add_done_callback(lambda _: self._futures.pop(key) if self._futures.get(key) is future else None)
+        return await asyncio.shield(future)
@@ -0,0 +1,190 @@
+import hashlib
+import json
+import time
+from typing import Any
+
+from sqlite_store import SqliteStore
+
+
+class WorkQueue(SqliteStore):
+    """
+    Shared queue of work units with leases, for a coordinator and any number of workers.
+
+    The coordinator publishes the units of a run. A worker claims a few units at a time
+    under a lease it renews with heartbeats while it works on them. The lease of a worker
+    that died or lost the storage expires and its units are delivered to another worker,
+    up to `max_attempts` times. The database needs no server: any storage shared by the
+    hosts (a network volume) works.
+    """
+
+    schema = """
+        CREATE TABLE IF NOT EXISTS runs (
+            run_id TEXT PRIMARY KEY,
+            published_at REAL,
+            finished_at REAL
+        );
+        CREATE TABLE IF NOT EXISTS units (
+            unit_id TEXT PRIMARY KEY,
+            run_id TEXT NOT NULL,
+            payload TEXT NOT NULL,
+            state TEXT NOT NULL DEFAULT 'pending',  -- pending, leased, done or failed
+            lease_owner TEXT,
+            lease_expires REAL,
+            attempts INTEGER NOT NULL DEFAULT 0,
+            result INTEGER
+        );
+        CREATE INDEX IF NOT EXISTS units_state ON units (state, lease_expires);
+    """
+    # The hosts share the file over the network, where the shared memory of WAL is not available
+    journal_mode = "DELETE"
+
+    def __init__(self, file_path: str, lease_seconds: float = 120, max_attempts: int = 3):
+        """
+        Open the queue.
+
+        Parameters:
+        - file_path (str): Path to the SQLite database, on storage shared by every host.
+        - lease_seconds (float): Time a claimed unit stays reserved without a heartbeat.
+        - max_attempts (int): Number of deliveries of a unit before it is marked failed.
+        """
+
+        super().__init__(file_path)
+        self.lease_seconds = lease_seconds
+        self.max_attempts = max_attempts
+
+    def start_run(self, run_id: str) -> None:
+        """
+        Open a run, units can be published in it right away.
+
+        Parameters:
+        - run_id (str): Identifier of the run.
+        """
+
+        self._execute("INSERT OR IGNORE INTO runs (run_id) VALUES (?)", (run_id,))
+
+    def publish(self, run_id: str, payloads: list[dict[str, Any]]) -> None:
+        """
+        Publish work units, a unit published twice in a run is only kept once.
+
+        Parameters:
+        - run_id (str): Identifier of the run.
+        - payloads (list): The work units.
+        """
+
+        rows = []
+        for payload in payloads:
+            data = json.dumps(payload, sort_keys=True, ensure_ascii=False)
+            rows.append((hashlib.sha1(f"{run_id}:{data}".encode()).hexdigest(), run_id, data))
+        self._executemany("INSERT OR IGNORE INTO units (unit_id, run_id, payload) VALUES (?, ?, ?)", rows)
+
+    def finish_publishing(self, run_id: str) -> None:
+        """
+        Tell the workers every unit of the run is published.
+
+        Parameters:
+        - run_id (str): Identifier of the run.
+        """
+
+        self._execute("UPDATE runs SET published_at = ? WHERE run_id = ?", (time.time(), run_id))
+
+    def claim(self, worker_id: str, count: int) -> list[tuple[str, str, dict[str, Any]]]:
+        """
+        Lease pending units, and units whose lease expired.
+
+        Parameters:
+        - worker_id (str): Identifier of the claiming worker.
+        - count (int): Maximum number of units leased.
+
+        Returns:
+        - list: The unit id, run id and payload of every leased unit.
+        """
+
+        now = time.time()
+        with self._lock:
+            self._connection.execute("BEGIN IMMEDIATE")  # Take the write lock before reading, so two workers never lease the same unit
+            try:
+                self._connection.execute("UPDATE units SET state = 'failed' WHERE state = 'leased' AND lease_expires < ? AND attempts >= ?", (now, self.max_attempts))
+                rows = self._connection.execute(
+                    "SELECT unit_id, run_id, payload FROM units WHERE state = 'pending' OR (state = 'leased' AND lease_expires < ?) ORDER BY attempts, rowid LIMIT ?",
+                    (now, count)
+                ).fetchall()
+                self._connection.executemany(
+                    "UPDATE units SET state = 'leased', lease_owner = ?, lease_expires = ?, attempts = attempts + 1 WHERE unit_id = ?",
+                    [(worker_id, now + self.lease_seconds, unit_id) for unit_id, _, _ in rows]
+                )
+                self._connection.commit()
+            except Exception:
+                self._connection.rollback()
+                raise
+        return [(unit_id, run_id, json.loads(payload)) for unit_id, run_id, payload in rows]
+
+    def heartbeat(self, worker_id: str, unit_ids: list[str]) -> int:
+        """
+        Extend the lease of units still being worked on.
+
+        Parameters:
+        - worker_id (str): Identifier of the worker holding the leases.
+        - unit_ids (list): The leased units.
+
+        Returns:
+        - int: The number of leases extended, the others were redelivered to another worker.
+        """
+
+        expires = time.time() + self.lease_seconds
+        with self._lock:
+            count = 0
+            for unit_id in unit_ids:
+                count += self._connection.execute(
+                    "UPDATE units SET lease_expires = ? WHERE unit_id = ? AND lease_owner = ? AND state = 'leased'", (expires, unit_id, worker_id)
+                ).rowcount
+            self._connection.commit()
+        return count
+
+    def complete(self, worker_id: str, unit_id: str, result: int) -> None:
+        """
+        Report a unit as done.
+
+        Parameters:
+        - worker_id (str): Identifier of the worker holding the lease.
+        - unit_id (str): The unit.
+        - result (int): Number of products scraped from the unit.
+        """
+
+        self._execute("UPDATE units SET state = 'done', result = ? WHERE unit_id = ? AND lease_owner = ?", (result, unit_id, worker_id))
+
+    def is_run_finished(self, run_id: str) -> bool:
+        """
+        Tell whether every unit of a published run is done or failed, and close the run if so.
+
+        Parameters:
+        - run_id (str): Identifier of the run.
+
+        Returns:
+        - bool: True if the run is finished.
+        """
+
+        row = self._query_one("SELECT published_at, finished_at FROM runs WHERE run_id = ?", (run_id,))
+        if row is None or row[0] is None:
+            return False
+        if row[1] is not None:
+            return True
+        outstanding = self._query_one("SELECT COUNT(*) FROM units WHERE run_id = ? AND state IN ('pending', 'leased')", (run_id,))[0]
+        if outstanding:
+            return False
+        self._execute("UPDATE runs SET finished_at = ? WHERE run_id = ? AND finished_at IS NULL", (time.time(), run_id))
+        return True
+
+    def get_stats(self, run_id: str) -> dict[str, int]:
+        """
+        Get the progress of a run.
+
+        Parameters:
+        - run_id (str): Identifier of the run.
+
+        Returns:
+        - dict: The number of units by state, and the number of products scraped.
+        """
+
+        stats = {state: count for state, count in self._query("SELECT state, COUNT(*) FROM units WHERE run_id = ? GROUP BY state", (run_id,))}
+        stats["products"] = self._query_one("SELECT COALESCE(SUM(result), 0) FROM units WHERE run_id = ?", (run_id,))[0]
+        return stats